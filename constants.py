@@ -25,11 +25,92 @@ CLAW_COLOR_SENSOR_PORT = Port.S1
 OBSTACLE_SENSOR_PORT = Port.S2
 TOP_OBJECT_SENSOR_PORT = Port.S3
 
-CLAW_COLOR_SENSOR_MAILBOX = 'mb1'
-OBSTACLE_SENSOR_MAILBOX = 'm2'
-TOP_OBJECT_SENSOR_MAILBOX = 'mb3'
+SENSOR_MAILBOX = 'sensors'
+CONTROL_MAILBOX = 'control'
+# Período (ms) com que o cliente envia as leituras no perfil padrão (utils/protocol.py)
+SENSOR_SEND_PERIOD = 30
+# Idade máxima (ms) de uma leitura do cliente, tempo máximo (ms) esperando uma leitura nova e o intervalo
+# (ms) entre as verificações enquanto espera
+REMOTE_MAX_AGE = 300
+REMOTE_READ_TIMEOUT = 200
+REMOTE_POLL_PERIOD = 2
+# Quantas amostras do cliente o servidor guarda, e a janela (ms) das amostras usadas para ver obstáculos
+REMOTE_HISTORY_SIZE = 256
+OBSTACLE_WINDOW = 100
 
 SERVER_NAME = 'CV-EV3-1'
 CLIENT_NAME = 'CV-EV3-2'
 
+GRID_SIZE = 5
+SQUARE_SIZE = 300
+PROHIBITED_SQUARES = [(0, 1), (2, 1), (4, 1), (0, 3), (2, 3), (4, 3)]
 POSSIBLE_OBSTACLE_SQUARES = [(0, 2), (0, 4), (1, 1), (1, 3), (2, 2), (2, 4), (3, 1), (3, 3), (4, 2), (4, 4)]
+
+# Tempos estimados (ms) usados pelo planejador de caminho
+PATH_TURN_90_TIME = 1200
+PATH_TURN_180_TIME = 1900
+PATH_SQUARE_TIME = 1250
+PATH_SEGMENT_TIME = 700
+
+# Planejamento com custo esperado para os possíveis obstáculos ainda não vistos
+EXPECTED_COST_PLANNING = True
+OBSTACLE_PRIOR = 0.3
+OBSTACLE_DETECTION_RATE = 0.95
+OBSTACLE_FALSE_ALARM_RATE = 0.05
+PATH_DETOUR_TIME = 5000
+# Detecções de um possível obstáculo até ele virar um quadrado proibido, antes disso ele só fica mais caro
+OBSTACLE_CONFIRM_DETECTIONS = 2
+
+# Tempo máximo (ms) que uma leitura dos sensores é reaproveitada fora de um loop de controle
+SENSOR_SNAPSHOT_MAX_AGE = 10
+
+# Período (ms) dos loops de controle
+CONTROL_LOOP_PERIOD = 10
+
+# Perfil de velocidade (mm/s e mm/s²) para percorrer caminhos sem parar entre os quadrados
+TRAJECTORY_CRUISE_SPEED = 250
+TRAJECTORY_MIN_SPEED = 45
+TRAJECTORY_PROBE_SPEED = 100
+TRAJECTORY_PROBE_WINDOW = 20
+TRAJECTORY_ACCELERATION = 400
+
+# Critério para considerar o robô parado: ângulo do giroscópio sem mudar e rodas abaixo de SETTLE_MOTOR_SPEED
+# (graus/s) durante SETTLE_TIME (ms)
+SETTLE_TIME = 100
+SETTLE_MOTOR_SPEED = 15
+# Espera fixa (ms) depois de zerar o giroscópio, pelo sensor e não pelo movimento
+GYRO_RESET_DELAY = 250
+
+# Odometria: erros estimados do encoder e do giroscópio, e os limites a partir dos quais o robô realinha
+ODOMETRY_DISTANCE_ERROR = 0.02
+ODOMETRY_GYRO_DRIFT = 0.02
+ODOMETRY_GYRO_SCALE_ERROR = 0.01
+ODOMETRY_MAX_POSITION_ERROR = 40
+ODOMETRY_MAX_HEADING_ERROR = 4
+# Os erros acima ainda não foram medidos no robô: até lá ele sempre realinha na linha
+ODOMETRY_CALIBRATED = False
+# Distância (mm) do centro do eixo até os sensores de cor
+COLOR_SENSOR_OFFSET = 70
+
+# Tabelas de cores calibradas (tools/color_lut_build.py), sem elas as cores vêm dos limiares de rgb_to_color
+# e rgb_to_color_claw
+COLOR_LUT_FILE = 'color_lut.bin'
+CLAW_COLOR_LUT_FILE = 'claw_color_lut.bin'
+
+# Filtro dos sensores de cor: a cor muda quando aparece em COLOR_FILTER_VOTES das últimas COLOR_FILTER_SIZE
+# leituras, e o filtro recomeça se ficar mais de COLOR_FILTER_MAX_GAP ms sem leituras
+COLOR_FILTER_SIZE = 5
+COLOR_FILTER_VOTES = 3
+COLOR_FILTER_MAX_GAP = 50
+
+# Velocidade (mm/s) ao procurar uma linha, possível porque as cores são filtradas
+LINE_APPROACH_SPEED = 200
+
+# Medição do tubo: velocidade (mm/s) da passada rápida e da lenta, usada se a confiança ficar baixa
+STATS_MEDIAN_SIZE = 15
+MEASURE_TUBE_SPEED = 60
+MEASURE_TUBE_SLOW_SPEED = 25
+MEASURE_TUBE_DISTANCE = 50
+MEASURE_TUBE_MIN_SAMPLES = 10
+MEASURE_TUBE_MAX_STDDEV = 15
+MEASURE_TUBE_MIN_CONFIDENCE = 0.5
@@ -12,3 +12,4 @@ if __name__ == '__main__':
         while place is None:
             place = robot.take_person()
         robot.deliver_person(place)
+        print('idle time saved: {} ms'.format(robot.drive.get_idle_time_saved()))
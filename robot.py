@@ -2,10 +2,20 @@ from pybricks.hubs import EV3Brick
 
 from subsystems.claw import Claw
 from subsystems.drive import Drive, DrivePosition, Side
+from subsystems.remote_sensors import RemoteSensors
+from utils.protocol import STREAM_ALL, STREAM_OBSTACLE, STREAM_CLAW, STREAM_IDLE
 from pybricks.messaging import BluetoothMailboxServer
 from pybricks.parameters import Color
-from utils.utils_server import calculate_path, Place, get_deliver_positions, run_commands
 from pybricks.tools import wait
+from utils.utils_server import Place, get_deliver_positions, run_commands
+from utils.path_planner import PathPlanner
+from utils.obstacle_belief import ObstacleBelief
+from subsystems.commands import Scheduler, Parallel, Sequential, wait_command
+from constants import (EXPECTED_COST_PLANNING, LINE_APPROACH_SPEED, MEASURE_TUBE_DISTANCE, MEASURE_TUBE_SLOW_SPEED,
+                       MEASURE_TUBE_MIN_CONFIDENCE, GYRO_RESET_DELAY)
+
+# Custo extra (ms) por posição quando as posições devem ser tentadas em ordem
+ORDER_PREFERENCE_TIME = 1000000
 
 
 class Robot:
@@ -17,8 +27,12 @@ class Robot:
         print('connected!')
 
         self.hub = EV3Brick()
-        self.drive = Drive(server)
-        self.claw = Claw(server)
+        self.remote_sensors = RemoteSensors(server)
+        self.drive = Drive(self.remote_sensors)
+        self.claw = Claw(self.remote_sensors)
+        self.scheduler = Scheduler(on_tick=self.drive.begin_tick)
+        self.path_planner = PathPlanner()
+        self.obstacle_belief = ObstacleBelief() if EXPECTED_COST_PLANNING else None
 
         self.delivered_people = {
             Place.PARK: 0,
@@ -30,51 +44,89 @@ class Robot:
             Place.DRUGSTORE: 0
         }
 
+    def run_commands(self, delay, *functions):
+        # O delay é só um limite, cada comando começa assim que o robô estiver parado
+        run_commands(delay, *functions, pause=self.drive.wait_until_settled)
+
     def testes(self):
-        run_commands(500,
-                     lambda: self.drive.drive_straight(250, 200),
-                     lambda: self.drive.turn_angle(90),
-                     lambda: self.drive.drive_straight(250, 200),
-                     lambda: self.drive.turn_angle(90),
-                     lambda: self.drive.drive_straight(250, 200),
-                     lambda: self.drive.turn_angle(90),
-                     lambda: self.drive.drive_straight(250, 200),
-                     lambda: self.drive.turn_angle(90))
+        self.run_commands(500,
+                          lambda: self.drive.drive_straight(250, 200),
+                          lambda: self.drive.turn_angle(90),
+                          lambda: self.drive.drive_straight(250, 200),
+                          lambda: self.drive.turn_angle(90),
+                          lambda: self.drive.drive_straight(250, 200),
+                          lambda: self.drive.turn_angle(90),
+                          lambda: self.drive.drive_straight(250, 200),
+                          lambda: self.drive.turn_angle(90))
 
     def go_to_position(self, target_pos: DrivePosition):
+        return self.go_to_any_position([target_pos]) is not None
+
+    def go_to_any_position(self, target_positions: [DrivePosition], in_order=False):
+        # Com in_order, as posições são preferidas na ordem da lista, senão a mais rápida de alcançar
+        extra_costs = [i * ORDER_PREFERENCE_TIME for i in range(len(target_positions))] if in_order else None
+
         while True:
-            if (self.drive.get_position_x() == target_pos.x) and (self.drive.get_position_y() == target_pos.y):
+            if self.obstacle_belief is not None:
+                self.path_planner.set_square_costs(self.obstacle_belief.expected_costs())
+
+            result = self.path_planner.calculate_path_to_any((self.drive.get_position_x(), self.drive.get_position_y()),
+                                                             target_positions,
+                                                             self.drive.get_prohibited_squares(),
+                                                             self.drive.get_estimated_heading(),
+                                                             extra_costs)
+            if result is None:  # Se é impossível chegar em qualquer uma das localizações
+                return None
+
+            target_index, path = result
+            target_pos = target_positions[target_index]
+            if not path:
                 if self.drive.get_estimated_heading() != target_pos.heading:
-                    wait(250)
+                    self.drive.wait_until_settled(250)
                     self.drive.turn_to_side(target_pos.heading)
                 self.drive.set_position_x(target_pos.x)
                 self.drive.set_position_y(target_pos.y)
                 self.drive.set_heading(target_pos.heading)
-                return True
-
-            path = calculate_path((self.drive.get_position_x(), self.drive.get_position_y()),
-                                  (target_pos.x, target_pos.y),
-                                  self.drive.get_prohibited_squares())
-            if path is None:  # Se é impossível chegar na localização
+                return target_pos
+
+            # Durante o caminho só o sensor de obstáculos do cliente importa
+            previous_profile = self.remote_sensors.set_profile(STREAM_OBSTACLE)
+            arrived = self.drive.follow_path(path, check_square=self._check_square)
+            self.remote_sensors.set_profile(previous_profile)
+            if not arrived:
+                # Com a crença, uma leitura só deixa o quadrado mais caro, ele só é proibido depois de confirmado
+                square = self.drive.get_square_ahead()
+                if self.obstacle_belief is None:
+                    self.drive.add_obstacle(square)
+                elif self.obstacle_belief.is_confirmed(square):
+                    self.obstacle_belief.observe_blocked(square)
+                    self.drive.add_obstacle(square)
+
+    def forget_obstacles(self):
+        self.drive.clear_obstacles()
+        if self.obstacle_belief is not None:
+            self.obstacle_belief.reset()
+
+    def go_to_any_position_or_forget(self, target_positions: [DrivePosition], in_order=False):
+        # Leituras falsas podem ter fechado todos os caminhos: esquece os obstáculos vistos e tenta de novo
+        result = self.go_to_any_position(target_positions, in_order)
+        if result is None:
+            self.forget_obstacles()
+            result = self.go_to_any_position(target_positions, in_order)
+        return result
+
+    def _check_square(self, square):
+        seeing_obstacle = self.drive.is_seeing_obstacle_far()
+        if self.obstacle_belief is not None:
+            if not self.obstacle_belief.can_be_blocked(square):
+                # Só os possíveis obstáculos podem estar ocupados, a leitura é de outra coisa
                 return False
-
-            for (x, y) in path:
-                distance = max(abs(self.drive.get_position_x() - x), abs(self.drive.get_position_y() - y))
-
-                if (self.drive.get_position_y() == 0) and (self.drive.get_position_x() == 0) and (y == 0):
-                    wait(250)
-                    self.drive.drive_straight_squares(-distance, explicit_direction=self.drive.get_estimated_heading())
-                else:
-                    if self.drive.get_estimated_heading() != self.drive.get_side_of_adjacent_square((x, y)):
-                        wait(250)
-                        self.drive.turn_to_side(self.drive.get_side_of_adjacent_square((x, y)))
-
-                    if self.drive.is_seeing_obstacle_far():
-                        self.drive.add_obstacle(self.drive.get_square_ahead())
-                        break
-
-                    wait(250)
-                    self.drive.drive_straight_squares(distance, explicit_direction=self.drive.get_estimated_heading())
+            if seeing_obstacle:
+                self.obstacle_belief.observe(square, True)
+            else:
+                # O robô vai entrar no quadrado logo em seguida
+                self.obstacle_belief.observe_free(square)
+        return seeing_obstacle
 
     def deliver_person(self, place: Place):
         entrance_positions = get_deliver_positions(place, self.delivered_people[Place.PARK])
@@ -101,70 +153,91 @@ class Robot:
             else:
                 turn, distance = 0, 175
 
-        for position in entrance_positions:
-            if self.go_to_position(position):
-                break
-        # Nesse ponto o robô deve estar na posição e virado pra entrada
-        # Entrega a pessoa no local
-        self.drive.align_on_color([Color.BLUE, Color.BLACK, Color.YELLOW])
-        wait(250)
-        self.drive.drive_straight(100, distance=-distance)
-        self.claw.open()
-        self.drive.drive_straight(100, distance=distance - 40)
-
-        self.delivered_people[place] += 1
+        if self.go_to_any_position_or_forget(entrance_positions, in_order=(place == Place.PARK)) is None:
+            # Nenhuma entrada alcançável: solta a pessoa onde está para a garra ficar livre e volta pro canto
+            print('no path to', place)
+            self.claw.open()
+        else:
+            # Nesse ponto o robô deve estar na posição e virado pra entrada
+            # Entrega a pessoa no local
+            self.drive.align_on_color([Color.BLUE, Color.BLACK, Color.YELLOW])
+            self.drive.wait_until_settled(250)
+            self.drive.drive_straight(100, distance=-distance)
+            # A garra abre enquanto o robô já começa a sair da entrada
+            self.scheduler.run(Parallel(
+                self.claw.open_command(),
+                Sequential(wait_command(200), self.drive.drive_straight_command(100, distance=distance - 40))
+            ))
+
+            self.delivered_people[place] += 1
 
         # Volta pro canto (0, 0), virado pro vermelho
-        self.go_to_position(DrivePosition(1, 0, Side.FRONT))
-        self.drive.align_on_color([Color.BLUE])
-        wait(250)
-        self.drive.reset_gyro(0)
-        wait(250)
-        self.drive.drive_straight(150, distance=-40)
-        wait(250)
+        self.go_to_any_position_or_forget([DrivePosition(1, 0, Side.FRONT)])
+        if self.drive.needs_realignment():
+            self.drive.align_on_color([Color.BLUE])
+            self.drive.wait_until_settled(250)
+            self.drive.reset_gyro(0)
+            wait(GYRO_RESET_DELAY)
+            self.drive.drive_straight(150, distance=-40)
+            self.drive.wait_until_settled(250)
+        else:
+            # A odometria ainda é confiável: vai direto para onde o alinhamento deixaria o robô
+            self.drive.drive_straight(150, distance=self.drive.line_ahead_distance() - 40,
+                                      explicit_direction=Side.FRONT)
+            self.drive.wait_until_settled(250)
+            # Sem a linha o giroscópio é zerado mesmo assim, não custa nada
+            self.drive.reset_gyro(0)
+            wait(GYRO_RESET_DELAY)
         self.drive.turn_to_side(Side.LEFT)
 
         if sum(self.delivered_people.values()) < 2:
-            wait(500)
-            self.drive.drive_straight(100, stop_conditions=[self.drive.any_sensor_sees_color], explicit_direction=Side.LEFT),
+            self.drive.wait_until_settled(500)
+            self.drive.drive_straight(LINE_APPROACH_SPEED, stop_conditions=[self.drive.any_sensor_sees_color], explicit_direction=Side.LEFT),
             self.drive.align_on_color([Color.RED]),
-            wait(250)
+            self.drive.wait_until_settled(250)
             self.drive.reset_gyro(Side.LEFT)
 
     def take_person(self) -> None:
+        # Até pegar a pessoa nenhum sensor do cliente é usado (measure_tube pede o de cima)
+        self.remote_sensors.set_profile(STREAM_IDLE)
         while True:
-            run_commands(500,
-                         lambda: self.drive.drive_straight(-150, stop_conditions=[self.drive.is_seeing_person,
-                                                                                  self.drive.any_sensor_sees_color],
-                                                           explicit_direction=Side.LEFT))
+            self.run_commands(500,
+                              lambda: self.drive.drive_straight(-150, stop_conditions=[self.drive.is_seeing_person,
+                                                                                       self.drive.any_sensor_sees_color],
+                                                                explicit_direction=Side.LEFT))
             if self.drive.is_seeing_person():
                 break
             elif self.drive.any_sensor_sees_color([Color.RED]):
                 self.drive.drive_straight(150, distance=300)
-                self.drive.drive_straight(150, stop_conditions=[self.drive.any_sensor_sees_color])
+                self.drive.drive_straight(LINE_APPROACH_SPEED, stop_conditions=[self.drive.any_sensor_sees_color])
             else:
                 self.drive.drive_straight(-150, stop_conditions=[self.drive.is_seeing_person,
                                                                  self.drive.any_sensor_sees_color],
                                           explicit_direction=Side.LEFT)
 
-        distance, is_adult = self.drive.measure_tube()
+        distance, is_adult, confidence = self.drive.measure_tube()
+        if confidence < MEASURE_TUBE_MIN_CONFIDENCE:
+            # Volta para o início da passada e mede de novo, devagar
+            self.drive.drive_straight(100, distance=MEASURE_TUBE_DISTANCE, explicit_direction=Side.LEFT)
+            distance, is_adult, confidence = self.drive.measure_tube(MEASURE_TUBE_SLOW_SPEED)
         distance += 20
         self.drive.drive_straight(100, distance=55, explicit_direction=Side.LEFT)
-        run_commands(250,
-                     lambda: self.drive.turn_to_side(Side.BACK),
-                     lambda: self.drive.drive_straight(50, distance=-distance, explicit_direction=Side.BACK))
+        self.run_commands(250,
+                          lambda: self.drive.turn_to_side(Side.BACK),
+                          lambda: self.drive.drive_straight(50, distance=-distance, explicit_direction=Side.BACK))
 
         took_person = self.claw.grab()
+        self.remote_sensors.set_profile(STREAM_CLAW)
         self.drive.drive_straight(150, distance=distance + 20, explicit_direction=Side.BACK)
-        run_commands(250,
-                     lambda: self.drive.turn_to_side(Side.LEFT),
-                     lambda: self.drive.drive_straight(175, stop_conditions=[self.drive.any_sensor_sees_color],
-                                                       explicit_direction=Side.LEFT))
+        self.run_commands(250,
+                          lambda: self.drive.turn_to_side(Side.LEFT),
+                          lambda: self.drive.drive_straight(LINE_APPROACH_SPEED, stop_conditions=[self.drive.any_sensor_sees_color],
+                                                            explicit_direction=Side.LEFT))
         self.drive.align_on_color([Color.RED])
         self.drive.align_on_color([Color.RED])
-        wait(250)
+        self.drive.wait_until_settled(250)
         self.drive.reset_gyro(Side.LEFT)
-        wait(250)
+        wait(GYRO_RESET_DELAY)
         self.drive.drive_straight(150, distance=-35, explicit_direction=Side.LEFT)
 
         self.drive.set_position_x(0)
@@ -172,10 +245,12 @@ class Robot:
         self.drive.set_heading(Side.LEFT)
 
         if not took_person:
+            self.remote_sensors.set_profile(STREAM_ALL)
             self.claw.open()
             return None
 
         color = self.claw.claw_sensor_color()
+        self.remote_sensors.set_profile(STREAM_ALL)
 
         # Retorna o lugar que tem que levar a pessoa
         if is_adult:
@@ -198,21 +273,21 @@ class Robot:
     def find_reference_corner(self):
         def found_black_yellow():
             self.drive.align_on_color([Color.BLACK, Color.YELLOW])
-            run_commands(500,
-                         lambda: self.drive.drive_straight(150, distance=-50),
-                         lambda: self.drive.turn_angle(90))
+            self.run_commands(500,
+                              lambda: self.drive.drive_straight(150, distance=-50),
+                              lambda: self.drive.turn_angle(90))
 
         def found_blue():
             self.drive.align_on_color([Color.BLUE])
-            wait(250)
+            self.drive.wait_until_settled(250)
             self.drive.reset_gyro(0)
-            wait(250)
-            run_commands(500,
-                         lambda: self.drive.drive_straight(150, distance=-40),
-                         lambda: self.drive.turn_angle(-90),
-                         lambda: self.drive.drive_straight(150, stop_conditions=[self.drive.any_sensor_sees_color], explicit_direction=Side.LEFT))
+            wait(GYRO_RESET_DELAY)
+            self.run_commands(500,
+                              lambda: self.drive.drive_straight(150, distance=-40),
+                              lambda: self.drive.turn_angle(-90),
+                              lambda: self.drive.drive_straight(LINE_APPROACH_SPEED, stop_conditions=[self.drive.any_sensor_sees_color], explicit_direction=Side.LEFT))
             self.drive.align_on_color([Color.RED])
-            wait(250)
+            self.drive.wait_until_settled(250)
             self.drive.reset_gyro(Side.LEFT)
             self.drive.set_position_x(0)
             self.drive.set_position_y(0)
@@ -220,10 +295,10 @@ class Robot:
 
         def found_red():
             self.drive.align_on_color([Color.RED])
-            run_commands(500,
-                         lambda: self.drive.drive_straight(150, distance=-30),
-                         lambda: self.drive.turn_angle(90),
-                         lambda: self.drive.drive_straight(150, stop_conditions=[self.drive.any_sensor_sees_color]))
+            self.run_commands(500,
+                              lambda: self.drive.drive_straight(150, distance=-30),
+                              lambda: self.drive.turn_angle(90),
+                              lambda: self.drive.drive_straight(LINE_APPROACH_SPEED, stop_conditions=[self.drive.any_sensor_sees_color]))
 
             if self.drive.any_sensor_sees_color([Color.BLUE]):
                 found_blue()
@@ -231,10 +306,10 @@ class Robot:
 
             yellow_at_right = self.drive.align_on_color([Color.BLACK, Color.YELLOW])
 
-            run_commands(500,
-                         lambda: self.drive.drive_straight(150, distance=-40),
-                         lambda: self.drive.turn_angle(-180),
-                         lambda: self.drive.drive_straight(150, stop_conditions=[self.drive.any_sensor_sees_color]))
+            self.run_commands(500,
+                              lambda: self.drive.drive_straight(150, distance=-40),
+                              lambda: self.drive.turn_angle(-180),
+                              lambda: self.drive.drive_straight(LINE_APPROACH_SPEED, stop_conditions=[self.drive.any_sensor_sees_color]))
 
             if self.drive.any_sensor_sees_color([Color.BLUE]):
                 found_blue()
@@ -243,21 +318,21 @@ class Robot:
             yellow_at_left = self.drive.align_on_color([Color.BLACK, Color.YELLOW])
 
             if yellow_at_right and yellow_at_left:
-                run_commands(500,
-                             lambda: self.drive.drive_straight(150, distance=-40))
+                self.run_commands(500,
+                                  lambda: self.drive.drive_straight(150, distance=-40))
                 self.drive.set_position_y(4)
                 self.drive.set_position_x(0)
                 self.drive.set_heading(Side.BACK)
                 self.drive.reset_gyro(Side.BACK)
                 self.go_to_position(DrivePosition(1, 0, Side.FRONT))
-                self.drive.drive_straight(150, stop_conditions=[self.drive.any_sensor_sees_color])
+                self.drive.drive_straight(LINE_APPROACH_SPEED, stop_conditions=[self.drive.any_sensor_sees_color])
                 found_blue()
                 return
 
             self.drive.align_on_color([Color.BLACK, Color.YELLOW])
-            run_commands(500,
-                         lambda: self.drive.drive_straight(150, distance=-40),
-                         lambda: self.drive.turn_angle(-90))
+            self.run_commands(500,
+                              lambda: self.drive.drive_straight(150, distance=-40),
+                              lambda: self.drive.turn_angle(-90))
 
             self.drive.set_position_x(4)
             self.drive.set_position_y(2)
@@ -272,32 +347,32 @@ class Robot:
                     return
                 elif self.drive.any_sensor_sees_color([Color.BLACK]):
                     self.drive.align_on_color([Color.BLACK])
-                    run_commands(250,
-                                 lambda: self.drive.reset_gyro(Side.BACK),
-                                 lambda: self.drive.drive_straight(150, -50))
+                    self.run_commands(250,
+                                      lambda: self.drive.reset_gyro(Side.BACK),
+                                      lambda: self.drive.drive_straight(150, -50))
                     self.drive.set_position_x(1)
                     self.drive.set_position_y(4)
                     self.drive.set_heading(Side.BACK)
                     self.go_to_position(DrivePosition(1, 0, Side.FRONT))
-                    self.drive.drive_straight(150, stop_conditions=[self.drive.any_sensor_sees_color])
+                    self.drive.drive_straight(LINE_APPROACH_SPEED, stop_conditions=[self.drive.any_sensor_sees_color])
                     found_blue()
                     return
                 else:
-                    wait(500)
+                    self.drive.wait_until_settled(500)
                     self.drive.drive_straight(150, distance=-180)
                     self.drive.set_position_y(2)
                     self.drive.set_position_x(3)
                     self.drive.set_heading(Side.FRONT)
                     self.drive.add_obstacle(self.drive.get_square_ahead())
                     self.go_to_position(DrivePosition(1, 0, Side.FRONT))
-                    self.drive.drive_straight(150, stop_conditions=[self.drive.any_sensor_sees_color])
+                    self.drive.drive_straight(LINE_APPROACH_SPEED, stop_conditions=[self.drive.any_sensor_sees_color])
                     found_blue()
                     return
 
             else:
-                run_commands(500,
-                             lambda: self.drive.turn_angle(180),
-                             lambda: self.drive.drive_straight(150, stop_conditions=[self.drive.any_sensor_sees_color]))
+                self.run_commands(500,
+                                  lambda: self.drive.turn_angle(180),
+                                  lambda: self.drive.drive_straight(LINE_APPROACH_SPEED, stop_conditions=[self.drive.any_sensor_sees_color]))
                 found_blue()
                 return
 
@@ -313,6 +388,6 @@ class Robot:
                 found_blue()
                 break
             elif self.drive.is_seeing_obstacle_very_close():
-                run_commands(500,
-                             lambda: self.drive.drive_straight(150, distance=-180),
-                             lambda: self.drive.turn_angle(90))
+                self.run_commands(500,
+                                  lambda: self.drive.drive_straight(150, distance=-180),
+                                  lambda: self.drive.turn_angle(90))
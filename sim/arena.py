@@ -0,0 +1,425 @@
+"""
+2D kinematic model of the arena and of the robot, behind the simulated pybricks devices.
+
+The arena uses the same frame as utils.odometry.Odometry: x points to Side.RIGHT, y to Side.BACK, the
+center of the square (x, y) is at (x * SQUARE_SIZE, y * SQUARE_SIZE) and headings are in degrees,
+clockwise from Side.FRONT. The floor is white with colored lines on the border of the grid and around
+the buildings, obstacles are boxes in the middle of their squares and the people are tubes standing in
+the strip in front of the first row, like in the competition.
+
+The World integrates the motion lazily: every device access first advances the model to the current
+(virtual) time, in fixed substeps.
+"""
+
+import math
+import random
+import threading
+
+from pybricks.parameters import Color
+
+from constants import (GRID_SIZE, SQUARE_SIZE, PROHIBITED_SQUARES, WHEEL_DIAMETER, AXLE_TRACK,
+                       LEFT_MOTOR_PORT, RIGHT_MOTOR_PORT, CLAW_MOTOR_PORT, GYRO_PORT, SENSOR_1_PORT,
+                       SENSOR_3_PORT, BOTTOM_OBJECT_SENSOR_PORT, OBSTACLE_SENSOR_PORT, TOP_OBJECT_SENSOR_PORT,
+                       CLAW_COLOR_SENSOR_PORT)
+
+SERVER = 'server'
+CLIENT = 'client'
+
+# Limites do tapete e espessura das linhas (mm)
+ARENA_MIN = -SQUARE_SIZE / 2
+ARENA_MAX = (GRID_SIZE - 0.5) * SQUARE_SIZE
+LINE_WIDTH = 20
+# As bordas do tapete são faixas mais largas, para fora da linha da grade
+BORDER_WIDTH = 50
+
+# Cor das bordas esquerda e direita em cada fileira, e os lados de prédios (quadrado, lado) em amarelo: com
+# eles, vermelho de um lado e amarelo nos dois lados perpendiculares só acontecem em (0, 4), e vermelho sem
+# azul ou amarelo nos lados só em (4, 2)
+LEFT_BORDER = (Color.RED, Color.BLACK, Color.BLACK, Color.BLACK, Color.RED)
+RIGHT_BORDER = (Color.BLACK, Color.BLACK, Color.RED, Color.BLACK, Color.BLACK)
+YELLOW_BUILDING_SIDES = (((0, 3), 180),)
+
+# Linha em frente à primeira fileira, onde ficam as pessoas
+PEOPLE_Y = ARENA_MIN - 40
+PERSON_RADIUS = 20
+CHILD_HEIGHT = 100
+ADULT_HEIGHT = 200
+OBSTACLE_SIZE = 100
+OBSTACLE_HEIGHT = 250
+
+# Posição dos sensores no robô: (para frente, para a direita) em mm a partir do centro do eixo, direção
+# relativa à frente do robô e altura
+COLOR_SENSORS = {(SERVER, SENSOR_1_PORT.name): (70, -50), (SERVER, SENSOR_3_PORT.name): (70, 50)}
+ULTRASONIC_SENSORS = {
+    (SERVER, BOTTOM_OBJECT_SENSOR_PORT.name): (0, 70, 90, 50),
+    (CLIENT, OBSTACLE_SENSOR_PORT.name): (90, 0, 0, 120),
+    (CLIENT, TOP_OBJECT_SENSOR_PORT.name): (0, 70, 90, 150)
+}
+CLAW_COLOR_SENSOR = (CLIENT, CLAW_COLOR_SENSOR_PORT.name)
+ROBOT_RADIUS = 100
+# Ponto da garra (atrás do robô), distância máxima até o tubo para pegá-lo, e ângulos do motor
+CLAW_OFFSET = -80
+CLAW_REACH = 45
+CLAW_CLOSED_ANGLE = -320
+CLAW_GRIP_ANGLE = -200
+CLAW_RELEASE_ANGLE = -150
+
+ULTRASONIC_RANGE = 2500
+ULTRASONIC_BEAM = (-10, 0, 10)
+
+RGB = {
+    Color.WHITE: (70, 75, 80),
+    Color.BLACK: (10, 10, 12),
+    Color.YELLOW: (60, 55, 15),
+    Color.RED: (60, 12, 10),
+    Color.BLUE: (10, 18, 50),
+    Color.GREEN: (10, 40, 15),
+    Color.BROWN: (25, 15, 10)
+}
+# Cor vista pelo sensor da garra para cada cor de pessoa, e com a garra vazia
+CLAW_RGB = {
+    Color.RED: (40, 8, 6),
+    Color.BLUE: (6, 10, 35),
+    Color.GREEN: (8, 30, 8),
+    Color.BROWN: (12, 8, 6)
+}
+CLAW_EMPTY_RGB = (2, 2, 2)
+
+_DEGREES_TO_RADIANS = math.pi / 180
+
+
+class Person:
+    def __init__(self, x, color, adult, y=PEOPLE_Y):
+        """
+        :param x: Position of the tube along the strip, in mm.
+        :param color: The Color of the tube (RED, BLUE, GREEN or BROWN).
+        :param adult: Adults are tall enough to be seen by the top ultrasonic sensor.
+        """
+        self.x = x
+        self.y = y
+        self.color = color
+        self.adult = adult
+        self.height = ADULT_HEIGHT if adult else CHILD_HEIGHT
+        self.radius = PERSON_RADIUS
+
+
+class Arena:
+    """
+    The static layout: floor lines, buildings, obstacles, people and the start pose of the robot.
+
+    The border of the grid is blue in front (y = 0 side) and yellow at the back, and each building (the
+    PROHIBITED_SQUARES) is outlined in black. The colors of the left and right borders and of the
+    yellow building side follow what Robot.find_reference_corner expects to see from each square.
+    """
+
+    def __init__(self, obstacles=((2, 2), (4, 4)), people=None, start=(0, 0, 0)):
+        """
+        :param obstacles: Squares (x, y) holding an obstacle, usually some of the POSSIBLE_OBSTACLE_SQUARES.
+        :param people: List of Person, by default one of each kind that has a place to go.
+        :param start: Start pose of the robot (x in mm, y in mm, heading in degrees).
+        """
+        self.obstacles = [tuple(square) for square in obstacles]
+        if people is None:
+            people = [Person(250, Color.GREEN, False), Person(550, Color.BLUE, True),
+                      Person(850, Color.RED, True), Person(1150, Color.BROWN, False)]
+        self.people = people
+        self.start = start
+
+        half = LINE_WIDTH / 2
+        low, high = ARENA_MIN, ARENA_MAX
+        # Retângulos (x0, y0, x1, y1, cor), os últimos por cima dos primeiros
+        self.lines = []
+        for square in PROHIBITED_SQUARES:
+            x0, y0 = square[0] * SQUARE_SIZE - SQUARE_SIZE / 2, square[1] * SQUARE_SIZE - SQUARE_SIZE / 2
+            x1, y1 = x0 + SQUARE_SIZE, y0 + SQUARE_SIZE
+            color = lambda side: Color.YELLOW if (square, side) in YELLOW_BUILDING_SIDES else Color.BLACK
+            self.lines += [(x0 - half, y0 - half, x1 + half, y0 + half, color(0)),
+                           (x0 - half, y1 - half, x1 + half, y1 + half, color(180)),
+                           (x0 - half, y0 - half, x0 + half, y1 + half, color(270)),
+                           (x1 - half, y0 - half, x1 + half, y1 + half, color(90))]
+        outer = BORDER_WIDTH - half
+        self.lines += [(low - outer, high - half, high + outer, high + outer, Color.YELLOW),
+                       (low - outer, low - outer, high + outer, low + half, Color.BLUE)]
+        for row in range(GRID_SIZE):
+            y0, y1 = row * SQUARE_SIZE - SQUARE_SIZE / 2, row * SQUARE_SIZE + SQUARE_SIZE / 2
+            self.lines += [(low - outer, y0, low + half, y1, LEFT_BORDER[row]),
+                           (high - half, y0, high + outer, y1, RIGHT_BORDER[row])]
+
+    def floor_color(self, x, y):
+        for i in range(len(self.lines) - 1, -1, -1):
+            x0, y0, x1, y1, color = self.lines[i]
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                return color
+        return Color.WHITE
+
+    def obstacle_boxes(self):
+        half = OBSTACLE_SIZE / 2
+        return [(x * SQUARE_SIZE - half, y * SQUARE_SIZE - half, x * SQUARE_SIZE + half, y * SQUARE_SIZE + half)
+                for (x, y) in self.obstacles]
+
+
+class MotorModel:
+    """
+    A motor with an acceleration limit, following the mode set by the pybricks Motor: 'coast',
+    'hold' (position control on *hold_angle*), 'run' (constant speed) and 'target' (run to
+    *target_angle*, then *then*). The angle is clamped to [*min_angle*, *max_angle*], which stalls it.
+    """
+
+    def __init__(self, max_speed=1000, acceleration=3000, coast_deceleration=1500):
+        self.max_speed = max_speed
+        self.acceleration = acceleration
+        self.coast_deceleration = coast_deceleration
+        self.min_angle = -math.inf
+        self.max_angle = math.inf
+
+        self.angle = 0.0
+        self.speed = 0.0
+        self.mode = 'coast'
+        self.run_speed = 0.0
+        self.hold_angle = 0.0
+        self.target_angle = 0.0
+        self.then = 'hold'
+        self.stalled = False
+
+    def update(self, dt):
+        if self.mode == 'run':
+            wanted, limit = self.run_speed, self.acceleration
+        elif self.mode == 'hold':
+            wanted, limit = 20 * (self.hold_angle - self.angle), self.acceleration
+        elif self.mode == 'target':
+            error = self.target_angle - self.angle
+            if abs(error) <= 1:
+                self.angle = self.target_angle
+                self.set_mode(self.then)
+                return
+            # Freia a tempo de parar no alvo
+            braking = math.sqrt(2 * self.acceleration * abs(error))
+            wanted = math.copysign(min(abs(self.run_speed), braking), error)
+            limit = self.acceleration
+        else:
+            wanted, limit = 0.0, self.coast_deceleration
+
+        wanted = max(-self.max_speed, min(self.max_speed, wanted))
+        change = max(-limit * dt, min(limit * dt, wanted - self.speed))
+        self.speed += change
+        self.angle += self.speed * dt
+
+        self.stalled = False
+        if self.angle < self.min_angle or self.angle > self.max_angle:
+            self.angle = max(self.min_angle, min(self.max_angle, self.angle))
+            self.speed = 0.0
+            self.stalled = True
+
+    def set_mode(self, mode):
+        if mode in ('hold', 'brake'):
+            self.hold_angle = self.angle
+            mode = 'hold' if mode == 'hold' else 'coast'
+        self.mode = mode
+
+    def reset_angle(self, angle):
+        self.hold_angle += angle - self.angle
+        self.target_angle += angle - self.angle
+        self.min_angle += angle - self.angle
+        self.max_angle += angle - self.angle
+        self.angle = float(angle)
+
+
+class World:
+    """
+    The dynamic state of one simulated run: the pose of the robot, the motors, where each person is,
+    and the log of events, as tuples (time in s, 'pickup', 'delivery' or 'collision', the Person or
+    None, (x, y) where it happened).
+
+    :param noise: Standard deviation of the sensor noise, as a dict with the keys 'color' (RGB units),
+        'ultrasonic' (mm), 'gyro_drift' (degrees per second) and 'wheel' (fraction of the wheel diameter,
+        a fixed error per wheel).
+    """
+
+    def __init__(self, arena, seed=0, noise=None, step=0.002):
+        self.arena = arena
+        self.seed = seed
+        self.step = step
+        self.noise = {'color': 2.0, 'ultrasonic': 3.0, 'gyro_drift': 0.02, 'wheel': 0.005}
+        if noise is not None:
+            self.noise.update(noise)
+        self.lock = threading.RLock()
+        self.time = 0.0
+        self._randoms = {}
+
+        rng = random.Random(seed)
+        self.x, self.y, self.heading = (float(value) for value in arena.start)
+        self.turn_rate = 0.0
+        self.gyro_drift = rng.gauss(0, self.noise['gyro_drift'])
+        self.wheel_diameters = (WHEEL_DIAMETER * (1 + rng.gauss(0, self.noise['wheel'])),
+                                WHEEL_DIAMETER * (1 + rng.gauss(0, self.noise['wheel'])))
+
+        self.people = [Person(person.x, person.color, person.adult, person.y) for person in arena.people]
+        self.obstacle_boxes = arena.obstacle_boxes()
+        self.held = None
+        self.delivered = []
+        self.events = []
+        self._colliding = False
+        self._on_delivery = None
+
+        self.motors = {(SERVER, port.name): MotorModel() for port in (LEFT_MOTOR_PORT, RIGHT_MOTOR_PORT)}
+        claw = MotorModel(max_speed=600)
+        claw.min_angle, claw.max_angle = CLAW_CLOSED_ANGLE, 0
+        self.motors[(SERVER, CLAW_MOTOR_PORT.name)] = claw
+        self._left = self.motors[(SERVER, LEFT_MOTOR_PORT.name)]
+        self._right = self.motors[(SERVER, RIGHT_MOTOR_PORT.name)]
+        self._claw = claw
+        self._gyro_key = (SERVER, GYRO_PORT.name)
+
+    def random(self, key):
+        """An independent random generator for one device, so the noise doesn't depend on thread timing."""
+        generator = self._randoms.get(key)
+        if generator is None:
+            generator = self._randoms[key] = random.Random('{}:{}:{}'.format(self.seed, key[0], key[1]))
+        return generator
+
+    def on_delivery(self, callback):
+        """Call *callback(world)* after every person is delivered."""
+        self._on_delivery = callback
+
+    def advance(self, time):
+        """Integrate the model up to *time* (seconds)."""
+        with self.lock:
+            while self.time + self.step <= time:
+                self._update(self.step)
+                self.time += self.step
+            if time > self.time:
+                self._update(time - self.time)
+                self.time = time
+
+    def _update(self, dt):
+        left, right, claw = self._left, self._right, self._claw
+        left.update(dt)
+        right.update(dt)
+        claw.update(dt)
+
+        left_speed = left.speed * math.pi * self.wheel_diameters[0] / 360
+        right_speed = right.speed * math.pi * self.wheel_diameters[1] / 360
+        speed = (left_speed + right_speed) / 2
+        self.turn_rate = (left_speed - right_speed) / AXLE_TRACK / _DEGREES_TO_RADIANS
+
+        # Integra no ângulo médio do passo
+        heading = (self.heading + self.turn_rate * dt / 2) * _DEGREES_TO_RADIANS
+        self.x += speed * math.sin(heading) * dt
+        self.y -= speed * math.cos(heading) * dt
+        self.heading += self.turn_rate * dt
+
+        self._update_claw()
+        self._check_collision()
+
+    def _update_claw(self):
+        claw = self._claw
+        if self.held is None:
+            if claw.angle <= CLAW_GRIP_ANGLE and claw.speed < 0 and claw.min_angle < CLAW_GRIP_ANGLE:
+                x, y = self.claw_position()
+                for person in self.people:
+                    if math.hypot(person.x - x, person.y - y) <= CLAW_REACH:
+                        # O tubo trava a garra, que fica parada no ângulo de pegada
+                        self.held = person
+                        claw.min_angle = claw.angle
+                        claw.speed = 0.0
+                        self.events.append((self.time, 'pickup', person, (person.x, person.y)))
+                        break
+        elif claw.angle > claw.min_angle + (CLAW_RELEASE_ANGLE - CLAW_GRIP_ANGLE):
+            person, self.held = self.held, None
+            person.x, person.y = self.claw_position()
+            claw.min_angle += CLAW_CLOSED_ANGLE - CLAW_GRIP_ANGLE
+            self.delivered.append(person)
+            self.events.append((self.time, 'delivery', person, (person.x, person.y)))
+            if self._on_delivery is not None:
+                self._on_delivery(self)
+
+        if self.held is not None:
+            self.held.x, self.held.y = self.claw_position()
+
+    def _check_collision(self):
+        colliding = False
+        for (x0, y0, x1, y1) in self.obstacle_boxes:
+            nearest_x = max(x0, min(self.x, x1))
+            nearest_y = max(y0, min(self.y, y1))
+            if math.hypot(self.x - nearest_x, self.y - nearest_y) < ROBOT_RADIUS:
+                colliding = True
+                break
+        if colliding and not self._colliding:
+            self.events.append((self.time, 'collision', None, (self.x, self.y)))
+        self._colliding = colliding
+
+    def to_world(self, forward, right):
+        """Position in the arena of a point given relative to the robot (mm forward and to the right)."""
+        heading = self.heading * _DEGREES_TO_RADIANS
+        sin_h, cos_h = math.sin(heading), math.cos(heading)
+        return self.x + forward * sin_h + right * cos_h, self.y - forward * cos_h + right * sin_h
+
+    def claw_position(self):
+        return self.to_world(CLAW_OFFSET, 0)
+
+    def motor(self, key):
+        return self.motors.get(key)
+
+    def sensor_color(self, key):
+        """The color under the color sensor *key*, or held by the claw for the claw sensor."""
+        if key == CLAW_COLOR_SENSOR:
+            return None if self.held is None else self.held.color
+        x, y = self.to_world(*COLOR_SENSORS[key])
+        return self.arena.floor_color(x, y)
+
+    def sensor_rgb(self, key):
+        """RGB reading (without noise) of the color sensor *key*."""
+        if key == CLAW_COLOR_SENSOR:
+            return CLAW_EMPTY_RGB if self.held is None else CLAW_RGB[self.held.color]
+        return RGB[self.sensor_color(key)]
+
+    def ultrasonic_distance(self, key):
+        """Closest object in the beam of the ultrasonic sensor *key*, in mm, or None if there's none in range."""
+        forward, right, direction, height = ULTRASONIC_SENSORS[key]
+        origin_x, origin_y = self.to_world(forward, right)
+        best = ULTRASONIC_RANGE
+        for offset in ULTRASONIC_BEAM:
+            angle = (self.heading + direction + offset) * _DEGREES_TO_RADIANS
+            dx, dy = math.sin(angle), -math.cos(angle)
+            for person in self.people:
+                if person is self.held or person.height < height:
+                    continue
+                distance = _ray_circle(origin_x, origin_y, dx, dy, person.x, person.y, person.radius)
+                if distance is not None and distance < best:
+                    best = distance
+            for box in self.obstacle_boxes:
+                distance = _ray_box(origin_x, origin_y, dx, dy, box)
+                if distance is not None and distance < best:
+                    best = distance
+        return None if best >= ULTRASONIC_RANGE else best
+
+    def gyro_angle(self):
+        return self.heading + self.gyro_drift * self.time
+
+
+def _ray_circle(x, y, dx, dy, cx, cy, radius):
+    fx, fy = x - cx, y - cy
+    b = fx * dx + fy * dy
+    c = fx * fx + fy * fy - radius * radius
+    discriminant = b * b - c
+    if discriminant < 0:
+        return None
+    distance = -b - math.sqrt(discriminant)
+    return distance if distance >= 0 else None
+
+
+def _ray_box(x, y, dx, dy, box):
+    x0, y0, x1, y1 = box
+    near, far = -math.inf, math.inf
+    for origin, direction, low, high in ((x, dx, x0, x1), (y, dy, y0, y1)):
+        if abs(direction) < 1e-9:
+            if not low <= origin <= high:
+                return None
+            continue
+        t0, t1 = (low - origin) / direction, (high - origin) / direction
+        if t0 > t1:
+            t0, t1 = t1, t0
+        near, far = max(near, t0), min(far, t1)
+    if near > far or far < 0:
+        return None
+    return max(near, 0.0)
@@ -0,0 +1,24 @@
+"""Time source of the stand-in modules, real time unless set_clock() installs another one."""
+
+import time as _time
+
+_time_function = _time.monotonic
+_sleep_function = _time.sleep
+
+
+def set_clock(time_function, sleep_function):
+    """
+    :param time_function: Returns the current time in seconds.
+    :param sleep_function: Blocks for the given time in seconds.
+    """
+    global _time_function, _sleep_function
+    _time_function = time_function
+    _sleep_function = sleep_function
+
+
+def time():
+    return _time_function()
+
+
+def sleep(seconds):
+    _sleep_function(seconds)
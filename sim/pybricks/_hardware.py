@@ -0,0 +1,37 @@
+"""
+Binding between the stand-in devices and the simulated World (sim/arena.py).
+
+Each thread runs the program of one brick (see sim/simulator.py) and the devices remember the brick
+they were created on, so the same port can mean a different device on the server and on the client.
+The World is looked up on every access, so devices created at import time (like the class attributes
+of Drive) keep working when a new World is attached.
+"""
+
+import threading
+
+from pybricks import _clock
+
+_local = threading.local()
+_world = None
+
+
+def attach(world):
+    global _world
+    _world = world
+
+
+def set_brick(name):
+    """Set the brick of the devices created by the calling thread."""
+    _local.brick = name
+
+
+def brick():
+    return getattr(_local, 'brick', 'server')
+
+
+def world():
+    """The attached World, advanced to the current time."""
+    if _world is None:
+        raise OSError('no simulated world attached')
+    _world.advance(_clock.time())
+    return _world
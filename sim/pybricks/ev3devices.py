@@ -0,0 +1,154 @@
+"""
+Simulated EV3 motors and sensors, reading and driving the World attached with _hardware.attach().
+
+The positive direction of a motor is always the one that moves the robot (or closes the claw) the way
+the project expects, so *positive_direction* is accepted and ignored.
+"""
+
+from pybricks import _hardware
+from pybricks.parameters import Direction, Stop
+from pybricks.tools import wait
+
+_ULTRASONIC_MAX = 2550
+_STOP_MODES = {Stop.COAST: 'coast', Stop.BRAKE: 'brake', Stop.HOLD: 'hold'}
+
+
+class _Device:
+    def __init__(self, port):
+        self.port = port
+        self._key = (_hardware.brick(), port.name)
+
+    def _world(self):
+        return _hardware.world()
+
+    def _noise(self, world, deviation):
+        return world.random(self._key).gauss(0, deviation) if deviation else 0.0
+
+
+class Control:
+    def __init__(self, motor):
+        self._motor = motor
+
+    def done(self):
+        model = self._motor._model()
+        return model.mode != 'target' and model.mode != 'run'
+
+    def stalled(self):
+        return self._motor._model().stalled
+
+
+class Motor(_Device):
+    def __init__(self, port, positive_direction=Direction.CLOCKWISE, gears=None):
+        _Device.__init__(self, port)
+        self.control = Control(self)
+
+    def _model(self):
+        model = self._world().motor(self._key)
+        if model is None:
+            raise OSError('no motor on {} of the {}'.format(self.port, self._key[0]))
+        return model
+
+    def angle(self):
+        return int(round(self._model().angle))
+
+    def speed(self):
+        return int(round(self._model().speed))
+
+    def reset_angle(self, angle=0):
+        self._model().reset_angle(angle)
+
+    def stop(self):
+        self._model().set_mode('coast')
+
+    def brake(self):
+        self._model().set_mode('brake')
+
+    def hold(self):
+        self._model().set_mode('hold')
+
+    def run(self, speed):
+        model = self._model()
+        model.run_speed = speed
+        model.mode = 'run'
+
+    def run_time(self, speed, time, then=Stop.HOLD, wait=True):
+        self.run(speed)
+        self._wait_for(lambda: False, time)
+        self._model().set_mode(_STOP_MODES[then])
+
+    def run_angle(self, speed, rotation_angle, then=Stop.HOLD, wait=True):
+        self.run_target(speed, self._model().angle + rotation_angle * (1 if speed >= 0 else -1), then, wait)
+
+    def run_target(self, speed, target_angle, then=Stop.HOLD, wait=True):
+        model = self._model()
+        model.run_speed = abs(speed)
+        model.target_angle = target_angle
+        model.then = _STOP_MODES[then]
+        model.mode = 'target'
+        if wait:
+            self._wait_for(self.control.done)
+
+    def run_until_stalled(self, speed, then=Stop.COAST, duty_limit=None):
+        self.run(speed)
+        self._wait_for(lambda: self._model().stalled)
+        self._model().set_mode(_STOP_MODES[then])
+        return self.angle()
+
+    def dc(self, duty):
+        self.run(duty * self._model().max_speed / 100)
+
+    def _wait_for(self, condition, timeout=None):
+        elapsed = 0
+        while not condition() and (timeout is None or elapsed < timeout):
+            wait(5)
+            elapsed += 5
+
+
+class ColorSensor(_Device):
+    def rgb(self):
+        world = self._world()
+        red, green, blue = world.sensor_rgb(self._key)
+        deviation = world.noise['color']
+        return tuple(max(0, min(100, int(round(value + self._noise(world, deviation))))) for value in (red, green, blue))
+
+    def color(self):
+        return self._world().sensor_color(self._key)
+
+    def reflection(self):
+        return sum(self.rgb()) // 3
+
+    def ambient(self):
+        return 0
+
+
+class GyroSensor(_Device):
+    def __init__(self, port, positive_direction=Direction.CLOCKWISE):
+        _Device.__init__(self, port)
+        self._offset = 0.0
+
+    def angle(self):
+        return int(round(self._world().gyro_angle() - self._offset))
+
+    def speed(self):
+        return int(round(self._world().turn_rate))
+
+    def reset_angle(self, angle):
+        self._offset = self._world().gyro_angle() - angle
+
+
+class UltrasonicSensor(_Device):
+    def distance(self, silent=False):
+        world = self._world()
+        distance = world.ultrasonic_distance(self._key)
+        if distance is None:
+            # Nada no alcance do sensor
+            return _ULTRASONIC_MAX
+        return max(0, min(_ULTRASONIC_MAX, int(round(distance + self._noise(world, world.noise['ultrasonic'])))))
+
+    def presence(self):
+        return False
+
+
+class TouchSensor(_Device):
+    def pressed(self):
+        return False
@@ -0,0 +1,55 @@
+class _Speaker:
+    def beep(self, frequency=500, duration=100):
+        pass
+
+    def play_notes(self, notes, tempo=120):
+        pass
+
+    def say(self, text):
+        print(text)
+
+    def set_volume(self, volume, which='_all_'):
+        pass
+
+
+class _Light:
+    def on(self, color):
+        self.color = color
+
+    def off(self):
+        self.color = None
+
+
+class _Buttons:
+    def pressed(self):
+        return []
+
+
+class _Screen:
+    def clear(self):
+        pass
+
+    def print(self, *args, sep=' ', end='\n'):
+        print(*args, sep=sep, end=end)
+
+    def draw_text(self, x, y, text, text_color=None, background_color=None):
+        pass
+
+
+class _Battery:
+    def voltage(self):
+        return 7800
+
+    def current(self):
+        return 180
+
+
+class EV3Brick:
+    """The brick buttons are never pressed, and whatever is said or printed goes to the standard output."""
+
+    def __init__(self):
+        self.speaker = _Speaker()
+        self.light = _Light()
+        self.buttons = _Buttons()
+        self.screen = _Screen()
+        self.battery = _Battery()
@@ -0,0 +1,301 @@
+"""
+Loopback stand-in for pybricks.messaging: the same mailbox and connection API, between threads of one
+process (transport 'queue') or between processes over a local TCP socket (transport 'socket', with the
+EV3 mailbox message format). Every received message can be delayed (latency plus uniform jitter, in
+ms, keeping the order of the messages like the Bluetooth link does) or dropped (loss probability).
+"""
+
+import heapq
+import random
+import socket
+import struct
+import threading
+
+from pybricks import _clock
+
+_config = {
+    'transport': 'queue',
+    'host': '127.0.0.1',
+    'port': 50420,
+    'latency': 0.0,
+    'jitter': 0.0,
+    'loss': 0.0,
+    'seed': None,
+    'timeout': 30.0
+}
+
+# Servidores esperando conexões no transporte 'queue'
+_servers = []
+_registry = threading.Condition()
+
+_POLL = 0.001
+
+
+def configure(**options):
+    """
+    Set the options of the connections created from now on: transport ('queue' or 'socket'), host
+    and port (socket), latency and jitter (ms), loss (probability of dropping each message), seed (of
+    the random loss and jitter) and timeout (seconds waiting for the other side to connect).
+    """
+    for key, value in options.items():
+        if key not in _config:
+            raise TypeError('unknown option {!r}'.format(key))
+        _config[key] = value
+
+
+def reset():
+    """Forget the servers waiting for connections, so a new run starts from scratch."""
+    with _registry:
+        del _servers[:]
+
+
+def encode_message(name, payload):
+    """A mailbox message in the format the EV3 sends over Bluetooth (a system command)."""
+    name = name.encode() + b'\0'
+    body = struct.pack('<HBBB', 1, 0x81, 0x9E, len(name)) + name + struct.pack('<H', len(payload)) + payload
+    return struct.pack('<H', len(body)) + body
+
+
+def decode_message(body):
+    """The (name, payload) of a message made by encode_message, without its first two (size) bytes."""
+    name_size = body[4]
+    name = body[5:5 + name_size - 1].decode()
+    payload_size = struct.unpack_from('<H', body, 5 + name_size)[0]
+    start = 7 + name_size
+    return name, bytes(body[start:start + payload_size])
+
+
+class _QueuePeer:
+    def __init__(self, remote):
+        self.remote = remote
+
+    def send(self, name, payload):
+        self.remote._receive(name, payload)
+
+    def close(self):
+        pass
+
+
+class _SocketPeer:
+    def __init__(self, sock, local):
+        self._socket = sock
+        self._lock = threading.Lock()
+        self._local = local
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._thread.start()
+
+    def send(self, name, payload):
+        with self._lock:
+            self._socket.sendall(encode_message(name, payload))
+
+    def close(self):
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+    def _read_exactly(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self._socket.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def _read_loop(self):
+        try:
+            while True:
+                header = self._read_exactly(2)
+                if header is None:
+                    return
+                body = self._read_exactly(struct.unpack('<H', header)[0])
+                if body is None:
+                    return
+                self._local._receive(*decode_message(body))
+        except OSError:
+            return
+
+
+class MailboxConnection:
+    """Common part of the server and the client: the mailboxes of this end and the link to the other."""
+
+    def __init__(self):
+        self.latency = _config['latency']
+        self.jitter = _config['jitter']
+        self.loss = _config['loss']
+        self._random = random.Random(_config['seed'])
+
+        self._mailboxes = {}
+        self._updates = {}
+        self._pending = []
+        self._counter = 0
+        self._last_delivery = 0.0
+        self._condition = threading.Condition()
+        self._peers = []
+
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+
+    def _receive(self, name, payload):
+        with self._condition:
+            if self.loss and self._random.random() < self.loss:
+                self.dropped += 1
+                return
+            delay = self.latency
+            if self.jitter:
+                delay += self._random.uniform(-self.jitter, self.jitter)
+            # O Bluetooth não reordena as mensagens, então uma mensagem nunca chega antes da anterior
+            delivery = max(_clock.time() + max(delay, 0.0) / 1000, self._last_delivery)
+            self._last_delivery = delivery
+            heapq.heappush(self._pending, (delivery, self._counter, name, payload))
+            self._counter += 1
+
+    def _process(self):
+        now = _clock.time()
+        pending = self._pending
+        while pending and pending[0][0] <= now:
+            _, _, name, payload = heapq.heappop(pending)
+            self._mailboxes[name] = payload
+            self._updates[name] = self._updates.get(name, 0) + 1
+            self.received += 1
+
+    def read_from_mailbox(self, name):
+        with self._condition:
+            self._process()
+            return self._mailboxes.get(name)
+
+    def updates(self, name):
+        """How many messages were delivered to the mailbox *name* so far."""
+        with self._condition:
+            self._process()
+            return self._updates.get(name, 0)
+
+    def send_to_mailbox(self, brick, name, payload):
+        for peer in list(self._peers):
+            peer.send(name, payload)
+            self.sent += 1
+
+    def wait_for_mailbox_update(self, name, updates):
+        while self.updates(name) <= updates:
+            _clock.sleep(_POLL)
+
+    def stats(self):
+        with self._condition:
+            return {'sent': self.sent, 'received': self.received, 'dropped': self.dropped,
+                    'in_flight': len(self._pending)}
+
+    def close(self):
+        for peer in self._peers:
+            peer.close()
+        self._peers = []
+
+    def _add_peer(self, peer):
+        with self._condition:
+            self._peers.append(peer)
+            self._condition.notify_all()
+
+
+class BluetoothMailboxServer(MailboxConnection):
+    def wait_for_connection(self, count=1):
+        if _config['transport'] == 'socket':
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((_config['host'], _config['port']))
+            listener.listen(count)
+            listener.settimeout(_config['timeout'])
+            try:
+                for _ in range(count):
+                    sock, _ = listener.accept()
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    self._add_peer(_SocketPeer(sock, self))
+            finally:
+                listener.close()
+            return
+
+        with _registry:
+            _servers.append(self)
+            _registry.notify_all()
+        with self._condition:
+            if not self._condition.wait_for(lambda: len(self._peers) >= count, _config['timeout']):
+                raise OSError('no client connected')
+
+    def close(self):
+        with _registry:
+            if self in _servers:
+                _servers.remove(self)
+        MailboxConnection.close(self)
+
+
+class BluetoothMailboxClient(MailboxConnection):
+    def connect(self, brick):
+        if _config['transport'] == 'socket':
+            deadline = _clock.time() + _config['timeout']
+            while True:
+                try:
+                    sock = socket.create_connection((_config['host'], _config['port']))
+                    break
+                except OSError:
+                    if _clock.time() > deadline:
+                        raise
+                    _clock.sleep(0.05)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._add_peer(_SocketPeer(sock, self))
+            return
+
+        with _registry:
+            # O nome do brick é ignorado, há um só servidor por teste
+            if not _registry.wait_for(lambda: _servers, _config['timeout']):
+                raise OSError('no server waiting for connections')
+            server = _servers[-1]
+        self._add_peer(_QueuePeer(server))
+        server._add_peer(_QueuePeer(self))
+
+
+class Mailbox:
+    def __init__(self, name, connection, encode=None, decode=None):
+        self.name = name
+        self._connection = connection
+        self._encode = encode
+        self._decode = decode
+
+    def read(self):
+        data = self._connection.read_from_mailbox(self.name)
+        if data is None or self._decode is None:
+            return data
+        return self._decode(data)
+
+    def send(self, value, brick=None):
+        data = value if self._encode is None else self._encode(value)
+        self._connection.send_to_mailbox(brick, self.name, bytes(data))
+
+    def wait(self):
+        self._connection.wait_for_mailbox_update(self.name, self._connection.updates(self.name))
+
+    def wait_new(self):
+        old = self.read()
+        while True:
+            self.wait()
+            new = self.read()
+            if new != old:
+                return new
+
+
+class LogicMailbox(Mailbox):
+    def __init__(self, name, connection):
+        Mailbox.__init__(self, name, connection, lambda value: b'\x01' if value else b'\x00',
+                         lambda data: data[0] != 0)
+
+
+class NumericMailbox(Mailbox):
+    def __init__(self, name, connection):
+        Mailbox.__init__(self, name, connection, lambda value: struct.pack('<f', value),
+                         lambda data: struct.unpack('<f', data)[0])
+
+
+class TextMailbox(Mailbox):
+    def __init__(self, name, connection):
+        Mailbox.__init__(self, name, connection, lambda value: value.encode() + b'\0',
+                         lambda data: bytes(data).split(b'\0')[0].decode())
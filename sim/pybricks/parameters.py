@@ -0,0 +1,19 @@
+class _Constant:
+    def __init__(self, kind, name):
+        self._kind = kind
+        self.name = name
+
+    def __repr__(self):
+        return '{}.{}'.format(self._kind, self.name)
+
+
+def _constants(kind, names):
+    return type(kind, (), {name: _Constant(kind, name) for name in names})
+
+
+Port = _constants('Port', ('A', 'B', 'C', 'D', 'S1', 'S2', 'S3', 'S4'))
+Color = _constants('Color', ('BLACK', 'BLUE', 'GREEN', 'YELLOW', 'RED', 'WHITE', 'BROWN', 'ORANGE', 'PURPLE'))
+Direction = _constants('Direction', ('CLOCKWISE', 'COUNTERCLOCKWISE'))
+Stop = _constants('Stop', ('COAST', 'BRAKE', 'HOLD'))
+Button = _constants('Button', ('LEFT_DOWN', 'DOWN', 'RIGHT_DOWN', 'LEFT', 'CENTER', 'RIGHT', 'LEFT_UP', 'UP',
+                               'BEACON', 'RIGHT_UP'))
@@ -0,0 +1,67 @@
+from math import pi
+
+from pybricks.tools import wait
+
+
+class DriveBase:
+    """Differential drive on two simulated motors, with the same sign conventions as Pybricks."""
+
+    def __init__(self, left_motor, right_motor, wheel_diameter, axle_track):
+        self._left = left_motor
+        self._right = right_motor
+        self._mm_per_degree = pi * wheel_diameter / 360
+        self._axle_track = axle_track
+        self._straight_speed = 200
+        self._turn_rate = 100
+
+    def drive(self, speed, turn_rate):
+        # Velocidade de giro positiva vira no sentido horário, com a roda esquerda mais rápida
+        difference = turn_rate * pi / 180 * self._axle_track / 2
+        self._left.run((speed + difference) / self._mm_per_degree)
+        self._right.run((speed - difference) / self._mm_per_degree)
+
+    def stop(self):
+        self._left.stop()
+        self._right.stop()
+
+    def distance(self):
+        return int(round((self._left.angle() + self._right.angle()) / 2 * self._mm_per_degree))
+
+    def angle(self):
+        difference = (self._left.angle() - self._right.angle()) * self._mm_per_degree
+        return int(round(difference / self._axle_track * 180 / pi))
+
+    def state(self):
+        speed = (self._left.speed() + self._right.speed()) / 2 * self._mm_per_degree
+        turn_rate = (self._left.speed() - self._right.speed()) * self._mm_per_degree / self._axle_track * 180 / pi
+        return self.distance(), int(speed), self.angle(), int(turn_rate)
+
+    def reset(self):
+        self._left.reset_angle(0)
+        self._right.reset_angle(0)
+
+    def settings(self, straight_speed=None, straight_acceleration=None, turn_rate=None, turn_acceleration=None):
+        if straight_speed is None and turn_rate is None:
+            return self._straight_speed, straight_acceleration, self._turn_rate, turn_acceleration
+        if straight_speed is not None:
+            self._straight_speed = straight_speed
+        if turn_rate is not None:
+            self._turn_rate = turn_rate
+
+    def straight(self, distance):
+        start = self.distance()
+        speed = self._straight_speed if distance >= 0 else -self._straight_speed
+        while abs(self.distance() - start) < abs(distance):
+            self.drive(speed, 0)
+            wait(5)
+        self._left.hold()
+        self._right.hold()
+
+    def turn(self, angle):
+        start = self.angle()
+        turn_rate = self._turn_rate if angle >= 0 else -self._turn_rate
+        while abs(self.angle() - start) < abs(angle):
+            self.drive(0, turn_rate)
+            wait(5)
+        self._left.hold()
+        self._right.hold()
@@ -0,0 +1,31 @@
+from pybricks import _clock
+
+
+def wait(time):
+    """Pause for *time* ms."""
+    if time > 0:
+        _clock.sleep(time / 1000)
+
+
+class StopWatch:
+    def __init__(self):
+        self._start = _clock.time()
+        self._paused_at = None
+
+    def time(self):
+        now = self._paused_at if self._paused_at is not None else _clock.time()
+        return int((now - self._start) * 1000)
+
+    def pause(self):
+        if self._paused_at is None:
+            self._paused_at = _clock.time()
+
+    def resume(self):
+        if self._paused_at is not None:
+            self._start += _clock.time() - self._paused_at
+            self._paused_at = None
+
+    def reset(self):
+        self._start = _clock.time()
+        if self._paused_at is not None:
+            self._paused_at = self._start
@@ -0,0 +1,229 @@
+"""
+Run the brick programs (main.py on the server, main_client.py on the client) against a simulated World
+in virtual time.
+
+Each program runs in its own thread. The VirtualClock only lets one of them run at a time: a thread
+runs until it sleeps (pybricks.tools.wait, or any loop built on it), and when every thread is
+sleeping the clock jumps to the earliest wake-up time and wakes that thread. Computation takes no
+virtual time, so a mission runs as fast as the host can execute it, and the same seed always gives the
+same run.
+"""
+
+import gc
+import io
+import os
+import sys
+import threading
+import time
+import traceback
+
+from pybricks import _clock, _hardware, messaging
+
+from arena import Arena, World, SERVER, CLIENT
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_PROGRAM = os.path.join(ROOT, 'main.py')
+CLIENT_PROGRAM = os.path.join(ROOT, 'main_client.py')
+
+
+class SimulationStop(BaseException):
+    """
+    Raised inside the simulated programs when the simulation ends. It isn't an Exception, so the
+    programs' own error handling doesn't catch it, but their finally blocks still run.
+    """
+
+
+class VirtualClock:
+    def __init__(self):
+        self._now = 0.0
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._participants = 0
+        # Threads dormindo, como {identificador: [hora de acordar, ordem de chegada]}
+        self._sleeping = {}
+        self._arrivals = 0
+        self._running = None
+        self.limit = None
+        self.reason = None
+
+    def time(self):
+        return self._now
+
+    def add_participant(self):
+        """Count one more thread in the lockstep, before it's started."""
+        with self._condition:
+            self._participants += 1
+
+    def enter(self):
+        """Called by a participant thread when it starts."""
+        self._local.participant = True
+
+    def leave(self):
+        """Called by a participant thread when it ends, so the others don't wait for it."""
+        with self._condition:
+            self._local.participant = False
+            self._participants -= 1
+            self._advance()
+
+    def stop(self, reason):
+        """End the simulation: every participant raises SimulationStop the next time it sleeps."""
+        with self._condition:
+            if self.reason is None:
+                self.reason = reason
+            self._condition.notify_all()
+
+    def sleep(self, seconds):
+        with self._condition:
+            if self.reason is not None:
+                raise SimulationStop(self.reason)
+            if not getattr(self._local, 'participant', False):
+                # Threads de fora (a principal) só esperam o tempo virtual passar
+                wake = self._now + max(seconds, 0.0)
+                self._condition.wait_for(lambda: self._now >= wake or self.reason is not None)
+                return
+
+            ident = threading.get_ident()
+            self._sleeping[ident] = [self._now + max(seconds, 0.0), self._arrivals]
+            self._arrivals += 1
+            self._advance()
+            self._condition.wait_for(lambda: self._running == ident or self.reason is not None)
+            self._sleeping.pop(ident, None)
+            if self.reason is not None:
+                raise SimulationStop(self.reason)
+
+    def _advance(self):
+        # Só avança quando todas as threads estão dormindo, e acorda uma de cada vez
+        if self._participants == 0 or len(self._sleeping) < self._participants:
+            return
+        ident = min(self._sleeping, key=lambda key: self._sleeping[key])
+        wake = self._sleeping.pop(ident)[0]
+        if self.limit is not None and wake > self.limit:
+            self._now = self.limit
+            self.reason = 'time limit'
+        else:
+            self._now = max(self._now, wake)
+        self._running = ident
+        self._condition.notify_all()
+
+
+class _Output(io.TextIOBase):
+    """Collects the lines printed by the programs, stamped with the virtual time."""
+
+    def __init__(self, clock, echo):
+        self._clock = clock
+        self._echo = echo
+        self._partial = {}
+        self.lines = []
+
+    def write(self, text):
+        brick = _hardware.brick()
+        text = self._partial.pop(brick, '') + text
+        *lines, rest = text.split('\n')
+        for line in lines:
+            self.lines.append((self._clock.time(), brick, line))
+            if self._echo is not None:
+                self._echo.write('[{:8.3f} {}] {}\n'.format(self._clock.time(), brick, line))
+        if rest:
+            self._partial[brick] = rest
+        return len(text)
+
+
+class Simulation:
+    """
+    One simulated mission: builds the World from an Arena, installs the virtual clock and runs the
+    server and client programs until every person is delivered, the time limit is reached or a
+    program fails.
+    """
+
+    def __init__(self, arena=None, seed=0, noise=None, latency=5.0, jitter=2.0, loss=0.0):
+        """
+        :param arena: The Arena layout, the default one if not given.
+        :param seed: Seed of the sensor noise, the wheel and gyro errors and the link jitter and loss.
+        :param noise: Sensor noise overrides, see World.
+        :param latency: Latency of the Bluetooth link in ms (plus uniform *jitter* in ms).
+        :param loss: Probability of a message between the bricks being lost.
+        """
+        self.arena = Arena() if arena is None else arena
+        self.world = World(self.arena, seed, noise)
+        self.clock = VirtualClock()
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.errors = []
+        self.output = None
+
+    def run(self, time_limit=600, server=SERVER_PROGRAM, client=CLIENT_PROGRAM, echo=False):
+        """
+        Run the mission for at most *time_limit* virtual seconds and return a summary dict: the virtual
+        time, the wall clock time, why it stopped, the people delivered and the World events.
+
+        :param server: Path of the server program, or a function to run instead.
+        :param client: Path of the client program, or a function to run instead.
+        :param echo: Print the programs' output as it happens, with the virtual time.
+        """
+        clock = self.clock
+        clock.limit = time_limit
+        self.world.on_delivery(self._on_delivery)
+        self.output = _Output(clock, sys.__stdout__ if echo else None)
+
+        messaging.reset()
+        # A conexão é feita em tempo real, e não demora nada entre threads
+        messaging.configure(transport='queue', latency=self.latency, jitter=self.jitter, loss=self.loss,
+                            seed=self.seed, timeout=5.0)
+        _clock.set_clock(clock.time, clock.sleep)
+        _hardware.attach(self.world)
+        stdout = sys.stdout
+        sys.stdout = self.output
+
+        threads = [threading.Thread(target=self._run_program, args=(CLIENT, client), daemon=True),
+                   threading.Thread(target=self._run_program, args=(SERVER, server), daemon=True)]
+        wall_start = time.perf_counter()
+        try:
+            for thread in threads:
+                clock.add_participant()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            # Os comandos interrompidos param os motores quando são coletados, ainda com o mundo ligado
+            gc.collect()
+            sys.stdout = stdout
+            _hardware.attach(None)
+            _clock.set_clock(time.monotonic, time.sleep)
+            messaging.reset()
+
+        return {
+            'time': clock.time(),
+            'wall_time': time.perf_counter() - wall_start,
+            'reason': clock.reason,
+            'delivered': len(self.world.delivered),
+            'people': len(self.world.people),
+            'events': list(self.world.events),
+            'errors': list(self.errors)
+        }
+
+    def _run_program(self, brick, program):
+        _hardware.set_brick(brick)
+        self.clock.enter()
+        try:
+            if callable(program):
+                program()
+            else:
+                # Sem runpy: as duas threads trocariam o sys.modules['__main__'] uma da outra
+                with open(program) as file:
+                    code = compile(file.read(), program, 'exec')
+                exec(code, {'__name__': '__main__', '__file__': program})
+            self.clock.stop('{} finished'.format(brick))
+        except SimulationStop:
+            pass
+        except BaseException:
+            self.errors.append((brick, traceback.format_exc()))
+            self.clock.stop('{} failed'.format(brick))
+        finally:
+            self.clock.leave()
+
+    def _on_delivery(self, world):
+        if len(world.delivered) == len(world.people):
+            self.clock.stop('delivered')
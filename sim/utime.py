@@ -0,0 +1,39 @@
+"""Stand-in for the MicroPython utime module, on the same time source as sim/pybricks."""
+
+from pybricks import _clock
+
+
+def time():
+    return int(_clock.time())
+
+
+def ticks_ms():
+    return int(_clock.time() * 1000)
+
+
+def ticks_us():
+    return int(_clock.time() * 1000000)
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return ticks + delta
+
+
+def ticks_diff(ticks1, ticks2):
+    return ticks1 - ticks2
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
+
+
+def sleep_ms(ms):
+    _clock.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    _clock.sleep(us / 1000000)
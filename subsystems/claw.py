@@ -1,17 +1,17 @@
 from pybricks.ev3devices import Motor
-from pybricks.messaging import NumericMailbox
 from pybricks.parameters import Stop
 
-from constants import (CLAW_COLOR_SENSOR_MAILBOX,
-                       CLAW_MOTOR_PORT)
+from constants import CLAW_MOTOR_PORT, REMOTE_MAX_AGE, REMOTE_READ_TIMEOUT
+from subsystems.commands import Command
 from utils.utils_server import int_to_color_claw
+from utils.protocol import SENSOR_CLAW
 
 
 class Claw:
     _claw_motor = Motor(CLAW_MOTOR_PORT)
 
-    def __init__(self, server):
-        self._claw_color_sensor_mbox = NumericMailbox(CLAW_COLOR_SENSOR_MAILBOX, server)
+    def __init__(self, remote_sensors):
+        self._remote_sensors = remote_sensors
         self._claw_motor.reset_angle(0)
         self._claw_motor.hold()
 
@@ -22,8 +22,26 @@ class Claw:
     def open(self):
         self._claw_motor.run_target(200, 0, Stop.COAST, True)
 
+    def open_command(self):
+        """Same as open, as a Command for the Scheduler."""
+        def start():
+            self._claw_motor.run_target(200, 0, Stop.COAST, False)
+
+        def step(dt):
+            return self._claw_motor.control.done()
+
+        def end(interrupted):
+            if interrupted:
+                self._claw_motor.stop()
+
+        return Command.from_step(step, start, end, requirements=(self,), name='open claw')
+
     def hold(self):
         self._claw_motor.hold()
 
     def claw_sensor_color(self):
-        return int_to_color_claw(int(self._claw_color_sensor_mbox.read()))
+        # Espera um pouco por uma leitura recente, senão usa a última que chegou
+        color = self._remote_sensors.read(SENSOR_CLAW, REMOTE_MAX_AGE, REMOTE_READ_TIMEOUT)
+        if color is None:
+            color = self._remote_sensors.claw_color()
+        return int_to_color_claw(0 if color is None else color)
@@ -0,0 +1,241 @@
+from constants import CONTROL_LOOP_PERIOD
+from utils.control_loop import ControlLoop
+
+
+class Command:
+    """
+    A routine that runs one step per tick of the Scheduler.
+
+    The routine is a generator function called on the first tick with the time since the previous tick
+    in seconds. Every yield ends its step for that tick, and the time of the next tick is sent back into
+    the generator. The command finishes when the generator returns. *requirements* are the subsystems
+    (Drive, Claw...) the command uses, two commands with a requirement in common never run at the same
+    time.
+    """
+
+    def __init__(self, routine, requirements=(), name=None):
+        self._routine = routine
+        self.requirements = tuple(requirements)
+        self.name = name
+        self._generator = None
+        self.finished = False
+
+    @staticmethod
+    def from_step(step, start=None, end=None, requirements=(), name=None):
+        """
+        Build a command from a *step(dt)* function that returns True when it's done (like the steps run
+        by ControlLoop), with optional *start()* and *end(interrupted)* functions.
+        """
+        def routine(dt):
+            if start is not None:
+                start()
+            interrupted = True
+            try:
+                while not step(dt):
+                    dt = yield
+                interrupted = False
+            finally:
+                if end is not None:
+                    end(interrupted)
+
+        return Command(routine, requirements, name)
+
+    def initialize(self):
+        self._generator = None
+        self.finished = False
+
+    def execute(self, dt):
+        """Run one step, returning True when the command has finished."""
+        if self.finished:
+            return True
+        try:
+            if self._generator is None:
+                self._generator = self._routine(dt)
+                next(self._generator)
+            else:
+                self._generator.send(dt)
+        except StopIteration:
+            self.finished = True
+            self._generator = None
+        return self.finished
+
+    def interrupt(self):
+        """Stop the command before it finishes, running its cleanup (finally blocks)."""
+        if self._generator is not None:
+            self._generator.close()
+            self._generator = None
+        self.finished = True
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.name)
+
+
+class _Group(Command):
+    def __init__(self, commands, name=None):
+        requirements = []
+        for command in commands:
+            for requirement in command.requirements:
+                if requirement not in requirements:
+                    requirements.append(requirement)
+        Command.__init__(self, None, requirements, name)
+        self.commands = list(commands)
+
+    def interrupt(self):
+        for command in self.commands:
+            if not command.finished:
+                command.interrupt()
+        self.finished = True
+
+
+class Sequential(_Group):
+    """Runs the commands one after the other."""
+
+    def __init__(self, *commands, name=None):
+        _Group.__init__(self, commands, name)
+        self._index = 0
+
+    def initialize(self):
+        self._index = 0
+        self.finished = False
+        for command in self.commands:
+            command.initialize()
+
+    def execute(self, dt):
+        if self.finished:
+            return True
+        while self._index < len(self.commands):
+            if not self.commands[self._index].execute(dt):
+                return False
+            # O próximo comando começa no mesmo tick em que o anterior termina
+            self._index += 1
+        self.finished = True
+        return True
+
+
+class Parallel(_Group):
+    """Runs the commands at the same time, finishing when all of them have finished."""
+
+    def __init__(self, *commands, name=None):
+        _Group.__init__(self, commands, name)
+        _check_disjoint(commands)
+
+    def initialize(self):
+        self.finished = False
+        for command in self.commands:
+            command.initialize()
+
+    def execute(self, dt):
+        if self.finished:
+            return True
+        done = True
+        for command in self.commands:
+            if not command.finished and not command.execute(dt):
+                done = False
+        self.finished = done
+        return done
+
+
+class Race(_Group):
+    """Runs the commands at the same time, finishing (and interrupting the others) when any one finishes."""
+
+    def __init__(self, *commands, name=None):
+        _Group.__init__(self, commands, name)
+        _check_disjoint(commands)
+
+    def initialize(self):
+        self.finished = False
+        for command in self.commands:
+            command.initialize()
+
+    def execute(self, dt):
+        if self.finished:
+            return True
+        for command in self.commands:
+            if command.execute(dt):
+                self.interrupt()
+                return True
+        return False
+
+
+def _check_disjoint(commands):
+    seen = []
+    for command in commands:
+        for requirement in command.requirements:
+            if requirement in seen:
+                raise ValueError('commands running at the same time require the same subsystem')
+            seen.append(requirement)
+
+
+def wait_command(time):
+    """A command that does nothing for *time* ms."""
+    def routine(dt):
+        elapsed = 0
+        while elapsed < time:
+            dt = yield
+            elapsed += 1000 * dt
+
+    return Command(routine, name='wait {}'.format(time))
+
+
+def run_command(function, requirements=(), name=None):
+    """A command that calls *function* once and finishes in the same tick."""
+    def routine(dt):
+        function()
+        return
+        yield
+
+    return Command(routine, requirements, name)
+
+
+class Scheduler:
+    """
+    Cooperative scheduler for Commands, stepping every scheduled command once per tick of a fixed rate
+    ControlLoop. Scheduling a command interrupts the running commands that share a requirement with it.
+    """
+
+    def __init__(self, period=CONTROL_LOOP_PERIOD, on_tick=None):
+        """
+        :param period: The tick period in ms.
+        :param on_tick: Optional function called at the start of every tick (e.g. Drive.begin_tick).
+        """
+        self._loop = ControlLoop(period, on_tick)
+        self._running = []
+
+    def schedule(self, command):
+        for running in list(self._running):
+            for requirement in command.requirements:
+                if requirement in running.requirements:
+                    self.cancel(running)
+                    break
+        command.initialize()
+        self._running.append(command)
+        return command
+
+    def cancel(self, command):
+        if command in self._running:
+            self._running.remove(command)
+            command.interrupt()
+
+    def cancel_all(self):
+        for command in list(self._running):
+            self.cancel(command)
+
+    def is_running(self, command):
+        return command in self._running
+
+    def step(self, dt):
+        """Run one tick of every scheduled command, returning True when none is left."""
+        for command in list(self._running):
+            if command.execute(dt):
+                if command in self._running:
+                    self._running.remove(command)
+        return not self._running
+
+    def run(self, *commands):
+        """Schedule *commands* and block until every scheduled command has finished."""
+        for command in commands:
+            self.schedule(command)
+        self._loop.run(self.step)
+
+    def get_loop_stats(self):
+        return self._loop.stats()
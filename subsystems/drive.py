@@ -2,14 +2,27 @@ from constants import (LEFT_MOTOR_PORT, RIGHT_MOTOR_PORT, SENSOR_1_PORT, SENSOR_
                        GYRO_PORT, TURNING_D, TURNING_I, TURNING_P, BOTTOM_OBJECT_SENSOR_PORT, STRAIGHT_P, STRAIGHT_I,
                        STRAIGHT_D)
 from pybricks.ev3devices import (Motor, ColorSensor, GyroSensor, UltrasonicSensor)
-from pybricks.messaging import NumericMailbox
 from pybricks.robotics import DriveBase
-from constants import (OBSTACLE_SENSOR_MAILBOX, TOP_OBJECT_SENSOR_MAILBOX,
-                       WHEEL_DIAMETER, AXLE_TRACK)
+from constants import (WHEEL_DIAMETER, AXLE_TRACK, PROHIBITED_SQUARES, SQUARE_SIZE, TRAJECTORY_CRUISE_SPEED,
+                       TRAJECTORY_MIN_SPEED, TRAJECTORY_PROBE_SPEED, TRAJECTORY_PROBE_WINDOW,
+                       TRAJECTORY_ACCELERATION, SETTLE_TIME, SETTLE_MOTOR_SPEED,
+                       COLOR_SENSOR_OFFSET, COLOR_LUT_FILE, MEASURE_TUBE_SPEED, MEASURE_TUBE_DISTANCE,
+                       MEASURE_TUBE_MIN_SAMPLES, MEASURE_TUBE_MAX_STDDEV, REMOTE_MAX_AGE,
+                       OBSTACLE_WINDOW, ODOMETRY_CALIBRATED)
 from utils import utils_server
-from utils.pid import PID
+from utils.pid import FastPID
+from utils.occupancy_grid import OccupancyGrid
+from utils.sensor_snapshot import SensorSnapshot
+from utils.control_loop import ControlLoop
+from utils.odometry import Odometry
+from utils.color_lut import ColorLUT
+from utils.color_filter import ColorFilter
+from utils.stats import StreamingStats, ThresholdCounter
+from utils.protocol import STREAM_TOP_BURST, SENSOR_OBSTACLE, SENSOR_TOP
+from subsystems.commands import Command
 from pybricks.parameters import Color, Direction
 from pybricks.tools import StopWatch
+from math import sqrt, ceil
 
 
 class Side:
@@ -38,13 +51,48 @@ class Drive:
     _bottom_object_sensor = UltrasonicSensor(BOTTOM_OBJECT_SENSOR_PORT)
 
     _position = DrivePosition(0, 0, Side.LEFT)
-    _prohibited_squares = [(0, 1), (2, 1), (4, 1), (0, 3), (2, 3), (4, 3)]
 
-    def __init__(self, server):
-        self._obstacle_sensor_mbox = NumericMailbox(OBSTACLE_SENSOR_MAILBOX, server)
-        self._top_object_sensor_mbox = NumericMailbox(TOP_OBJECT_SENSOR_MAILBOX, server)
+    def __init__(self, remote_sensors):
+        self._remote_sensors = remote_sensors
+        self._prohibited_squares = OccupancyGrid(PROHIBITED_SQUARES)
+
+        self._color_lut = ColorLUT.load_or_build(COLOR_LUT_FILE, utils_server.rgb_to_color)
+
+        self._sensors = SensorSnapshot()
+        self._gyro_slot = self._sensors.add(self._gyro.angle)
+        self._left_color_filter = ColorFilter()
+        self._right_color_filter = ColorFilter()
+        self._left_color_slot = self._sensors.add(
+            lambda: self._left_color_filter.push(self._color_lut.classify_code(self._left_sensor.rgb())))
+        self._right_color_slot = self._sensors.add(
+            lambda: self._right_color_filter.push(self._color_lut.classify_code(self._right_sensor.rgb())))
+        self._bottom_distance_slot = self._sensors.add(self._bottom_object_sensor.distance)
+        # Leituras do cliente mais velhas que REMOTE_MAX_AGE são lidas como None
+        self._obstacle_distance_slot = self._sensors.add(self._recent_obstacle_distance)
+        self._top_distance_slot = self._sensors.add(lambda: remote_sensors.read(SENSOR_TOP, REMOTE_MAX_AGE))
+
+        self._heading_pid = FastPID(TURNING_P, TURNING_I, TURNING_D)
+        self._speed_pid = FastPID(STRAIGHT_P, STRAIGHT_I, STRAIGHT_D)
+
+        self._odometry = Odometry()
+
+        self._tube_readings = StreamingStats()
+        self._bottom_readings = StreamingStats()
+        self._adult_votes = ThresholdCounter(130)
+
+        self._turn_loop = ControlLoop(on_tick=self.begin_tick)
+        self._straight_loop = ControlLoop(on_tick=self.begin_tick)
+        self._align_loop = ControlLoop(on_tick=self.begin_tick)
+        self._measure_loop = ControlLoop(on_tick=self.begin_tick)
+        self._settle_loop = ControlLoop(on_tick=self.begin_tick)
+
+        self._settle_watch = StopWatch()
+        self._idle_time_saved = 0
+        self._idle_time_spent = 0
+
         self._drive_base.stop()
         self._gyro.reset_angle(0)
+        self._odometry.set_heading(0)
 
     def set_motor_speeds(self, left=None, right=None):
         if left is not None:
@@ -53,7 +101,23 @@ class Drive:
             self._right_motor.run(right)
 
     def turn_angle(self, angle: int):
-        setpoint = self.get_gyro_heading() + angle
+        start, step, end = self._turn_angle_steps(angle)
+        start()
+        self._turn_loop.run(step)
+        end(False)
+
+    def turn_angle_command(self, angle):
+        """Same as turn_angle, as a Command for the Scheduler."""
+        start, step, end = self._turn_angle_steps(angle)
+        return Command.from_step(step, start, end, requirements=(self,), name='turn {}'.format(angle))
+
+    def _turn_angle_steps(self, angle):
+        setpoint = 0
+
+        def start():
+            nonlocal setpoint
+            self._sensors.begin_tick()
+            setpoint = self.get_gyro_heading() + angle
 
         # pid = PID(TURNING_P, TURNING_I, TURNING_D, setpoint)
 
@@ -66,8 +130,10 @@ class Drive:
         #    self._drive_base.drive(0, turn_rate)
         #watch.pause()
 
-        while abs(self.get_gyro_heading() - setpoint) > 1:
+        def step(dt):
             degrees_left = setpoint - self.get_gyro_heading()
+            if abs(degrees_left) <= 1:
+                return True
 
             if degrees_left < 0:
                 multiplier = -1
@@ -80,11 +146,16 @@ class Drive:
                 speed = max(abs(degrees_left) * 3 * multiplier, (20 * multiplier))
 
             self._drive_base.drive(0, speed)
+            return False
 
-        self._drive_base.stop()
-        self.hold()
+        def end(interrupted):
+            self._drive_base.stop()
+            self.hold()
+
+        return start, step, end
 
     def turn_to_side(self, side):
+        self._sensors.begin_tick()
         current_heading = self.get_gyro_heading() % 360
         current_heading = current_heading if current_heading >= 0 else current_heading + 360
         angle = int(side) - current_heading
@@ -95,102 +166,238 @@ class Drive:
         self._position.heading = side
 
     def drive_straight(self, speed, distance=None, stop_conditions=None, explicit_direction=None):
+        start, step, end = self._drive_straight_steps(speed, distance, stop_conditions, explicit_direction)
+        start()
+        self._straight_loop.run(step)
+        end(False)
+
+    def drive_straight_command(self, speed, distance=None, stop_conditions=None, explicit_direction=None):
+        """Same as drive_straight, as a Command for the Scheduler."""
+        start, step, end = self._drive_straight_steps(speed, distance, stop_conditions, explicit_direction)
+        return Command.from_step(step, start, end, requirements=(self,), name='drive {}'.format(distance))
+
+    def _drive_straight_steps(self, speed, distance, stop_conditions, explicit_direction):
         if stop_conditions is None:
             stop_conditions = []
 
         if distance is not None:
             speed = abs(speed) if distance > 0 else -abs(speed)
 
-        if explicit_direction is None:
-            direction = self.get_gyro_heading()
-        else:
-            current_direction = self.get_gyro_heading() % 360
-            current_direction = current_direction if current_direction >= 0 else current_direction + 360
-            angle = explicit_direction-current_direction
-            if abs(angle) > 180:
-                angle = angle + 360 if angle < 0 else angle - 360
-            direction = self.get_gyro_heading() + angle
-
-        pid_straight = PID(TURNING_P, TURNING_I, TURNING_D, direction)
-        if distance is not None:
-            if speed > 0:
-                pid_speed = PID(STRAIGHT_P, STRAIGHT_I, STRAIGHT_D, distance, output_limits=(45, speed))
-            else:
-                pid_speed = PID(STRAIGHT_P, STRAIGHT_I, STRAIGHT_D, distance, output_limits=(speed, -45))
+        pid_straight = self._heading_pid
+        pid_speed = self._speed_pid
 
-        self._drive_base.reset()
-        while True:
+        def start():
+            # O setpoint é lido quando o movimento começa, não quando o comando é criado
+            pid_straight.reset(self._heading_setpoint(explicit_direction))
+            if distance is not None:
+                if speed > 0:
+                    pid_speed.set_output_limits(45, speed)
+                else:
+                    pid_speed.set_output_limits(speed, -45)
+                pid_speed.reset(distance)
+            self._reset_distance()
+
+        def step(dt):
             for condition in stop_conditions:
                 if condition():
-                    self._drive_base.stop()
-                    self.hold()
-                    return
+                    return True
             if distance is not None:
                 distance_traveled = self._drive_base.distance()
                 if abs(distance_traveled) >= abs(distance): # abs(distance_traveled) > (abs(distance)-5):
-                    self._drive_base.stop()
-                    self.hold()
-                    return
-                drive_speed = pid_speed(distance_traveled)
+                    return True
+                drive_speed = pid_speed.step(distance_traveled, dt)
             else:
                 drive_speed = speed
 
-            turn_rate = pid_straight(self.get_gyro_heading())
+            turn_rate = pid_straight.step(self.get_gyro_heading(), dt)
             self._drive_base.drive(drive_speed, turn_rate)
+            return False
+
+        def end(interrupted):
+            self._drive_base.stop()
+            self.hold()
+
+        return start, step, end
+
+    def _heading_setpoint(self, explicit_direction=None):
+        self._sensors.begin_tick()
+        if explicit_direction is None:
+            return self.get_gyro_heading()
+
+        current_direction = self.get_gyro_heading() % 360
+        current_direction = current_direction if current_direction >= 0 else current_direction + 360
+        angle = explicit_direction-current_direction
+        if abs(angle) > 180:
+            angle = angle + 360 if angle < 0 else angle - 360
+        return self.get_gyro_heading() + angle
 
     def drive_straight_squares(self, squares: int, explicit_direction=None):
-        self.drive_straight(250, distance=(squares*300), explicit_direction=explicit_direction)
+        self.drive_straight(250, distance=(squares*SQUARE_SIZE), explicit_direction=explicit_direction)
+        self._move_position(self.get_estimated_heading(), squares)
 
-        if self.get_estimated_heading() == Side.FRONT:
+    def _move_position(self, side, squares):
+        if side == Side.FRONT:
             self._position.y -= squares
-        elif self.get_estimated_heading() == Side.BACK:
+        elif side == Side.BACK:
             self._position.y += squares
-        elif self.get_estimated_heading() == Side.LEFT:
+        elif side == Side.LEFT:
             self._position.x -= squares
-        elif self.get_estimated_heading() == Side.RIGHT:
+        elif side == Side.RIGHT:
             self._position.x += squares
 
-    def align_on_color(self, colors, limit_angle=None):
-        sensor_readings = []
-        right_backwards = False
-        left_backwards = False
-        left_done = False
-        right_done = False
-        initial_angle = self.get_gyro_heading()
-
-        while not (left_done and right_done):
-            sensor_readings.append(self.left_sensor_color())
-            sensor_readings.append(self.right_sensor_color())
-
-            if self.right_sensor_color() in colors:
-                self.set_motor_speeds(right=-75)
-                right_backwards = True
+    def follow_path(self, path, check_square=None):
+        """
+        Drive along the waypoints of *path* (as returned by the path planners) without stopping between
+        squares.
+
+        Consecutive waypoints in the same direction are driven as one trapezoidal velocity profile, and
+        the robot only comes to a stop where it has to turn. Before driving into a possible obstacle
+        square, the robot slows down to TRAJECTORY_PROBE_SPEED and calls *check_square* with it;
+        if that returns True the robot stops in the square before it, facing it, and follow_path
+        returns False. The position is updated as each square boundary is crossed.
+        """
+        legs = []
+        x, y = self.get_position_x(), self.get_position_y()
+        heading = self.get_estimated_heading()
+        for (next_x, next_y) in path:
+            squares = abs(next_x - x) + abs(next_y - y)
+            if (x, y) == (0, 0) and next_y == 0 and heading == Side.LEFT:
+                # No canto (0, 0) o robô anda de ré pela linha y = 0 sem virar
+                side, reverse = Side.LEFT, True
+            else:
+                side, reverse = self.get_side_of_adjacent_square((next_x, next_y), (x, y)), False
 
-            if not right_backwards:
-                self.set_motor_speeds(right=100)
+            if legs and legs[-1][0] == side and legs[-1][1] == reverse:
+                legs[-1][3].append(legs[-1][2])
+                legs[-1][2] += squares
+            else:
+                legs.append([side, reverse, squares, [] if reverse else [0]])
+            x, y, heading = next_x, next_y, side
+
+        for side, reverse, squares, checkpoints in legs:
+            if self.get_estimated_heading() != side:
+                self.turn_to_side(side)
+            if not self._drive_leg(side, reverse, squares, checkpoints if check_square is not None else [],
+                                   check_square):
+                self._drive_base.stop()
+                self.hold()
+                return False
+            self._drive_base.stop()
 
-            if self.left_sensor_color() in colors:
-                self.set_motor_speeds(left=-75)
-                left_backwards = True
+        self.hold()
+        return True
+
+    def _drive_leg(self, side, reverse, squares, checkpoints, check_square):
+        total = squares * SQUARE_SIZE
+        sign = -1 if reverse else 1
+        motion_side = (side + 180) % 360 if reverse else side
+        acceleration = TRAJECTORY_ACCELERATION
+        cruise_speed = TRAJECTORY_CRUISE_SPEED
+        min_speed = TRAJECTORY_MIN_SPEED
+        probe_speed = TRAJECTORY_PROBE_SPEED
+
+        pid_straight = self._heading_pid
+        pid_straight.reset(self._heading_setpoint(side))
+        crossed = 0
+        next_check = 0
+        blocked = False
+
+        def step(dt):
+            nonlocal crossed, next_check, blocked
+            traveled = abs(self._drive_base.distance())
+
+            while crossed < squares and traveled >= (crossed + 0.5) * SQUARE_SIZE:
+                crossed += 1
+                self._move_position(motion_side, 1)
+
+            if (next_check < len(checkpoints) and
+                    traveled >= checkpoints[next_check] * SQUARE_SIZE - TRAJECTORY_PROBE_WINDOW):
+                if check_square(self.get_square_ahead()):
+                    blocked = True
+                    return True
+                next_check += 1
+
+            if traveled >= total:
+                return True
+
+            # Perfil trapezoidal: acelera desde o início e freia para cada ponto de verificação e para o fim
+            speed = min(cruise_speed, sqrt(min_speed * min_speed + 2 * acceleration * traveled))
+            limit = sqrt(min_speed * min_speed + 2 * acceleration * (total - traveled))
+            if next_check < len(checkpoints):
+                remaining = checkpoints[next_check] * SQUARE_SIZE - traveled
+                if remaining > 0:
+                    limit = min(limit, sqrt(probe_speed * probe_speed + 2 * acceleration * remaining))
+                else:
+                    limit = min(limit, probe_speed)
+            speed = min(speed, limit)
+
+            self._drive_base.drive(sign * speed, pid_straight.step(self.get_gyro_heading(), dt))
+            return False
 
-            if not left_backwards:
-                self.set_motor_speeds(left=100)
+        self._reset_distance()
+        self._straight_loop.run(step)
 
-            if left_backwards and (self.left_sensor_color() == Color.WHITE):
-                self.stop(right=False)
+        # Garante a posição no quadrado final mesmo que o último limite não tenha sido cruzado
+        if not blocked and crossed < squares:
+            self._move_position(motion_side, squares - crossed)
+        return not blocked
 
-            if right_backwards and (self.right_sensor_color() == Color.WHITE):
-                self.stop(left=False)
+    def align_on_color(self, colors, limit_angle=None):
+        """
+        Drive forward until the color sensors find one of *colors*, and back each side off the line
+        until it sees white again, leaving the robot square to the line. Each side reacts to the edge
+        events of its ColorFilter, so a single noisy reading doesn't move the motors.
+        """
+        sensor_readings = []
+        right_backwards = False
+        left_backwards = False
+        initial_angle = self.get_gyro_heading()
+        first_step = True
+
+        aligned = False
+
+        def step(dt):
+            nonlocal right_backwards, left_backwards, aligned, first_step
+            left_color = self.left_sensor_color()
+            right_color = self.right_sensor_color()
+            sensor_readings.append(left_color)
+            sensor_readings.append(right_color)
+
+            # No primeiro passo a cor atual conta como um evento, o robô pode já estar sobre a linha
+            if first_step or self._right_color_filter.changed:
+                if right_color in colors:
+                    self.set_motor_speeds(right=-75)
+                    right_backwards = True
+                elif right_backwards and right_color == Color.WHITE:
+                    self.stop(left=False)
+                elif not right_backwards:
+                    self.set_motor_speeds(right=100)
+
+            if first_step or self._left_color_filter.changed:
+                if left_color in colors:
+                    self.set_motor_speeds(left=-75)
+                    left_backwards = True
+                elif left_backwards and left_color == Color.WHITE:
+                    self.stop(right=False)
+                elif not left_backwards:
+                    self.set_motor_speeds(left=100)
+            first_step = False
 
             if (right_backwards and left_backwards and
-                    (self.right_sensor_color() == Color.WHITE) and (self.left_sensor_color() == Color.WHITE)):
+                    (right_color == Color.WHITE) and (left_color == Color.WHITE)):
                 self.stop()
-                break
+                aligned = True
+                return True
 
             if (limit_angle is not None) and (abs(initial_angle - self.get_gyro_heading()) > limit_angle):
                 self.stop()
-                break
+                return True
+
+            return False
 
+        self._align_loop.run(step)
+        if aligned:
+            self._correct_on_line()
         return len([i for i in sensor_readings if i == Color.YELLOW]) > 2
 
     def stop(self, left=True, right=True):
@@ -224,10 +431,10 @@ class Drive:
             )
 
     def left_sensor_color(self):
-        return utils_server.rgb_to_color(self._left_sensor.rgb())
+        return self._color_lut.color(self._sensors.get(self._left_color_slot))
 
     def right_sensor_color(self):
-        return utils_server.rgb_to_color(self._right_sensor.rgb())
+        return self._color_lut.color(self._sensors.get(self._right_color_slot))
 
     def get_position_x(self):
         return self._position.x
@@ -240,80 +447,181 @@ class Drive:
 
     def set_position_x(self, x):
         self._position.x = x
+        self._odometry.set_position(x=x * SQUARE_SIZE)
 
     def set_position_y(self, y):
         self._position.y = y
+        self._odometry.set_position(y=y * SQUARE_SIZE)
 
     def set_heading(self, heading):
         self._position.heading = heading
 
-    def measure_tube(self):
-        top_readings = []
-        bottom_readings = []
-        self._drive_base.reset()
-        self._drive_base.drive(-25, 0)
-        while True:
+    def measure_tube(self, speed=MEASURE_TUBE_SPEED):
+        """
+        Creep backwards past the tube at *speed* (mm/s) measuring it with the bottom and top ultrasonic
+        sensors.
+
+        Returns a tuple (distance to the tube in mm, is_adult, confidence), where the confidence goes
+        from 0 to 1 with the number and spread of the bottom readings and how one-sided the adult vote
+        was. Faster passes take fewer readings, so a pass with low confidence can be repeated slower.
+        """
+        tube_readings = self._tube_readings
+        bottom_readings = self._bottom_readings
+        adult_votes = self._adult_votes
+        tube_readings.reset()
+        bottom_readings.reset()
+        adult_votes.reset()
+
+        def step(dt):
             bottom_reading = self.bottom_object_sensor_distance()
-            top_reading = self._top_object_sensor_mbox.read()
+            # Guarda cada amostra do cliente no histórico, os votos são contados no fim da passada
+            self._remote_sensors.update()
 
-            if top_reading is not None:
-                top_readings.append(top_reading)
             if bottom_reading is not None:
-                bottom_readings.append(bottom_reading)
-
-            if self._drive_base.distance() <= -50:
-                self._drive_base.stop()
-                self.hold()
-                break
-
-        bottom_readings = [i for i in bottom_readings if i < 130]
-        tube_distance = sum(bottom_readings) / len(bottom_readings)
-        is_adult = len([i for i in top_readings if i <= 130]) > len([i for i in top_readings if i > 130])
-
-        return tube_distance, is_adult
+                bottom_readings.add(bottom_reading)
+                if bottom_reading < 130:
+                    tube_readings.add(bottom_reading)
+
+            return self._drive_base.distance() <= -MEASURE_TUBE_DISTANCE
+
+        # O cliente manda só o sensor de cima, o mais rápido possível, durante a passada
+        previous_profile = self._remote_sensors.set_profile(STREAM_TOP_BURST)
+        start_time = self._remote_sensors.time()
+        self._reset_distance()
+        self._drive_base.drive(-abs(speed), 0)
+        self._measure_loop.run(step)
+        self._drive_base.stop()
+        self.hold()
+        self._remote_sensors.set_profile(previous_profile)
+
+        # Uma vez por amostra do sensor de cima, sem repetir leituras nem perder as que chegaram entre os ticks
+        for top_reading in self._remote_sensors.values_since(SENSOR_TOP, start_time):
+            adult_votes.add(top_reading)
+
+        is_adult = adult_votes.below > adult_votes.above
+        if tube_readings.count == 0:
+            # Nenhuma leitura do tubo: usa a mediana das leituras, sem nenhuma confiança
+            tube_distance = bottom_readings.median()
+            return (130 if tube_distance is None else tube_distance), is_adult, 0.0
+
+        confidence = min(tube_readings.count / MEASURE_TUBE_MIN_SAMPLES,
+                         1 - tube_readings.stddev() / MEASURE_TUBE_MAX_STDDEV,
+                         adult_votes.margin())
+        return tube_readings.mean, is_adult, max(0.0, min(1.0, confidence))
+
+    def wait_until_settled(self, max_time):
+        """
+        Wait until the robot has come to rest, or for at most *max_time* ms. The robot is at rest when
+        the gyro angle hasn't changed and both wheel speeds stayed under SETTLE_MOTOR_SPEED for
+        SETTLE_TIME ms.
+        """
+        last_angle = self.get_gyro_heading()
+        still_since = 0
+
+        def step(dt):
+            nonlocal last_angle, still_since
+            # O ângulo do giroscópio é inteiro: 1 grau entre dois ticks já seria 100 graus/s, então o
+            # critério é o ângulo não mudar durante toda a janela
+            angle = self.get_gyro_heading()
+            now = self._settle_watch.time()
+            if (angle != last_angle or abs(self._left_motor.speed()) > SETTLE_MOTOR_SPEED or
+                    abs(self._right_motor.speed()) > SETTLE_MOTOR_SPEED):
+                still_since = now
+            last_angle = angle
+            return now - still_since >= SETTLE_TIME or now >= max_time
+
+        self._settle_watch.reset()
+        self._settle_loop.run(step)
+
+        elapsed = min(self._settle_watch.time(), max_time)
+        self._idle_time_spent += elapsed
+        self._idle_time_saved += max_time - elapsed
+
+    def get_idle_time_saved(self):
+        """Time in ms saved by wait_until_settled compared to always waiting the maximum time."""
+        return self._idle_time_saved
+
+    def get_idle_time_spent(self):
+        return self._idle_time_spent
+
+    def reset_idle_time(self):
+        self._idle_time_saved = 0
+        self._idle_time_spent = 0
+
+    def get_loop_stats(self):
+        return {
+            'turn': self._turn_loop.stats(),
+            'straight': self._straight_loop.stats(),
+            'align': self._align_loop.stats(),
+            'measure': self._measure_loop.stats(),
+            'settle': self._settle_loop.stats()
+        }
+
+    def reset_loop_stats(self):
+        self._turn_loop.reset_stats()
+        self._straight_loop.reset_stats()
+        self._align_loop.reset_stats()
+        self._measure_loop.reset_stats()
+        self._settle_loop.reset_stats()
+
+    def _recent_obstacle_distance(self):
+        # Mediana das amostras da janela, ou a última leitura se nenhuma chegou nela (o cliente só
+        # envia quando a distância muda)
+        remote_sensors = self._remote_sensors
+        remote_sensors.update()
+        readings = remote_sensors.values_since(SENSOR_OBSTACLE, remote_sensors.time() - OBSTACLE_WINDOW)
+        if not readings:
+            return remote_sensors.read(SENSOR_OBSTACLE, REMOTE_MAX_AGE)
+        readings.sort()
+        return readings[len(readings) // 2]
 
     def is_seeing_obstacle_far(self):
-        read = self._obstacle_sensor_mbox.read()
+        read = self._sensors.get(self._obstacle_distance_slot)
         if read is None:
             return False
         else:
             return read < 450
 
     def is_seeing_obstacle_very_close(self):
-        read = self._obstacle_sensor_mbox.read()
+        read = self._sensors.get(self._obstacle_distance_slot)
         if read is None:
             return False
         else:
             return read < 85
 
     def bottom_object_sensor_distance(self):
-        return self._bottom_object_sensor.distance()
+        return self._sensors.get(self._bottom_distance_slot)
 
     def is_seeing_person(self):
         return self.bottom_object_sensor_distance() < 130
 
     def is_seeing_adult(self):
-        read = self._top_object_sensor_mbox.read()
+        read = self._sensors.get(self._top_distance_slot)
         if read is None:
             return False
         else:
             return read < 200
 
     def add_obstacle(self, position):
-        self._prohibited_squares.append(position)
+        self._prohibited_squares.add(position)
+
+    def clear_obstacles(self):
+        # Volta só para os quadrados proibidos fixos
+        self._prohibited_squares = OccupancyGrid(PROHIBITED_SQUARES)
 
     def get_prohibited_squares(self):
         return self._prohibited_squares
 
-    def get_side_of_adjacent_square(self, square):
+    def get_side_of_adjacent_square(self, square, origin=None):
         x, y = square
-        if (x > self._position.x) and (y == self._position.y):
+        origin_x, origin_y = (self.get_position_x(), self.get_position_y()) if origin is None else origin
+        if (x > origin_x) and (y == origin_y):
             return Side.RIGHT
-        elif (x < self.get_position_x()) and (y == self.get_position_y()):
+        elif (x < origin_x) and (y == origin_y):
             return Side.LEFT
-        elif (y > self.get_position_y()) and (x == self.get_position_x()):
+        elif (y > origin_y) and (x == origin_x):
             return Side.BACK
-        elif (y < self.get_position_y()) and (x == self.get_position_x()):
+        elif (y < origin_y) and (x == origin_x):
             return Side.FRONT
         else:
             return None
@@ -332,7 +640,63 @@ class Drive:
             return tuple((x+1, y))
 
     def get_gyro_heading(self):
-        return self._gyro.angle()
+        return self._sensors.get(self._gyro_slot)
 
     def reset_gyro(self, angle):
+        self.begin_tick()
         self._gyro.reset_angle(angle)
+        self._sensors.begin_tick()
+        self._odometry.set_heading(angle)
+
+    def begin_tick(self):
+        """
+        Start a new control tick, so the sensors are read again, and update the odometry (used as on_tick
+        of the control loops and of the Scheduler).
+        """
+        self._sensors.begin_tick()
+        self._odometry.update(self._left_motor.angle(), self._right_motor.angle(), self.get_gyro_heading())
+
+    def _reset_distance(self):
+        # O reset do DriveBase zera os ângulos dos motores, então a odometria é atualizada antes
+        self.begin_tick()
+        self._drive_base.reset()
+        self._odometry.set_encoders(self._left_motor.angle(), self._right_motor.angle())
+
+    def get_pose(self):
+        """The odometry estimate, as a tuple (x in mm, y in mm, heading in degrees)."""
+        return self._odometry.x, self._odometry.y, self._odometry.heading
+
+    def get_pose_confidence(self):
+        return self._odometry.confidence()
+
+    def needs_realignment(self):
+        """
+        True when the odometry error is past the limits and the robot should realign on a line. Always
+        True while the error constants aren't calibrated (ODOMETRY_CALIBRATED).
+        """
+        return not ODOMETRY_CALIBRATED or self._odometry.needs_realignment()
+
+    def _line_axis(self):
+        # Eixo (0 para x, 1 para y) e sentido em que o robô está virado, pela odometria
+        side = int((self._odometry.heading + 45) // 90) % 4
+        return (1, -1) if side == 0 else (0, 1) if side == 1 else (1, 1) if side == 2 else (0, -1)
+
+    def line_ahead_distance(self):
+        """
+        Distance in mm the robot has to drive forward for the color sensors to reach the next line
+        between squares ahead, estimated by the odometry (what align_on_color would drive).
+        """
+        axis, sign = self._line_axis()
+        sensors = sign * (self._odometry.y if axis else self._odometry.x) + COLOR_SENSOR_OFFSET
+        line = ceil((sensors - SQUARE_SIZE / 2) / SQUARE_SIZE) * SQUARE_SIZE + SQUARE_SIZE / 2
+        return line - sensors
+
+    def _correct_on_line(self):
+        # Com os dois sensores sobre a linha, a coordenada na direção do robô é conhecida
+        axis, sign = self._line_axis()
+        sensors = sign * (self._odometry.y if axis else self._odometry.x) + COLOR_SENSOR_OFFSET
+        line = round((sensors - SQUARE_SIZE / 2) / SQUARE_SIZE) * SQUARE_SIZE + SQUARE_SIZE / 2
+        if axis:
+            self._odometry.correct_y(sign * (line - COLOR_SENSOR_OFFSET))
+        else:
+            self._odometry.correct_x(sign * (line - COLOR_SENSOR_OFFSET))
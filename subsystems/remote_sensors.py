@@ -0,0 +1,199 @@
+from array import array
+
+from pybricks.messaging import Mailbox
+from pybricks.tools import StopWatch, wait
+
+from constants import SENSOR_MAILBOX, CONTROL_MAILBOX, REMOTE_POLL_PERIOD, REMOTE_HISTORY_SIZE
+from utils.protocol import (decode_sensor_packet, encode_control_packet, STREAM_ALL, SENSOR_OBSTACLE, SENSOR_TOP,
+                            SENSOR_CLAW)
+from utils.stats import StreamingStats
+
+# Sensor (SENSOR_*) de cada posição das listas de leituras, na ordem do pacote
+_SENSORS = (SENSOR_OBSTACLE, SENSOR_TOP, SENSOR_CLAW)
+
+
+def _slot(sensor):
+    return _SENSORS.index(sensor)
+
+
+class RemoteSensors:
+    """
+    Readings of the sensors on the client brick, received as one packed message per sample (see
+    utils/protocol.py), so every reading returned belongs to the same sample. Shared by Drive and Claw.
+
+    Every reading keeps the time (of this brick) when it was last received fresh, so read() can refuse
+    readings that are too old, for example when the link has stalled. The server also picks which
+    readings the client streams, and how fast, with set_profile().
+
+    Each distinct sample (by sequence number) is also kept in a ring buffer of the last *history_size*
+    samples, for windowed queries like values_since(). update() has to be called often enough (every
+    control tick) to see every sample, since the mailbox only holds the last message.
+
+    The link statistics measure the messages received, the messages overwritten in the mailbox before
+    they were read (gaps in the sequence numbers), the message rate and the latency. The clocks of the
+    two bricks aren't synchronized, so the latency is measured above the fastest message seen so far.
+    """
+
+    def __init__(self, connection, history_size=REMOTE_HISTORY_SIZE):
+        self._mailbox = Mailbox(SENSOR_MAILBOX, connection)
+        self._control_mailbox = Mailbox(CONTROL_MAILBOX, connection)
+        self._raw = None
+        self.profile = None
+
+        self.seq = None
+        self.timestamp = None
+        self.fresh = 0
+        self._values = [None, None, None]
+        self._times = [None, None, None]
+
+        self._history_size = history_size
+        self._history_times = array('l', [0] * history_size)
+        self._history_values = (array('H', [0] * history_size), array('H', [0] * history_size),
+                                bytearray(history_size))
+        self._history_fresh = bytearray(history_size)
+        self._history_index = 0
+        self._history_count = 0
+
+        self._watch = StopWatch()
+        self._latency = StreamingStats()
+        self.reset_link_stats()
+
+        self.set_profile(STREAM_ALL)
+
+    def set_profile(self, profile):
+        """
+        Switch the client to the streaming profile *profile* (one of the STREAM_* of utils/protocol.py),
+        returning the previous one so it can be restored. Nothing is sent if it's already the current one.
+        """
+        previous = self.profile
+        if profile != previous:
+            self._control_mailbox.send(encode_control_packet(profile))
+            self.profile = profile
+        return previous
+
+    def update(self):
+        """Decode the last message received, returning True if it's a new sample."""
+        raw = self._mailbox.read()
+        if raw is None or raw == self._raw:
+            return False
+
+        packet = decode_sensor_packet(raw)
+        if packet is None:
+            return False
+        now = self._watch.time()
+        self._raw = raw
+
+        seq = packet[0]
+        if seq == self.seq:
+            return False
+        self.timestamp = packet[1]
+        if self.seq is not None:
+            self._missed += (seq - self.seq - 1) & 0xFFFF
+        self.seq = seq
+        self._received += 1
+        self._last_receive = now
+
+        # O atraso mínimo já visto serve de referência, já que os relógios não estão sincronizados
+        offset = now - self.timestamp
+        if self._min_offset is None or offset < self._min_offset:
+            self._min_offset = offset
+        self._latency.add(offset - self._min_offset)
+
+        fresh = self.fresh = packet[5]
+        h = self._history_index
+        for i in range(len(_SENSORS)):
+            sensor = _SENSORS[i]
+            self._values[i] = packet[2 + i]
+            self._history_values[i][h] = packet[2 + i]
+            if fresh & sensor:
+                self._times[i] = now
+        self._history_times[h] = now
+        self._history_fresh[h] = fresh
+        self._history_index = h + 1 if h + 1 < self._history_size else 0
+        if self._history_count < self._history_size:
+            self._history_count += 1
+        return True
+
+    def time(self):
+        """The current time in ms of the clock the receive times are measured with."""
+        return self._watch.time()
+
+    def values_since(self, sensor, time):
+        """
+        The fresh readings of *sensor* (one of the SENSOR_*) received at or after *time* (see time()),
+        oldest first, one per sample. Only the samples still in the history are returned.
+        """
+        self.update()
+        values = []
+        history = self._history_values[_slot(sensor)]
+        h = self._history_index
+        for _ in range(self._history_count):
+            h = h - 1 if h > 0 else self._history_size - 1
+            if self._history_times[h] < time:
+                break
+            if self._history_fresh[h] & sensor:
+                values.append(history[h])
+        values.reverse()
+        return values
+
+    def age(self, sensor):
+        """Time in ms since a fresh reading of *sensor* (one of the SENSOR_*) was received, or None."""
+        time = self._times[_slot(sensor)]
+        return None if time is None else self._watch.time() - time
+
+    def read(self, sensor, max_age=None, timeout=0, default=None):
+        """
+        The last reading of *sensor* (one of the SENSOR_*).
+
+        :param max_age: If set, readings older than this (in ms) aren't returned.
+        :param timeout: Time in ms to wait for a new enough reading to arrive. Keep it at 0 inside
+            control loops.
+        :param default: What is returned if there's no new enough reading.
+        """
+        self.update()
+        i = _slot(sensor)
+        if max_age is None:
+            return self._values[i]
+
+        start = self._watch.time()
+        while True:
+            time = self._times[i]
+            now = self._watch.time()
+            if time is not None and now - time <= max_age:
+                return self._values[i]
+            if now - start >= timeout:
+                return default
+            wait(REMOTE_POLL_PERIOD)
+            self.update()
+
+    def obstacle_distance(self):
+        return self.read(SENSOR_OBSTACLE)
+
+    def top_distance(self):
+        return self.read(SENSOR_TOP)
+
+    def claw_color(self):
+        """The color code of the claw sensor (see utils_client.color_to_int_claw), or None."""
+        return self.read(SENSOR_CLAW)
+
+    def link_stats(self):
+        """Statistics of the link since the last reset_link_stats(), for profiling."""
+        now = self._watch.time()
+        elapsed = now - self._stats_start
+        return {
+            'received': self._received,
+            'missed': self._missed,
+            'rate': self._received * 1000 / elapsed if elapsed > 0 else 0.0,
+            'latency_mean': self._latency.mean,
+            'latency_max': self._latency.max,
+            'latency_stddev': self._latency.stddev(),
+            'silence': None if self._last_receive is None else now - self._last_receive
+        }
+
+    def reset_link_stats(self):
+        self._received = 0
+        self._missed = 0
+        self._min_offset = None
+        self._last_receive = None
+        self._latency.reset()
+        self._stats_start = self._watch.time()
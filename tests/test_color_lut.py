@@ -0,0 +1,105 @@
+"""
+Tests of the color classifiers: the calibrated tables must keep their contents through a file and
+look up the right level of every channel, and the classifiers the robot uses when there is no
+calibrated table must agree with the threshold functions on every reading of the whole RGB cube of
+ColorSensor.rgb().
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'sim'), ROOT]
+
+# utils_server antes: subsystems.drive importa dele
+from utils.utils_server import rgb_to_color
+from utils.utils_client import rgb_to_color_claw
+from utils.color_lut import COLOR_NAMES, ColorLUT, ColorFunction
+
+MISSING_FILE = os.path.join(ROOT, 'tests', 'no_such_table.bin')
+
+# Nível de cada leitura de um canal com step 10: o último nível (100) também recebe as leituras acima
+# de 100, que o ColorSensor.rgb() às vezes devolve
+LEVELS_OF_STEP_10 = ((0, 0), (9, 0), (10, 1), (11, 1), (19, 1), (20, 2), (99, 9), (100, 10), (101, 10),
+                     (150, 10), (255, 10))
+
+
+def make_lut(step):
+    # Cada entrada guarda um código que depende dos três níveis, para que trocar um canal apareça
+    levels = 100 // step + 1
+    table = bytearray(levels ** 3)
+    for r in range(levels):
+        for g in range(levels):
+            for b in range(levels):
+                table[(r * levels + g) * levels + b] = code_of_levels(r, g, b)
+    return ColorLUT(table, step, COLOR_NAMES)
+
+
+def code_of_levels(r, g, b):
+    return (r + 3 * g + 5 * b) % len(COLOR_NAMES)
+
+
+def test_save_and_load_keep_the_table(tmp_path):
+    lut = make_lut(7)
+    path = str(tmp_path / 'table.bin')
+    lut.save(path)
+
+    loaded = ColorLUT.load(path, COLOR_NAMES)
+    assert (loaded.step, loaded.levels) == (7, 15)
+    assert loaded.table == lut.table
+    for rgb in ((0, 0, 0), (6, 7, 8), (50, 13, 99), (100, 100, 100), (120, 255, 3)):
+        assert loaded.classify_code(rgb) == lut.classify_code(rgb)
+
+
+@pytest.mark.parametrize('channel', range(3))
+def test_classify_uses_the_level_of_each_channel(channel):
+    lut = make_lut(10)
+    for value, level in LEVELS_OF_STEP_10:
+        rgb = [25, 45, 65]
+        rgb[channel] = value
+        levels = [2, 4, 6]
+        levels[channel] = level
+
+        code = code_of_levels(*levels)
+        assert lut.classify_code(tuple(rgb)) == code, rgb
+        assert lut.classify(tuple(rgb)) == COLOR_NAMES[code], rgb
+
+
+def test_table_size_must_match_step():
+    with pytest.raises(ValueError):
+        ColorLUT(bytearray(11 ** 3 - 1), 10, COLOR_NAMES)
+    with pytest.raises(ValueError):
+        ColorLUT(bytearray(11 ** 3), 9, COLOR_NAMES)
+
+
+@pytest.mark.parametrize('data', (b'', b'CLUT', b'CLUT\x0a\x0b', b'XXXX\x0a\x0b' + bytes(11 ** 3),
+                                  b'CLUT\x0a\x0b' + bytes(100)))
+def test_invalid_file_falls_back_to_function(tmp_path, data):
+    path = tmp_path / 'table.bin'
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        ColorLUT.load(str(path), COLOR_NAMES)
+    assert isinstance(ColorLUT.load_or_build(str(path), rgb_to_color), ColorFunction)
+
+
+def assert_same_over_cube(classify):
+    lut = ColorLUT.load_or_build(MISSING_FILE, classify)
+    mismatches = []
+    for r in range(101):
+        for g in range(101):
+            for b in range(101):
+                rgb = (r, g, b)
+                expected = classify(rgb)
+                if lut.classify(rgb) != expected or lut.color(lut.classify_code(rgb)) != expected:
+                    mismatches.append(rgb)
+    assert not mismatches, '{} readings differ, the first ones: {}'.format(len(mismatches), mismatches[:5])
+
+
+def test_fallback_matches_rgb_to_color():
+    assert_same_over_cube(rgb_to_color)
+
+
+def test_fallback_matches_rgb_to_color_claw():
+    assert_same_over_cube(rgb_to_color_claw)
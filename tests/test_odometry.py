@@ -0,0 +1,90 @@
+"""
+Tests of the error estimate of the odometry, which decides when the robot has to realign on a line.
+"""
+
+import math
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'sim'), ROOT]
+
+from utils.odometry import Odometry
+
+WHEEL_DIAMETER = 56
+AXLE_TRACK = 120
+# Graus das rodas para andar 1 mm
+DEGREES_PER_MM = 360 / (math.pi * WHEEL_DIAMETER)
+
+
+class Robot:
+    """Motor and gyro angles of a robot without slip, fed to an Odometry."""
+
+    def __init__(self):
+        # Sem deriva do giroscópio, para que o erro não dependa do tempo entre as chamadas
+        self.odometry = Odometry(wheel_diameter=WHEEL_DIAMETER, axle_track=AXLE_TRACK, distance_error=0.02,
+                                 gyro_drift=0, gyro_scale_error=0.01, max_position_error=40, max_heading_error=4)
+        self.left = self.right = self.gyro = 0
+        self.odometry.update(0, 0, 0)
+
+    def drive(self, distance, steps=10):
+        for _ in range(steps):
+            self.left += distance * DEGREES_PER_MM / steps
+            self.right += distance * DEGREES_PER_MM / steps
+            self.odometry.update(self.left, self.right, self.gyro)
+
+    def turn(self, angle):
+        # Girando no lugar, cada roda anda o arco de meio eixo
+        wheel = math.radians(angle) * AXLE_TRACK / 2 * DEGREES_PER_MM
+        self.left += wheel
+        self.right -= wheel
+        self.gyro += angle
+        self.odometry.update(self.left, self.right, self.gyro)
+
+
+def test_needs_realignment_after_driving_far():
+    robot = Robot()
+    assert not robot.odometry.needs_realignment()
+
+    # 2% de 1500 mm são 30 mm, ainda abaixo do limite de 40 mm
+    robot.drive(1500)
+    assert not robot.odometry.needs_realignment()
+    assert abs(robot.odometry.y + 1500) < 1e-6
+
+    robot.drive(600)
+    assert robot.odometry.needs_realignment()
+
+
+def test_needs_realignment_after_turning():
+    robot = Robot()
+    # Cada grau virado soma 0,01 grau de erro: 360 graus ainda não chegam no limite de 4 graus
+    robot.turn(360)
+    assert not robot.odometry.needs_realignment()
+    assert robot.odometry.position_error() < 1e-6
+
+    robot.turn(-90)
+    assert robot.odometry.needs_realignment()
+
+
+def test_slip_counts_as_position_error():
+    robot = Robot()
+    # O giroscópio vê o robô virar 40 graus sem as rodas girarem: as rodas patinaram o arco de meio eixo,
+    # 40 graus de 60 mm são 42 mm, enquanto o erro da direção fica em 0,4 grau
+    robot.gyro += 40
+    robot.odometry.update(robot.left, robot.right, robot.gyro)
+    assert robot.odometry.heading_error < robot.odometry.max_heading_error
+    assert robot.odometry.needs_realignment()
+
+
+def test_corrections_clear_the_error():
+    robot = Robot()
+    robot.drive(2500)
+    robot.turn(450)
+    assert robot.odometry.needs_realignment()
+
+    robot.odometry.set_heading(robot.gyro)
+    assert robot.odometry.needs_realignment()
+    robot.odometry.correct_x(0)
+    robot.odometry.correct_y(-2500)
+    assert not robot.odometry.needs_realignment()
+    assert robot.odometry.confidence() == 1
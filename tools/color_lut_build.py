@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Build a color lookup table (utils/color_lut.py) from labeled RGB samples.
+
+Runs on a computer with NumPy, not on the EV3. The samples are the CSV lines (label,r,g,b) recorded
+with tools/color_record.py, and every cell of the quantized RGB cube gets the label with the most
+votes among its *k* nearest samples. The resulting .bin file is copied to the EV3 next to main.py
+(COLOR_LUT_FILE for the server, CLAW_COLOR_LUT_FILE for the claw sensor on the client).
+
+    python3 tools/color_lut_build.py server_samples.csv --out color_lut.bin
+    python3 tools/color_lut_build.py claw_samples.csv --out claw_color_lut.bin --k 7
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.color_lut import COLOR_NAMES, ColorLUT
+
+
+def read_samples(paths):
+    labels, values = [], []
+    for path in paths:
+        with open(path) as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                label, r, g, b = line.split(',')
+                if label not in COLOR_NAMES:
+                    raise SystemExit('{}: unknown color {!r}, expected one of {}'.format(path, label,
+                                                                                       ', '.join(COLOR_NAMES)))
+                labels.append(COLOR_NAMES.index(label))
+                values.append((float(r), float(g), float(b)))
+    return np.array(labels, dtype=np.uint8), np.array(values)
+
+
+def build_table(labels, values, step, k, chunk=4096):
+    levels = 100 // step + 1
+    centers = np.minimum(np.arange(levels) * step + step // 2, 100).astype(float)
+    r, g, b = np.meshgrid(centers, centers, centers, indexing='ij')
+    cells = np.stack([r.ravel(), g.ravel(), b.ravel()], axis=1)
+
+    k = min(k, len(values))
+    table = np.empty(len(cells), dtype=np.uint8)
+    for start in range(0, len(cells), chunk):
+        block = cells[start:start + chunk]
+        distances = ((block[:, None, :] - values[None, :, :]) ** 2).sum(axis=2)
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        votes = np.zeros((len(block), len(COLOR_NAMES)), dtype=np.int32)
+        np.add.at(votes, (np.arange(len(block))[:, None], labels[nearest]), 1)
+        table[start:start + chunk] = votes.argmax(axis=1)
+    return bytearray(table.tobytes())
+
+
+def report(table, labels, values, step):
+    lut = ColorLUT(table, step, colors=COLOR_NAMES)
+    correct = sum(lut.classify([int(round(v)) for v in value]) == COLOR_NAMES[label]
+                  for label, value in zip(labels, values))
+    print('{} samples, {:.1%} classified as labeled'.format(len(labels), correct / len(labels)))
+    for code, name in enumerate(COLOR_NAMES):
+        print('  {:<7} {:>5} samples {:>6} cells'.format(name, int((labels == code).sum()),
+                                                        int((np.frombuffer(table, np.uint8) == code).sum())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('samples', nargs='+', help='CSV files recorded with tools/color_record.py')
+    parser.add_argument('--out', required=True, help='.bin file to write')
+    parser.add_argument('--step', type=int, default=4, help='width of each RGB level')
+    parser.add_argument('--k', type=int, default=5, help='nearest samples voting for each cell')
+    args = parser.parse_args()
+
+    labels, values = read_samples(args.samples)
+    if not len(labels):
+        raise SystemExit('no samples')
+
+    table = build_table(labels, values, args.step, args.k)
+    ColorLUT(table, args.step, colors=COLOR_NAMES).save(args.out)
+    report(table, labels, values, args.step)
+    print('saved {}'.format(args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env pybricks-micropython
+"""
+Record labeled RGB samples for tools/color_lut_build.py, on the EV3.
+
+Put the sensor over the color, start the recording and slide the robot slowly over the whole area of
+that color (lines, edges and all) while the samples are taken. Each run appends to the CSV file.
+
+    pybricks-micropython tools/color_record.py <port> <label> <file.csv> [samples] [interval ms]
+    pybricks-micropython tools/color_record.py S1 RED server_samples.csv 300
+"""
+
+import sys
+
+from pybricks.ev3devices import ColorSensor
+from pybricks.parameters import Port
+from pybricks.tools import wait
+
+
+def main():
+    if len(sys.argv) < 4:
+        print(__doc__)
+        return
+
+    port = getattr(Port, sys.argv[1])
+    label = sys.argv[2].upper()
+    path = sys.argv[3]
+    samples = int(sys.argv[4]) if len(sys.argv) > 4 else 200
+    interval = int(sys.argv[5]) if len(sys.argv) > 5 else 20
+
+    sensor = ColorSensor(port)
+    with open(path, 'a') as file:
+        for i in range(samples):
+            r, g, b = sensor.rgb()
+            file.write('{},{},{},{}\n'.format(label, r, g, b))
+            wait(interval)
+    print('{} samples of {} saved in {}'.format(samples, label, path))
+
+
+main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark the client-server sensor link on a computer, over the loopback mailboxes of sim/pybricks.
+
+The real client loop (utils_client.run_sensor_client) streams synthetic sensor readings from a thread,
+and the server side polls subsystems.remote_sensors.RemoteSensors like the control loops do. The
+link can be given latency, jitter and loss. Reports the link statistics of RemoteSensors, the
+message counts of both ends and the age of the readings the server saw.
+
+    python3 tools/link_bench.py --profile obstacle --latency 20 --jitter 10 --loss 0.05 --duration 10
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'sim'), ROOT]
+
+from pybricks import messaging
+from pybricks.tools import wait, StopWatch
+
+from constants import SERVER_NAME, CONTROL_LOOP_PERIOD, REMOTE_MAX_AGE
+from subsystems.remote_sensors import RemoteSensors
+from utils.color_lut import ColorFunction
+from utils.protocol import (STREAM_ALL, STREAM_OBSTACLE, STREAM_TOP_BURST, STREAM_CLAW, STREAM_IDLE,
+                            SENSOR_OBSTACLE, SENSOR_TOP, SENSOR_CLAW)
+from utils.stats import StreamingStats
+from utils.utils_client import rgb_to_color_claw, run_sensor_client
+
+PROFILES = {
+    'all': (STREAM_ALL, SENSOR_OBSTACLE),
+    'obstacle': (STREAM_OBSTACLE, SENSOR_OBSTACLE),
+    'top': (STREAM_TOP_BURST, SENSOR_TOP),
+    'claw': (STREAM_CLAW, SENSOR_CLAW),
+    'idle': (STREAM_IDLE, SENSOR_OBSTACLE)
+}
+
+
+class FakeUltrasonic:
+    """Distance slowly following a sine wave, with noise, like a robot driving past objects."""
+
+    def __init__(self, rng, base, amplitude, period):
+        self._rng = rng
+        self._watch = StopWatch()
+        self.base, self.amplitude, self.period = base, amplitude, period
+
+    def distance(self):
+        phase = 2 * math.pi * self._watch.time() / 1000 / self.period
+        return max(0, int(self.base + self.amplitude * math.sin(phase) + self._rng.gauss(0, 3)))
+
+
+class FakeColorSensor:
+    def __init__(self, rng):
+        self._rng = rng
+
+    def rgb(self):
+        return tuple(max(0, min(100, int(self._rng.gauss(value, 4)))) for value in (15, 20, 55))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--transport', choices=('queue', 'socket'), default='queue')
+    parser.add_argument('--port', type=int, default=50420)
+    parser.add_argument('--latency', type=float, default=0.0, help='ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='ms')
+    parser.add_argument('--loss', type=float, default=0.0, help='probability of dropping a message')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='all')
+    parser.add_argument('--duration', type=float, default=5.0, help='s')
+    parser.add_argument('--poll', type=int, default=CONTROL_LOOP_PERIOD, help='server poll period (ms)')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    messaging.configure(transport=args.transport, port=args.port, latency=args.latency, jitter=args.jitter,
+                        loss=args.loss, seed=args.seed)
+    rng = random.Random(args.seed)
+    running = True
+
+    def client():
+        connection = messaging.BluetoothMailboxClient()
+        connection.connect(SERVER_NAME)
+        clients.append(connection)
+        run_sensor_client(connection, FakeUltrasonic(rng, 400, 250, 3.0), FakeUltrasonic(rng, 150, 60, 1.0),
+                          FakeColorSensor(rng), ColorFunction(rgb_to_color_claw),
+                          running=lambda: running)
+
+    clients = []
+    thread = threading.Thread(target=client, daemon=True)
+    thread.start()
+
+    server = messaging.BluetoothMailboxServer()
+    server.wait_for_connection(1)
+    remote = RemoteSensors(server)
+    profile, sensor = PROFILES[args.profile]
+    remote.set_profile(profile)
+
+    # Descarta o início, enquanto o cliente troca de perfil
+    wait(200)
+    remote.reset_link_stats()
+
+    ages = StreamingStats()
+    polls = stale = 0
+    watch = StopWatch()
+    while watch.time() < args.duration * 1000:
+        start = watch.time()
+        remote.update()
+        age = remote.age(sensor)
+        polls += 1
+        if age is None or age > REMOTE_MAX_AGE:
+            stale += 1
+        else:
+            ages.add(age)
+        wait(args.poll - (watch.time() - start))
+
+    running = False
+    thread.join(1)
+
+    stats = remote.link_stats()
+    print('profile {}, {} transport, latency {} ms, jitter {} ms, loss {:.1%}'.format(
+        args.profile, args.transport, args.latency, args.jitter, args.loss))
+    print('link:   {received} received, {missed} missed, {rate:.1f} msg/s, latency mean {latency_mean:.1f} ms '
+          'max {latency_max} ms stddev {latency_stddev:.1f} ms'.format(**stats))
+    print('server: {}'.format(server.stats()))
+    if clients:
+        print('client: {}'.format(clients[0].stats()))
+    print('reading age: mean {:.1f} ms, max {} ms, stddev {:.1f} ms, stale in {} of {} polls ({:.1%})'.format(
+        ages.mean, ages.max, ages.stddev(), stale, polls, stale / polls if polls else 0.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo benchmark of the full mission over randomized arenas, in the headless simulator.
+
+Every layout is generated from its own seed: a random subset of the POSSIBLE_OBSTACLE_SQUARES that
+leaves every free square reachable and at least one entrance of every place free (like the arenas of
+the competition), people of random colors and sizes along the strip, and a random start pose on a free square. The unmodified
+Robot mission runs on each layout in a process pool, timed in virtual seconds and split into phases:
+
+- localization: find_reference_corner
+- pickup: take_person
+- travel: the go_to_any_position calls made while delivering
+- delivery: the rest of deliver_person
+
+The report gives the distribution of the mission time, the time per phase, the failures (missions
+that didn't deliver everyone in time, program errors, collisions with obstacles and people taken to
+the wrong place), and the comparison with a baseline saved by an earlier run with the same options.
+
+    python3 tools/mission_bench.py --missions 64 --baseline tools/mission_baseline.json
+    python3 tools/mission_bench.py --missions 64 --save-baseline tools/mission_baseline.json
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'sim'), ROOT]
+
+from constants import GRID_SIZE, SQUARE_SIZE, PROHIBITED_SQUARES, POSSIBLE_OBSTACLE_SQUARES
+
+PHASES = ('localization', 'pickup', 'travel', 'delivery', 'other')
+# Todas as pessoas que têm um lugar para ir: (cor, adulto)
+PEOPLE_KINDS = (('BLUE', True), ('RED', True), ('BROWN', True), ('GREEN', True),
+                ('BLUE', False), ('BROWN', False), ('GREEN', False))
+SIDES = (0, 90, 180, 270)
+DEFAULT_BASELINE = os.path.join(ROOT, 'tools', 'mission_baseline.json')
+
+
+def is_connected(obstacles):
+    """If every square that is neither prohibited nor in *obstacles* can be reached from the others."""
+    free = {(x, y) for y in range(GRID_SIZE) for x in range(GRID_SIZE)
+            if (x, y) not in PROHIBITED_SQUARES and (x, y) not in obstacles}
+    reached = {(0, 0)}
+    pending = [(0, 0)]
+    while pending:
+        x, y = pending.pop()
+        for neighbor in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if neighbor in free and neighbor not in reached:
+                reached.add(neighbor)
+                pending.append(neighbor)
+    return reached == free
+
+
+def has_entrances(obstacles):
+    """If every place has an entrance square that isn't in *obstacles*."""
+    from utils.utils_server import Place, get_deliver_positions
+
+    for place in range(Place.PARK + 1):
+        if all((position.x, position.y) in obstacles for position in get_deliver_positions(place, 0)):
+            return False
+    return True
+
+
+def make_layout(seed, min_obstacles, max_obstacles, people):
+    """A random layout as plain data (so it can go to the workers and into the baseline file)."""
+    rng = random.Random(seed)
+    # Obstáculos que fecham uma linha inteira com os quadrados proibidos, ou todas as entradas de um
+    # lugar, tornam a missão impossível
+    obstacles = rng.sample(POSSIBLE_OBSTACLE_SQUARES, rng.randint(min_obstacles, max_obstacles))
+    while not is_connected(obstacles) or not has_entrances(obstacles):
+        obstacles = rng.sample(POSSIBLE_OBSTACLE_SQUARES, rng.randint(min_obstacles, max_obstacles))
+
+    # Pessoas espalhadas pela faixa, com pelo menos meio quadrado entre elas
+    positions = []
+    while len(positions) < people:
+        x = rng.uniform(SQUARE_SIZE / 2, (GRID_SIZE - 0.8) * SQUARE_SIZE)
+        if all(abs(x - other) >= SQUARE_SIZE / 2 for other in positions):
+            positions.append(round(x))
+    kinds = [rng.choice(PEOPLE_KINDS) for _ in range(people)]
+
+    free = [(x, y) for y in range(GRID_SIZE) for x in range(GRID_SIZE)
+            if (x, y) not in PROHIBITED_SQUARES and (x, y) not in obstacles]
+    x, y = rng.choice(free)
+    start = (round(x * SQUARE_SIZE + rng.uniform(-40, 40)), round(y * SQUARE_SIZE + rng.uniform(-40, 40)),
+             round(rng.choice(SIDES) + rng.uniform(-10, 10)))
+
+    return {
+        'seed': seed,
+        'obstacles': [list(square) for square in sorted(obstacles)],
+        'people': [[x, color, adult] for x, (color, adult) in zip(sorted(positions), kinds)],
+        'start': list(start)
+    }
+
+
+class PhaseTimer:
+    """Exclusive virtual time spent in each phase: time in a nested phase isn't counted in the outer one."""
+
+    def __init__(self, clock):
+        self._clock = clock
+        self._stack = []
+        self.totals = dict.fromkeys(PHASES, 0.0)
+
+    def wrap(self, phase, function, inside=None):
+        """
+        Wrap *function* so its calls are timed as *phase*.
+
+        :param inside: If set, only the calls made directly inside this phase are timed.
+        """
+        def timed(*args, **kwargs):
+            if inside is not None and (not self._stack or self._stack[-1][0] != inside):
+                return function(*args, **kwargs)
+            self._stack.append([phase, self._clock.time(), 0.0])
+            try:
+                return function(*args, **kwargs)
+            finally:
+                name, start, nested = self._stack.pop()
+                elapsed = self._clock.time() - start
+                self.totals[name] += elapsed - nested
+                if self._stack:
+                    self._stack[-1][2] += elapsed
+
+        return timed
+
+
+def run_mission(task):
+    """Run one layout in a fresh worker process and return its record."""
+    layout, options = task
+    from pybricks.parameters import Color
+
+    import robot
+    from arena import Arena, Person
+    from simulator import Simulation
+    from utils.utils_server import Place
+
+    expected_places = {
+        (Color.BLUE, True): Place.MUSEUM, (Color.RED, True): Place.DRUGSTORE,
+        (Color.BROWN, True): Place.BAKERY, (Color.GREEN, True): Place.CITY_HALL,
+        (Color.BLUE, False): Place.SCHOOL, (Color.BROWN, False): Place.LIBRARY,
+        (Color.GREEN, False): Place.PARK
+    }
+
+    arena = Arena([tuple(square) for square in layout['obstacles']],
+                  [Person(x, getattr(Color, color), adult) for x, color, adult in layout['people']],
+                  tuple(layout['start']))
+    simulation = Simulation(arena, layout['seed'], latency=options['latency'], jitter=options['jitter'],
+                            loss=options['loss'])
+    timer = PhaseTimer(simulation.clock)
+    misclassified = 0
+
+    take_person = timer.wrap('pickup', robot.Robot.take_person)
+
+    def checked_take_person(self):
+        nonlocal misclassified
+        place = take_person(self)
+        held = simulation.world.held
+        if held is not None and place != expected_places[(held.color, held.adult)]:
+            misclassified += 1
+        return place
+
+    # Cada processo roda uma única missão, então a classe pode ser alterada sem desfazer
+    robot.Robot.find_reference_corner = timer.wrap('localization', robot.Robot.find_reference_corner)
+    robot.Robot.take_person = checked_take_person
+    robot.Robot.deliver_person = timer.wrap('delivery', robot.Robot.deliver_person)
+    robot.Robot.go_to_any_position = timer.wrap('travel', robot.Robot.go_to_any_position, inside='delivery')
+
+    result = simulation.run(options['time_limit'])
+    phases = timer.totals
+    phases['other'] = max(result['time'] - sum(phases[phase] for phase in PHASES if phase != 'other'), 0.0)
+
+    return {
+        'seed': layout['seed'],
+        'time': result['time'] if result['reason'] == 'delivered' else None,
+        'reason': result['reason'],
+        'delivered': result['delivered'],
+        'people': result['people'],
+        'phases': phases,
+        'collisions': sum(1 for event in result['events'] if event[1] == 'collision'),
+        'misclassified': misclassified,
+        'error': result['errors'][0][1].strip().splitlines()[-1] if result['errors'] else None,
+        'wall_time': result['wall_time']
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return math.nan
+    position = fraction * (len(values) - 1)
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def summarize(records):
+    times = [record['time'] for record in records if record['time'] is not None]
+    failures = {}
+    for record in records:
+        if record['time'] is None:
+            failures[record['reason']] = failures.get(record['reason'], 0) + 1
+    return {
+        'missions': len(records),
+        'completed': len(times),
+        'mean': statistics.mean(times) if times else math.nan,
+        'stddev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'min': min(times) if times else math.nan,
+        'p10': percentile(times, 0.1),
+        'p50': percentile(times, 0.5),
+        'p90': percentile(times, 0.9),
+        'max': max(times) if times else math.nan,
+        'phases': {phase: statistics.mean(record['phases'][phase] for record in records) for phase in PHASES},
+        'failures': failures,
+        'collisions': sum(1 for record in records if record['collisions']),
+        'misclassified': sum(record['misclassified'] for record in records)
+    }
+
+
+def print_report(records, summary, wall_time, workers):
+    print('{} missions on {} workers in {:.1f} s ({:.1f} s of simulation per mission)'.format(
+        summary['missions'], workers, wall_time,
+        statistics.mean(record['wall_time'] for record in records)))
+    print()
+    print('mission time (s), {} of {} completed:'.format(summary['completed'], summary['missions']))
+    print('  mean {mean:.1f}  stddev {stddev:.1f}  min {min:.1f}  p10 {p10:.1f}  p50 {p50:.1f}  p90 {p90:.1f}  '
+          'max {max:.1f}'.format(**summary))
+    times = [record['time'] for record in records if record['time'] is not None]
+    if times:
+        print_histogram(times)
+
+    print()
+    print('time per phase (s per mission, all missions):')
+    total = sum(summary['phases'].values())
+    for phase in PHASES:
+        share = summary['phases'][phase] / total if total else 0.0
+        print('  {:<13} {:7.1f}  {:5.1%}'.format(phase, summary['phases'][phase], share))
+
+    print()
+    print('failures:')
+    if not summary['failures']:
+        print('  none')
+    for reason, count in sorted(summary['failures'].items()):
+        print('  {:<24} {}'.format(reason, count))
+    print('  {:<24} {}'.format('with collisions', summary['collisions']))
+    print('  {:<24} {}'.format('people misclassified', summary['misclassified']))
+    for record in records:
+        if record['error'] is not None:
+            print('  seed {}: {}'.format(record['seed'], record['error']))
+
+
+def print_histogram(times, buckets=10, width=40):
+    low, high = min(times), max(times)
+    size = (high - low) / buckets or 1.0
+    counts = [0] * buckets
+    for value in times:
+        counts[min(int((value - low) / size), buckets - 1)] += 1
+    for i, count in enumerate(counts):
+        bar = '#' * int(round(width * count / max(counts)))
+        print('  {:6.1f} - {:6.1f}  {:4}  {}'.format(low + i * size, low + (i + 1) * size, count, bar))
+
+
+def print_comparison(records, layouts, settings, baseline):
+    """
+    Compare this run with *baseline*, only over the layouts both runs have. Nothing is compared if
+    the baseline was made with other settings (the seed only changes which layouts are shared).
+    """
+    different = sorted(key for key in set(settings) | set(baseline['settings'])
+                       if key != 'seed' and settings.get(key) != baseline['settings'].get(key))
+    print()
+    if different:
+        print('not compared with the baseline: it was made with other settings ({})'.format(
+            ', '.join('{} {} instead of {}'.format(key, baseline['settings'].get(key), settings.get(key))
+                      for key in different)))
+        return
+
+    # Comparação pareada: o mesmo tapete com a mesma semente dá o mesmo ruído, só o código muda
+    base_records = {json.dumps(layout, sort_keys=True): record
+                    for layout, record in zip(baseline['layouts'], baseline['records'])}
+    pairs = [(record, base_records[json.dumps(layout, sort_keys=True)])
+             for layout, record in zip(layouts, records) if json.dumps(layout, sort_keys=True) in base_records]
+    if not pairs:
+        print('not compared with the baseline: no layout in common')
+        return
+    summary = summarize([record for record, _ in pairs])
+    base_summary = summarize([base_record for _, base_record in pairs])
+
+    print('compared with the baseline over the {} layouts in common:'.format(len(pairs)))
+    print('  {:<16} {:>9} {:>9} {:>9}'.format('', 'current', 'baseline', 'change'))
+    current_rate = 1 - summary['completed'] / summary['missions']
+    base_rate = 1 - base_summary['completed'] / base_summary['missions']
+    print('  {:<16} {:>9.1%} {:>9.1%} {:>+6.1f} pp'.format('failure rate', current_rate, base_rate,
+                                                        100 * (current_rate - base_rate)))
+    for key in ('mean', 'p50', 'p90', 'max'):
+        current, base = summary[key], base_summary[key]
+        print('  {:<16} {:>9.1f} {:>9.1f} {:>9}'.format(key, current, base, format_change(current, base)))
+    for phase in PHASES:
+        current, base = summary['phases'][phase], base_summary['phases'][phase]
+        print('  {:<16} {:>9.1f} {:>9.1f} {:>9}'.format(phase, current, base, format_change(current, base)))
+
+    differences = [record['time'] - base_record['time'] for record, base_record in pairs
+                   if record['time'] is not None and base_record['time'] is not None]
+    if len(differences) > 1:
+        mean = statistics.mean(differences)
+        margin = 1.96 * statistics.stdev(differences) / math.sqrt(len(differences))
+        print('  paired over {} layouts: {:+.2f} s per mission (95% CI {:+.2f} to {:+.2f}), '
+              '{} faster, {} slower'.format(len(differences), mean, mean - margin, mean + margin,
+                                            sum(1 for d in differences if d < -0.05),
+                                            sum(1 for d in differences if d > 0.05)))
+    newly_failed = [record['seed'] for record, base_record in pairs
+                    if record['time'] is None and base_record['time'] is not None]
+    fixed = [record['seed'] for record, base_record in pairs
+             if record['time'] is not None and base_record['time'] is None]
+    if newly_failed or fixed:
+        print('  failing now, not in the baseline: {}'.format(newly_failed or 'none'))
+        print('  failing in the baseline, not now: {}'.format(fixed or 'none'))
+
+
+def format_change(current, base):
+    if not base or math.isnan(base) or math.isnan(current):
+        return '-'
+    return '{:+.1%}'.format((current - base) / base)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--missions', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first layout, the others follow')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--time-limit', type=float, default=600, help='virtual s per mission')
+    parser.add_argument('--obstacles', type=int, nargs=2, default=(0, 4), metavar=('MIN', 'MAX'))
+    parser.add_argument('--people', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=5.0, help='ms')
+    parser.add_argument('--jitter', type=float, default=2.0, help='ms')
+    parser.add_argument('--loss', type=float, default=0.0, help='probability of losing each message')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file to compare with')
+    parser.add_argument('--save-baseline', metavar='PATH', help='save this run as the baseline')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    options = {'time_limit': args.time_limit, 'latency': args.latency, 'jitter': args.jitter, 'loss': args.loss}
+    layouts = [make_layout(args.seed + i, args.obstacles[0], args.obstacles[1], args.people)
+               for i in range(args.missions)]
+
+    start = time.perf_counter()
+    # Um processo novo por missão: o Robot guarda estado em atributos de classe
+    with multiprocessing.Pool(args.workers, maxtasksperchild=1) as pool:
+        records = pool.map(run_mission, [(layout, options) for layout in layouts], chunksize=1)
+    wall_time = time.perf_counter() - start
+
+    summary = summarize(records)
+    print_report(records, summary, wall_time, args.workers)
+
+    settings = {'seed': args.seed, 'obstacles': list(args.obstacles), 'people': args.people}
+    settings.update(options)
+    if args.baseline and not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        print_comparison(records, layouts, settings, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump({'settings': settings, 'layouts': layouts, 'records': records}, file, indent=1)
+        print()
+        print('baseline saved to {}'.format(args.save_baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Cached BFS shortest path engine, kept as a reference for tools/planner_bench.py.
+
+The robot plans with utils.path_planner.PathPlanner; this one gives the same paths as
+utils_server.calculate_path, with the BFS tables cached per obstacle configuration.
+"""
+from constants import GRID_SIZE
+from utils.occupancy_grid import SQUARES, POSSIBLE_OBSTACLES_MASK, square_index, is_valid_square, squares_to_mask
+
+_CELLS = GRID_SIZE * GRID_SIZE
+_UNVISITED = 0xFF
+
+
+class PathTable:
+    """
+    Shortest path engine for the 5x5 arena.
+
+    For every obstacle bitmask it sees, a BFS parent table is built for all 25 start squares (the same
+    BFS, with the same neighbor order, that utils_server.calculate_path runs), so later queries only walk
+    the parent table from the goal back to the start. The tables are kept in a bounded LRU cache.
+    """
+
+    def __init__(self, max_tables=16):
+        """
+        :param max_tables: How many obstacle configurations are kept in the cache. Each one takes
+            625 bytes.
+        """
+        self.max_tables = max_tables
+        self._tables = {}
+        self._lru = []
+
+        self._queue = bytearray(_CELLS)
+        self._points = bytearray(_CELLS)
+
+    def calculate_path(self, initial, final, obstacles):
+        """
+        Same result as utils_server.calculate_path: the optimized list of waypoints from *initial* to
+        *final*, or None if *final* can't be reached.
+        """
+        if initial == final:
+            return [initial]
+        if not is_valid_square(initial) or not is_valid_square(final):
+            return None
+
+        parents = self.get_table(squares_to_mask(obstacles))
+        start = square_index(initial)
+        base = start * _CELLS
+
+        # Caminha do destino até o início guardando os índices no buffer
+        current = square_index(final)
+        if parents[base + current] == _UNVISITED:
+            return None
+
+        points = self._points
+        length = 0
+        while current != start:
+            points[length] = current
+            length += 1
+            current = parents[base + current]
+        points[length] = start
+
+        # Os pontos estão invertidos: points[length] é o início e points[0] o destino
+        path = []
+        for i in range(length - 1, 0, -1):
+            previous, square, following = points[i + 1], points[i], points[i - 1]
+            if (POSSIBLE_OBSTACLES_MASK >> following) & 1:
+                path.append(SQUARES[square])
+            elif (square - previous) != (following - square):
+                path.append(SQUARES[square])
+        path.append(SQUARES[points[0]])
+        return path
+
+    def get_table(self, mask):
+        """Return the BFS parent table for the obstacle *mask*, building it if it isn't cached."""
+        table = self._tables.get(mask)
+        if table is not None:
+            if self._lru[-1] != mask:
+                self._lru.remove(mask)
+                self._lru.append(mask)
+            return table
+
+        table = self._build_table(mask)
+        if len(self._lru) >= self.max_tables:
+            del self._tables[self._lru.pop(0)]
+        self._tables[mask] = table
+        self._lru.append(mask)
+        return table
+
+    def clear(self):
+        self._tables = {}
+        self._lru = []
+
+    def _build_table(self, mask):
+        parents = bytearray(b'\xff' * (_CELLS * _CELLS))
+        queue = self._queue
+
+        for start in range(_CELLS):
+            base = start * _CELLS
+            parents[base + start] = start
+            queue[0] = start
+            head, tail = 0, 1
+
+            while head < tail:
+                current = queue[head]
+                head += 1
+                x = current % GRID_SIZE
+
+                # Mesma ordem de vizinhos do calculate_path: (x + 1), (x - 1), (y + 1), (y - 1)
+                for neighbor, valid in ((current + 1, x < GRID_SIZE - 1),
+                                        (current - 1, x > 0),
+                                        (current + GRID_SIZE, current < _CELLS - GRID_SIZE),
+                                        (current - GRID_SIZE, current >= GRID_SIZE)):
+                    if not valid or (mask >> neighbor) & 1 or parents[base + neighbor] != _UNVISITED:
+                        continue
+                    parents[base + neighbor] = current
+                    queue[tail] = neighbor
+                    tail += 1
+
+        return parents
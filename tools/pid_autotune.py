@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Offline PID autotuner for the drive_straight controllers.
+
+Runs on a computer with NumPy, not on the EV3. Thousands of gain sets are simulated at once against a
+first order plant with dead time and saturation, using the same control law as utils.pid.PID/FastPID
+(proportional on error, integral clamped to the output limits, derivative on measurement), and ranked
+by settling time, overshoot and steady-state error. The best gains are printed as a block that can be
+pasted into constants.py.
+
+    python3 tools/pid_autotune.py --loop both --samples 5000
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'sim'), ROOT]
+
+from constants import (TURNING_P, TURNING_I, TURNING_D, STRAIGHT_P, STRAIGHT_I, STRAIGHT_D,
+                       CONTROL_LOOP_PERIOD)
+
+# Período do laço de controle em segundos
+DEFAULT_PERIOD = CONTROL_LOOP_PERIOD / 1000
+
+
+class Plant:
+    """
+    First order plant with dead time and actuator saturation: the command (a rate) goes through a
+    delay line, is clipped to +-*max_rate*, followed with time constant *tau*, and integrated into the
+    measured output.
+    """
+
+    def __init__(self, tau, delay, max_rate):
+        self.tau = tau
+        self.delay = delay
+        self.max_rate = max_rate
+
+
+def simulate(gains, plant, setpoint, duration, period, output_limits=(None, None), stop_at_setpoint=False,
+             initial=0.0):
+    """
+    Simulate every gain set of *gains* (an array of shape (N, 3) with Kp, Ki, Kd) for *duration* seconds.
+
+    With *stop_at_setpoint* the command drops to zero once the output reaches the setpoint, like
+    Drive.drive_straight does when the distance is reached.
+
+    Returns the output trajectories, an array of shape (steps, N).
+    """
+    kp, ki, kd = gains[:, 0], gains[:, 1], gains[:, 2]
+    n = len(gains)
+    steps = int(round(duration / period))
+    delay_steps = max(int(round(plant.delay / period)), 0)
+    lower = -np.inf if output_limits[0] is None else output_limits[0]
+    upper = np.inf if output_limits[1] is None else output_limits[1]
+    alpha = period / (plant.tau + period)
+
+    position = np.full(n, float(initial))
+    rate = np.zeros(n)
+    integral = np.zeros(n)
+    last_input = position.copy()
+    stopped = np.zeros(n, dtype=bool)
+    pending = np.zeros((delay_steps + 1, n))
+    trajectory = np.empty((steps, n))
+
+    for step in range(steps):
+        error = setpoint - position
+        integral = np.clip(integral + ki * error * period, lower, upper)
+        derivative = -kd * (position - last_input) / period if step > 0 else 0.0
+        output = np.clip(kp * error + integral + derivative, lower, upper)
+        last_input = position
+
+        if stop_at_setpoint:
+            stopped |= (position - initial) * np.sign(setpoint - initial) >= abs(setpoint - initial)
+            output = np.where(stopped, 0.0, output)
+
+        pending = np.roll(pending, -1, axis=0)
+        pending[-1] = output
+        command = np.clip(pending[0], -plant.max_rate, plant.max_rate)
+
+        rate += alpha * (command - rate)
+        position = position + rate * period
+        trajectory[step] = position
+
+    return trajectory
+
+
+def score(trajectory, setpoint, initial, period, band=0.02, weights=(1.0, 2.0, 5.0)):
+    """
+    Rank the trajectories by a weighted sum of the settling time (s), the overshoot (fraction of the
+    step) and the steady-state error (fraction of the step). Returns (scores, settling, overshoot, error).
+    """
+    step_size = abs(setpoint - initial)
+    normalized = (trajectory - initial) / (setpoint - initial)
+    error = np.abs(1.0 - normalized)
+
+    outside = error > band
+    # Último instante fora da faixa, o sistema está acomodado a partir do seguinte
+    last_outside = len(trajectory) - 1 - np.argmax(outside[::-1], axis=0)
+    settled = ~outside[-1]
+    settling = np.where(settled, (last_outside + 1) * period, np.inf)
+    settling = np.where(outside.any(axis=0), settling, 0.0)
+
+    overshoot = np.maximum(normalized.max(axis=0) - 1.0, 0.0)
+    tail = max(len(trajectory) // 10, 1)
+    steady_state = error[-tail:].mean(axis=0)
+
+    weighted = weights[0] * settling + weights[1] * overshoot + weights[2] * steady_state
+    weighted = np.where(np.isfinite(weighted), weighted, np.inf)
+    return weighted, settling, overshoot, steady_state * step_size
+
+
+def sample_gains(rng, samples, p_range, i_range, d_range):
+    """Log-uniform random gain sets, plus zero for the I and D ranges that start at 0."""
+    def log_uniform(low, high):
+        if low <= 0:
+            values = np.exp(rng.uniform(np.log(high * 1e-4), np.log(high), samples))
+            values[rng.random(samples) < 0.1] = 0.0
+            return values
+        return np.exp(rng.uniform(np.log(low), np.log(high), samples))
+
+    return np.stack([log_uniform(*p_range), log_uniform(*i_range), log_uniform(*d_range)], axis=1)
+
+
+def tune(name, rng, args, plant, setpoint, output_limits, stop_at_setpoint, current):
+    gains = sample_gains(rng, args.samples, args.p_range, args.i_range, args.d_range)
+    gains = np.vstack([np.array([current]), gains])
+
+    trajectory = simulate(gains, plant, setpoint, args.duration, args.period, output_limits, stop_at_setpoint)
+    scores, settling, overshoot, error = score(trajectory, setpoint, 0.0, args.period)
+
+    order = np.argsort(scores)
+    print('# {}: {} gain sets simulated'.format(name, len(gains)))
+    print('#   current  Kp={:.6g} Ki={:.6g} Kd={:.6g}  settling={:.3f}s overshoot={:.1%} error={:.3g}'.format(
+        current[0], current[1], current[2], settling[0], overshoot[0], error[0]))
+    for rank in range(min(args.top, len(order))):
+        i = order[rank]
+        print('#   #{:<3}    Kp={:.6g} Ki={:.6g} Kd={:.6g}  settling={:.3f}s overshoot={:.1%} error={:.3g}'.format(
+            rank + 1, gains[i, 0], gains[i, 1], gains[i, 2], settling[i], overshoot[i], error[i]))
+    return gains[order[0]]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--loop', choices=('turning', 'straight', 'both'), default='both')
+    parser.add_argument('--samples', type=int, default=5000, help='gain sets simulated per loop')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--period', type=float, default=DEFAULT_PERIOD, help='control loop period (s)')
+    parser.add_argument('--duration', type=float, default=3.0, help='simulated time (s)')
+    parser.add_argument('--top', type=int, default=5, help='how many of the best gain sets to list')
+    parser.add_argument('--p-range', type=float, nargs=2, default=(0.05, 20.0))
+    parser.add_argument('--i-range', type=float, nargs=2, default=(0.0, 5.0))
+    parser.add_argument('--d-range', type=float, nargs=2, default=(0.0, 1.0))
+
+    parser.add_argument('--heading-tau', type=float, default=0.12, help='turn rate time constant (s)')
+    parser.add_argument('--heading-delay', type=float, default=0.03, help='turn rate dead time (s)')
+    parser.add_argument('--heading-max-rate', type=float, default=300.0, help='turn rate limit (deg/s)')
+    parser.add_argument('--heading-step', type=float, default=15.0, help='heading error to correct (deg)')
+
+    parser.add_argument('--distance-tau', type=float, default=0.2, help='speed time constant (s)')
+    parser.add_argument('--distance-delay', type=float, default=0.03, help='speed dead time (s)')
+    parser.add_argument('--distance-max-rate', type=float, default=800.0, help='speed limit (mm/s)')
+    parser.add_argument('--distance', type=float, default=300.0, help='distance to drive (mm)')
+    parser.add_argument('--speed', type=float, default=250.0, help='drive_straight speed (mm/s)')
+
+    parser.add_argument('--turning', type=float, nargs=3, default=(TURNING_P, TURNING_I, TURNING_D),
+                        metavar=('P', 'I', 'D'), help='current TURNING_P/I/D')
+    parser.add_argument('--straight', type=float, nargs=3, default=(STRAIGHT_P, STRAIGHT_I, STRAIGHT_D),
+                        metavar=('P', 'I', 'D'), help='current STRAIGHT_P/I/D')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(args.seed)
+    block = []
+
+    if args.loop in ('turning', 'both'):
+        plant = Plant(args.heading_tau, args.heading_delay, args.heading_max_rate)
+        p, i, d = tune('TURNING (heading hold in drive_straight)', rng, args, plant, args.heading_step,
+                       (None, None), False, args.turning)
+        block += ['TURNING_P = {:.6g}'.format(p), 'TURNING_I = {:.6g}'.format(i), 'TURNING_D = {:.6g}'.format(d)]
+
+    if args.loop in ('straight', 'both'):
+        plant = Plant(args.distance_tau, args.distance_delay, args.distance_max_rate)
+        # Mesmos limites que o drive_straight usa para a velocidade
+        p, i, d = tune('STRAIGHT (distance in drive_straight)', rng, args, plant, args.distance,
+                       (45.0, args.speed), True, args.straight)
+        if block:
+            block.append('')
+        block += ['STRAIGHT_P = {:.6g}'.format(p), 'STRAIGHT_I = {:.6g}'.format(i), 'STRAIGHT_D = {:.6g}'.format(d)]
+
+    print()
+    print('\n'.join(block))
+
+
+if __name__ == '__main__':
+    main()
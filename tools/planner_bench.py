@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of the path planners over every obstacle configuration.
+
+For each of the 2^10 subsets of the POSSIBLE_OBSTACLE_SQUARES (plus the PROHIBITED_SQUARES, which
+are always blocked), every planner is asked for the path between every pair of free squares. The
+robot's heading at the start goes round the four sides from one query to the next. The queries are
+made in the order a mission makes them: the obstacles change least often and the goal changes more
+often than the start. So PathTable's cache stays warm as it would on the robot.
+
+The report gives, for each planner:
+
+- the latency of each call: percentiles and the slowest call;
+- the memory of each call: bytes allocated per call with gc.mem_alloc() under MicroPython, or with
+  --memory the peak bytes per call with tracemalloc (which slows the calls down, so the latencies
+  of that run aren't comparable with the others);
+- the checks: invalid paths (leaving the arena, going through an obstacle, not ending at the goal,
+  or a segment running into one of the POSSIBLE_OBSTACLE_SQUARES without stopping before it),
+  wrong answers about whether the goal can be reached, paths longer than the BFS shortest path, and
+  the time of the path in the PathPlanner cost model, compared with the time-optimal one.
+
+With --discovery the planners don't know the obstacles in advance. Each route is followed square
+by square, and every obstacle met on the way is added before asking the same planner again for the
+same goal. The latency of these replans, made with a cache or a planner that already answered for
+the route, is reported apart from the cold search at the start of each route.
+
+It doesn't need the simulator to run: the same file runs with MicroPython on the brick, to see the
+latency where it matters. There is no argparse there, so it runs every planner on every 16th obstacle
+subset.
+
+    python3 tools/planner_bench.py
+    python3 tools/planner_bench.py --planners table planner --stride 8 --memory
+    python3 tools/planner_bench.py --discovery
+"""
+
+import gc
+import sys
+
+try:
+    import os
+    ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path[:0] = [os.path.join(ROOT, 'sim'), ROOT]
+except (ImportError, AttributeError):
+    # MicroPython no brick: roda da pasta do projeto, que já está no caminho
+    pass
+
+try:
+    from time import perf_counter_ns
+
+    def ticks_us():
+        return perf_counter_ns() // 1000
+
+    def ticks_diff(end, start):
+        return end - start
+except ImportError:
+    from utime import ticks_us, ticks_diff
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# utils_server antes: subsystems.drive importa dele
+from utils.utils_server import calculate_path
+from tools.path_table import PathTable
+from utils.path_planner import PathPlanner, heading_to_index
+from utils.occupancy_grid import SQUARES, square_index
+
+from constants import (GRID_SIZE, PROHIBITED_SQUARES, POSSIBLE_OBSTACLE_SQUARES, PATH_TURN_90_TIME,
+                       PATH_TURN_180_TIME, PATH_SQUARE_TIME, PATH_SEGMENT_TIME)
+
+_CELLS = GRID_SIZE * GRID_SIZE
+_INFINITY = 1 << 30
+HEADINGS = (0, 90, 180, 270)
+TURN_TIMES = (0, PATH_TURN_90_TIME, PATH_TURN_180_TIME, PATH_TURN_90_TIME)
+# Deslocamento de cada direção, indexada como heading // 90
+MOVES = ((0, -1), (1, 0), (0, 1), (-1, 0))
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def make_planners(names):
+    """The planners to compare, as (name, function(initial, final, obstacles, heading))."""
+    planners = []
+    if 'server' in names:
+        planners.append(('server', lambda initial, final, obstacles, heading:
+                         calculate_path(initial, final, obstacles)))
+    if 'table' in names:
+        table = PathTable()
+        planners.append(('table', lambda initial, final, obstacles, heading:
+                         table.calculate_path(initial, final, obstacles)))
+    if 'planner' in names:
+        planner = PathPlanner()
+        planners.append(('planner', planner.calculate_path))
+    return planners
+
+
+def obstacle_subsets(stride=1):
+    """Every subset of the POSSIBLE_OBSTACLE_SQUARES (every *stride*-th one), with the prohibited squares."""
+    for subset in range(0, 1 << len(POSSIBLE_OBSTACLE_SQUARES), stride):
+        obstacles = list(PROHIBITED_SQUARES)
+        for i in range(len(POSSIBLE_OBSTACLE_SQUARES)):
+            if (subset >> i) & 1:
+                obstacles.append(POSSIBLE_OBSTACLE_SQUARES[i])
+        yield obstacles
+
+
+def bfs_distances(goal, blocked):
+    """Number of squares from every square to *goal*, None where it can't be reached."""
+    distances = [None] * _CELLS
+    distances[square_index(goal)] = 0
+    queue = [goal]
+    head = 0
+    while head < len(queue):
+        x, y = queue[head]
+        head += 1
+        for dx, dy in MOVES:
+            neighbor = (x + dx, y + dy)
+            if not (0 <= neighbor[0] < GRID_SIZE and 0 <= neighbor[1] < GRID_SIZE) or neighbor in blocked:
+                continue
+            if distances[square_index(neighbor)] is None:
+                distances[square_index(neighbor)] = distances[square_index((x, y))] + 1
+                queue.append(neighbor)
+    return distances
+
+
+def fastest_times(goal, blocked, possible):
+    """
+    Time in ms of the fastest path from every (square, heading) state to *goal*, with the moves and
+    costs of PathPlanner, by a plain Dijkstra over all the states. Indexed by square_index * 4 + heading.
+    """
+    times = [_INFINITY] * (_CELLS * 4)
+    done = [False] * (_CELLS * 4)
+    for direction in range(4):
+        times[square_index(goal) * 4 + direction] = 0
+
+    # Busca para trás: de cada estado fechado, relaxa os estados que chegam nele
+    while True:
+        state, best = -1, _INFINITY
+        for i in range(_CELLS * 4):
+            if not done[i] and times[i] < best:
+                state, best = i, times[i]
+        if state < 0:
+            break
+        done[state] = True
+        square, direction = SQUARES[state >> 2], state & 3
+
+        for other in range(4):
+            previous = square_index(square) * 4 + other
+            if best + TURN_TIMES[(direction - other) & 3] < times[previous]:
+                times[previous] = best + TURN_TIMES[(direction - other) & 3]
+
+        for start in segment_starts(square, direction, blocked, possible):
+            cost = best + PATH_SEGMENT_TIME + PATH_SQUARE_TIME * (abs(start[0] - square[0]) + abs(start[1] - square[1]))
+            previous = square_index(start) * 4 + direction
+            if cost < times[previous]:
+                times[previous] = cost
+
+    # A ré pela linha y = 0 só sai de um início no canto (0, 0) já virado para a esquerda, e um caminho
+    # mais rápido nunca volta ao estado inicial: basta somá-la aos tempos sem ré
+    square = (0, 0)
+    squares = 0
+    while True:
+        square = (square[0] + 1, 0)
+        if square[0] >= GRID_SIZE or square in blocked or (squares > 0 and square in possible):
+            break
+        squares += 1
+        cost = PATH_SEGMENT_TIME + PATH_SQUARE_TIME * squares + times[square_index(square) * 4 + 3]
+        times[3] = min(times[3], cost)
+    return times
+
+
+def segment_starts(square, direction, blocked, possible):
+    """The squares from which a straight segment with the robot facing *direction* ends at *square*."""
+    starts = []
+    if square in blocked:
+        return starts
+    dx, dy = MOVES[direction]
+    current = square
+    while True:
+        previous = (current[0] - dx, current[1] - dy)
+        if not (0 <= previous[0] < GRID_SIZE and 0 <= previous[1] < GRID_SIZE) or previous in blocked:
+            break
+        starts.append(previous)
+        # Só o primeiro quadrado de um segmento pode ser um possível obstáculo
+        if current in possible:
+            break
+        current = previous
+    return starts
+
+
+def check_path(initial, final, heading, path, blocked, possible):
+    """
+    Follow *path* from *initial* the way Robot.go_to_position drives it.
+
+    Returns (problem, squares, time): a description of what is wrong with the path, or None, the
+    number of squares driven and the time of the path in the PathPlanner cost model.
+    """
+    if path == [initial]:
+        return (None if initial == final else 'stays at the start'), 0, 0
+
+    square, direction = initial, heading_to_index(heading)
+    squares, time = 0, 0
+    for waypoint in path:
+        dx, dy = waypoint[0] - square[0], waypoint[1] - square[1]
+        if (dx == 0) == (dy == 0):
+            return 'waypoint {} not in line with {}'.format(waypoint, square), squares, time
+        length = abs(dx) + abs(dy)
+        movement = MOVES.index((dx // length, dy // length))
+
+        if square == (0, 0) and direction == 3 and movement == 1:
+            # Ré pela linha y = 0 sem virar
+            pass
+        else:
+            time += TURN_TIMES[(movement - direction) & 3]
+            direction = movement
+
+        for step in range(1, length + 1):
+            current = (square[0] + step * MOVES[movement][0], square[1] + step * MOVES[movement][1])
+            if not (0 <= current[0] < GRID_SIZE and 0 <= current[1] < GRID_SIZE):
+                return 'leaves the arena at {}'.format(current), squares, time
+            if current in blocked:
+                return 'goes through the obstacle {}'.format(current), squares, time
+            if step > 1 and current in possible:
+                return "doesn't stop before {}".format(current), squares, time
+        squares += length
+        time += PATH_SEGMENT_TIME + length * PATH_SQUARE_TIME
+        square = waypoint
+
+    if square != final:
+        return 'ends at {}'.format(square), squares, time
+    return None, squares, time
+
+
+def percentile(values, fraction):
+    """*values* must be sorted."""
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(fraction / 100 * len(values)))]
+
+
+class PlannerStats:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.memory = []
+        self.slowest = (0, None)
+        self.invalid = 0
+        self.wrong_reachability = 0
+        self.longer = 0
+        self.slower = 0
+        self.extra_time = 0
+        self.optimal_time = 0
+        self.examples = []
+
+    def problem(self, text):
+        if len(self.examples) < 5:
+            self.examples.append(text)
+
+
+def timed_call(stat, function, initial, final, obstacles, heading, memory, description):
+    """Call the planner *function* once, adding its latency (and memory) to *stat*, and return the path."""
+    # O coletor fica desligado durante a chamada para não somar uma coleta na latência
+    gc.disable()
+    if memory == 'tracemalloc':
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    elif memory == 'mem_alloc':
+        before = gc.mem_alloc()
+    start = ticks_us()
+    path = function(initial, final, obstacles, heading)
+    elapsed = ticks_diff(ticks_us(), start)
+    if memory == 'tracemalloc':
+        stat.memory.append(tracemalloc.get_traced_memory()[1] - before)
+    elif memory == 'mem_alloc':
+        stat.memory.append(gc.mem_alloc() - before)
+    gc.enable()
+
+    stat.latencies.append(elapsed)
+    if elapsed > stat.slowest[0]:
+        stat.slowest = (elapsed, description)
+    return path
+
+
+def check_result(stat, path, initial, final, heading, reference, description):
+    """
+    Check *path* against the *reference* of its goal and obstacles (see make_reference), counting the
+    problems in *stat*. Returns True if the path is valid.
+    """
+    blocked, possible, distances, times = reference
+    distance = distances[square_index(initial)]
+    optimal = times[square_index(initial) * 4 + heading_to_index(heading)]
+    if path is None:
+        if distance is not None:
+            stat.wrong_reachability += 1
+            stat.problem('no path for ' + description)
+        return False
+    if distance is None:
+        stat.wrong_reachability += 1
+        stat.problem('path to an unreachable goal for ' + description)
+        return False
+
+    problem, squares, time = check_path(initial, final, heading, path, blocked, possible)
+    if problem is not None:
+        stat.invalid += 1
+        stat.problem('{}: {} {}'.format(problem, description, path))
+        return False
+    if squares > distance:
+        stat.longer += 1
+    if time > optimal:
+        stat.slower += 1
+        stat.extra_time += time - optimal
+    elif time < optimal:
+        stat.problem('faster than the optimum ({} < {} ms): {} {}'.format(time, optimal, description, path))
+    stat.optimal_time += optimal
+    return True
+
+
+def make_reference(final, obstacles):
+    """What check_result needs for a goal and a list of obstacles: (blocked, possible, distances, times)."""
+    blocked = set(obstacles)
+    possible = set(POSSIBLE_OBSTACLE_SQUARES) - blocked
+    return blocked, possible, bfs_distances(final, blocked), fastest_times(final, blocked, possible)
+
+
+def describe(initial, final, heading, obstacles):
+    return '{} -> {} facing {} with obstacles {}'.format(initial, final, heading,
+                                                        sorted(set(obstacles) - set(PROHIBITED_SQUARES)))
+
+
+def run(names, stride=1, memory=None):
+    """
+    Run the queries of every obstacle subset and return (list of PlannerStats, number of queries per
+    planner).
+
+    :param memory: 'mem_alloc' or 'tracemalloc' to measure the memory of each call with it.
+    """
+    planners = make_planners(names)
+    stats = [PlannerStats(name) for name, _ in planners]
+    query = 0
+
+    for obstacles in obstacle_subsets(stride):
+        free = [square for square in SQUARES if square not in obstacles]
+        for final in free:
+            reference = make_reference(final, obstacles)
+            for initial in free:
+                if initial == final:
+                    continue
+                heading = HEADINGS[query % 4]
+                query += 1
+                description = describe(initial, final, heading, obstacles)
+                for (name, function), stat in zip(planners, stats):
+                    path = timed_call(stat, function, initial, final, obstacles, heading, memory, description)
+                    check_result(stat, path, initial, final, heading, reference, description)
+    return stats, query
+
+
+def follow(initial, heading, path, hidden):
+    """
+    Drive *path* square by square from *initial*, facing *heading*, until the next square holds one of
+    the *hidden* obstacles. Returns (square, heading, obstacle found or None).
+    """
+    square = initial
+    for waypoint in path:
+        dx, dy = waypoint[0] - square[0], waypoint[1] - square[1]
+        length = abs(dx) + abs(dy)
+        movement = MOVES.index((dx // length, dy // length))
+        if not (square == (0, 0) and heading_to_index(heading) == 3 and movement == 1):
+            heading = HEADINGS[movement]
+        for _ in range(length):
+            ahead = (square[0] + MOVES[movement][0], square[1] + MOVES[movement][1])
+            if ahead in hidden:
+                return square, heading, ahead
+            square = ahead
+    return square, heading, None
+
+
+def run_discovery(names, stride=1, memory=None):
+    """
+    Run the planners the way a mission meets the obstacles, and return (list of PlannerStats, number of
+    routes).
+
+    For every obstacle subset, goal and start, new planners only know the PROHIBITED_SQUARES. The path
+    is followed square by square, and when the next square holds an obstacle the robot stops before
+    it, the obstacle is added to the known ones and the same planner is asked again for the same goal
+    from there. The first query of each route is a cold search and the others are replans, counted in
+    separate PlannerStats.
+    """
+    names = [name for name, _ in make_planners(names)]
+    stats = []
+    for name in names:
+        stats += [PlannerStats(name + ' cold'), PlannerStats(name + ' replan')]
+    routes = 0
+
+    for obstacles in obstacle_subsets(stride):
+        hidden = set(obstacles) - set(PROHIBITED_SQUARES)
+        free = [square for square in SQUARES if square not in obstacles]
+        for final in free:
+            # Referências por conjunto de obstáculos conhecidos, que se repetem entre as rotas
+            references = {}
+            for initial in free:
+                if initial == final:
+                    continue
+                heading = HEADINGS[routes % 4]
+                routes += 1
+
+                for i, (name, function) in enumerate(make_planners(names)):
+                    known = list(PROHIBITED_SQUARES)
+                    square, facing = initial, heading
+                    for replan in range(len(hidden) + 1):
+                        stat = stats[2 * i + (1 if replan else 0)]
+                        key = tuple(sorted(known))
+                        if key not in references:
+                            references[key] = make_reference(final, known)
+                        description = describe(square, final, facing, known)
+                        path = timed_call(stat, function, square, final, known, facing, memory, description)
+                        if not check_result(stat, path, square, final, facing, references[key], description):
+                            break
+                        square, facing, found = follow(square, facing, path, hidden)
+                        if found is None:
+                            break
+                        known.append(found)
+    return stats, routes
+
+
+def print_report(stats, memory_label):
+    print()
+    print('latency (us)      ' + ''.join('{:>9}'.format('p{}'.format(p)) for p in PERCENTILES) +
+          '{:>9}{:>9}'.format('mean', 'max'))
+    for stat in stats:
+        latencies = sorted(stat.latencies)
+        mean = sum(latencies) / len(latencies) if latencies else 0
+        print('  {:<16}'.format(stat.name) + ''.join('{:>9}'.format(percentile(latencies, p)) for p in PERCENTILES) +
+              '{:>9.1f}{:>9}'.format(mean, latencies[-1] if latencies else 0))
+    for stat in stats:
+        if stat.slowest[1] is not None:
+            print('  slowest {}: {}'.format(stat.name, stat.slowest[1]))
+
+    if memory_label is not None:
+        print()
+        print(memory_label + ''.join('{:>9}'.format('p{}'.format(p)) for p in PERCENTILES) +
+              '{:>9}{:>9}'.format('mean', 'max'))
+        for stat in stats:
+            memory = sorted(stat.memory)
+            mean = sum(memory) / len(memory) if memory else 0
+            print('  {:<16}'.format(stat.name) + ''.join('{:>9}'.format(percentile(memory, p)) for p in PERCENTILES) +
+                  '{:>9.1f}{:>9}'.format(mean, memory[-1] if memory else 0))
+
+    print()
+    print('checks            queries  invalid  reach   longer   slower  time over optimal')
+    for stat in stats:
+        over = 100 * stat.extra_time / stat.optimal_time if stat.optimal_time else 0
+        print('  {:<16}{:>7}{:>9}{:>7}{:>9}{:>9}  {:+.2f}%'.format(stat.name, len(stat.latencies), stat.invalid,
+                                                                  stat.wrong_reachability, stat.longer,
+                                                                  stat.slower, over))
+    for stat in stats:
+        for example in stat.examples:
+            print('  {}: {}'.format(stat.name, example))
+
+
+def main():
+    names, stride, memory, discovery = ('server', 'table', 'planner'), 16, None, False
+    try:
+        import argparse
+    except ImportError:
+        argparse = None
+    if argparse is not None:
+        parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+        parser.add_argument('--planners', nargs='+', choices=names, default=names)
+        parser.add_argument('--stride', type=int, default=1, help='only run every STRIDE-th obstacle subset')
+        parser.add_argument('--memory', action='store_true', help='measure the peak memory of each call with tracemalloc')
+        parser.add_argument('--discovery', action='store_true',
+                            help='find the obstacles along each route, timing cold searches and replans apart')
+        args = parser.parse_args()
+        names, stride, discovery = args.planners, args.stride, args.discovery
+        if args.memory and tracemalloc is not None:
+            memory = 'tracemalloc'
+
+    memory_label = None
+    if hasattr(gc, 'mem_alloc'):
+        memory = 'mem_alloc'
+        memory_label = 'alloc bytes/call '
+    elif memory == 'tracemalloc':
+        tracemalloc.start()
+        memory_label = 'peak bytes/call  '
+
+    if discovery:
+        stats, routes = run_discovery(names, stride, memory)
+        print('{} routes per planner, with the obstacles found on the way'.format(routes))
+    else:
+        stats, queries = run(names, stride, memory)
+        print('{} queries per planner'.format(queries))
+    if memory == 'tracemalloc':
+        tracemalloc.stop()
+    print_report(stats, memory_label)
+
+
+if __name__ == '__main__':
+    main()
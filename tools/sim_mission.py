@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Run the full mission (main.py and main_client.py, unmodified) in the headless arena simulator.
+
+The robot, the arena and the Bluetooth link are simulated in virtual time (see sim/README.md), so a
+mission of several minutes takes a few seconds. Prints the programs' output with the virtual time,
+then the pickups, deliveries and collisions, and how long the mission took.
+
+    python3 tools/sim_mission.py --obstacles 2,2 3,1 --people GREEN:child:250 BLUE:adult:700 --seed 3
+"""
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'sim'), ROOT]
+
+from pybricks.parameters import Color
+
+from arena import Arena, Person
+from simulator import Simulation
+
+
+def parse_square(text):
+    x, y = text.split(',')
+    return int(x), int(y)
+
+
+def parse_person(text):
+    color, kind, x = text.split(':')
+    if kind not in ('adult', 'child'):
+        raise argparse.ArgumentTypeError('expected adult or child, got {!r}'.format(kind))
+    return Person(float(x), getattr(Color, color.upper()), kind == 'adult')
+
+
+def parse_pose(text):
+    x, y, heading = text.split(',')
+    return float(x), float(y), float(heading)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--obstacles', type=parse_square, nargs='*', default=[(2, 2), (4, 4)],
+                        metavar='X,Y', help='squares with an obstacle')
+    parser.add_argument('--people', type=parse_person, nargs='*', default=None,
+                        metavar='COLOR:adult|child:X', help='people in the strip, X in mm')
+    parser.add_argument('--start', type=parse_pose, default=(0, 0, 0), metavar='X,Y,HEADING',
+                        help='start pose, in mm and degrees')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--time-limit', type=float, default=600, help='virtual s')
+    parser.add_argument('--latency', type=float, default=5.0, help='ms')
+    parser.add_argument('--jitter', type=float, default=2.0, help='ms')
+    parser.add_argument('--loss', type=float, default=0.0, help='probability of losing each message')
+    parser.add_argument('--quiet', action='store_true', help="don't print the programs' output")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    arena = Arena(args.obstacles, args.people, args.start)
+    simulation = Simulation(arena, args.seed, latency=args.latency, jitter=args.jitter, loss=args.loss)
+    result = simulation.run(args.time_limit, echo=not args.quiet)
+
+    print()
+    for time, kind, person, (x, y) in result['events']:
+        if person is None:
+            print('{:8.3f}  {} at ({:.0f}, {:.0f})'.format(time, kind, x, y))
+        else:
+            print('{:8.3f}  {} {} {} at ({:.0f}, {:.0f})'.format(time, kind, person.color.name.lower(),
+                                                               'adult' if person.adult else 'child', x, y))
+    for brick, error in result['errors']:
+        print('{} failed:\n{}'.format(brick, error))
+
+    print('stopped by {} after {:.1f} s, {} of {} people delivered ({:.1f} s of wall time, {:.0f}x)'.format(
+        result['reason'], result['time'], result['delivered'], result['people'], result['wall_time'],
+        result['time'] / result['wall_time'] if result['wall_time'] else 0.0))
+
+
+if __name__ == '__main__':
+    main()
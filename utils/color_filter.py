@@ -0,0 +1,94 @@
+from array import array
+
+from pybricks.tools import StopWatch
+
+from constants import COLOR_FILTER_SIZE, COLOR_FILTER_VOTES, COLOR_FILTER_MAX_GAP
+from utils.color_lut import COLOR_NAMES
+
+
+class ColorFilter:
+    """
+    k-of-n vote over the last readings of a color sensor, given as color codes (see ColorLUT).
+
+    The filtered color only changes when another color shows up in *votes* of the last *size*
+    readings, so a single noisy reading never triggers a line. Every change is an edge event: after
+    the push that caused it, *changed* is True, *left* and *entered* hold the old and the new color
+    codes, and *transition_time* holds the time (of the filter's StopWatch) of the first reading of
+    the new color in the window, which is when the sensor actually crossed the edge.
+    """
+
+    def __init__(self, size=COLOR_FILTER_SIZE, votes=COLOR_FILTER_VOTES, max_gap=COLOR_FILTER_MAX_GAP):
+        """
+        :param size: How many readings are kept.
+        :param votes: How many of them a color needs to become the filtered color. Should be more than
+            half of *size*, so that only one color can have the votes.
+        :param max_gap: Time in ms without readings after which the old readings are discarded and the
+            filter starts over from the next one.
+        """
+        self.size = size
+        self.votes = votes
+        self.max_gap = max_gap
+
+        self._codes = bytearray(size)
+        self._times = array('l', [0] * size)
+        self._counts = bytearray(len(COLOR_NAMES))
+        self._index = 0
+        self._watch = StopWatch()
+        self._last_time = None
+
+        self.current = 0
+        self.changed = False
+        self.left = 0
+        self.entered = 0
+        self.transition_time = 0
+        self.transitions = 0
+
+    def reset(self, code):
+        """Start over with every reading of the window equal to *code*, without an edge event."""
+        time = self._watch.time()
+        for i in range(self.size):
+            self._codes[i] = code
+            self._times[i] = time
+        counts = self._counts
+        for i in range(len(counts)):
+            counts[i] = 0
+        counts[code] = self.size
+        self._index = 0
+        self._last_time = time
+        self.current = code
+        self.changed = False
+
+    def push(self, code):
+        """Add a reading, returning the filtered color code."""
+        time = self._watch.time()
+        if self._last_time is None or time - self._last_time > self.max_gap:
+            self.reset(code)
+            return code
+        self._last_time = time
+
+        i = self._index
+        counts = self._counts
+        counts[self._codes[i]] -= 1
+        counts[code] += 1
+        self._codes[i] = code
+        self._times[i] = time
+        self._index = i + 1 if i + 1 < self.size else 0
+
+        self.changed = False
+        if code != self.current and counts[code] >= self.votes:
+            # A transição aconteceu na primeira leitura da cor nova que ainda está na janela
+            j = self._index
+            while self._codes[j] != code:
+                j = j + 1 if j + 1 < self.size else 0
+
+            self.left = self.current
+            self.entered = code
+            self.transition_time = self._times[j]
+            self.current = code
+            self.changed = True
+            self.transitions += 1
+        return self.current
+
+    def time(self):
+        """The current time of the filter's StopWatch, to compare with transition_time."""
+        return self._watch.time()
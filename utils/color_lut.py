@@ -0,0 +1,121 @@
+from array import array
+
+# Códigos das cores guardados na tabela (e nos arquivos gerados pela ferramenta de calibração)
+COLOR_NAMES = ('NONE', 'BLACK', 'BLUE', 'GREEN', 'YELLOW', 'RED', 'WHITE', 'BROWN')
+
+_MAGIC = b'CLUT'
+# ColorSensor.rgb() vai de 0 a 100, leituras acima disso caem no último nível
+_MAX_VALUE = 100
+_MAX_READING = 255
+
+
+def _pybricks_colors():
+    # Importado aqui para que tools/color_lut_build.py possa usar este módulo fora do EV3
+    from pybricks.parameters import Color
+    return tuple(None if name == 'NONE' else getattr(Color, name) for name in COLOR_NAMES)
+
+
+class ColorLUT:
+    """
+    Color classifier for the RGB readings of a ColorSensor, made of a lookup table over the quantized
+    RGB cube.
+
+    Each channel is divided into levels of *step* units, and the table holds one color code (an index
+    into COLOR_NAMES) per (r, g, b) level, so classifying a reading is three array lookups and one
+    bytearray lookup. The tables are calibrated from labeled samples by tools/color_lut_build.py, and
+    saved as a small binary file (magic, step, levels and the table).
+    """
+
+    def __init__(self, table, step, colors=None):
+        """
+        :param table: bytearray with levels ** 3 color codes, indexed by (r * levels + g) * levels + b.
+        :param step: Width of each level, in the units of ColorSensor.rgb().
+        :param colors: What each color code is returned as. Defaults to pybricks' Color (None for NONE).
+        """
+        levels = _MAX_VALUE // step + 1
+        if len(table) != levels ** 3:
+            raise ValueError('a table with step {} needs {} entries'.format(step, levels ** 3))
+
+        self.step = step
+        self.levels = levels
+        self.table = table
+        self._colors = _pybricks_colors() if colors is None else colors
+
+        # O índice de cada canal já multiplicado pelo seu peso, para somar sem multiplicar na leitura
+        quantized = [min(value, _MAX_VALUE) // step for value in range(_MAX_READING + 1)]
+        self._r = array('H', (level * levels * levels for level in quantized))
+        self._g = array('H', (level * levels for level in quantized))
+        self._b = array('H', quantized)
+
+    @staticmethod
+    def load(path, colors=None):
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < 6 or data[:4] != _MAGIC:
+            raise ValueError('{} is not a color table'.format(path))
+        return ColorLUT(bytearray(data[6:]), data[4], colors)
+
+    @staticmethod
+    def load_or_build(path, classify):
+        """
+        Load the calibrated table at *path*, or if there isn't one (or it isn't a valid table), a
+        ColorFunction calling *classify* (like utils_server.rgb_to_color) on every reading.
+        """
+        try:
+            return ColorLUT.load(path)
+        except (OSError, ValueError):
+            return ColorFunction(classify)
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(_MAGIC)
+            file.write(bytes((self.step, self.levels)))
+            file.write(self.table)
+
+    def classify(self, rgb):
+        """The color of an RGB reading, as returned by ColorSensor.rgb()."""
+        return self._colors[self.table[self._r[rgb[0]] + self._g[rgb[1]] + self._b[rgb[2]]]]
+
+    def classify_code(self, rgb):
+        """Same as classify, but returning the color code (an index into COLOR_NAMES)."""
+        return self.table[self._r[rgb[0]] + self._g[rgb[1]] + self._b[rgb[2]]]
+
+    def color(self, code):
+        return self._colors[code]
+
+    def code(self, color):
+        return self._colors.index(color)
+
+
+class ColorFunction:
+    """
+    Color classifier with the same interface as ColorLUT that calls a classifier function on every
+    reading.
+
+    It's used when there is no calibrated table. A table quantized in levels can't reproduce the
+    thresholds of rgb_to_color and rgb_to_color_claw, because a level that straddles a threshold (or a
+    comparison between channels, like r > g) holds readings of two colors.
+    """
+
+    def __init__(self, classify, colors=None):
+        """
+        :param classify: Function from an RGB reading to a color, like utils_server.rgb_to_color.
+        :param colors: What each color code is, as in ColorLUT. Defaults to pybricks' Color.
+        """
+        self._classify = classify
+        self._colors = _pybricks_colors() if colors is None else colors
+        self._codes = {}
+        for code in range(len(self._colors)):
+            self._codes[self._colors[code]] = code
+
+    def classify(self, rgb):
+        return self._classify(rgb)
+
+    def classify_code(self, rgb):
+        return self._codes[self._classify(rgb)]
+
+    def color(self, code):
+        return self._colors[code]
+
+    def code(self, color):
+        return self._codes[color]
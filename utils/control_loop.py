@@ -0,0 +1,93 @@
+from array import array
+
+from pybricks.tools import StopWatch, wait
+
+from constants import CONTROL_LOOP_PERIOD
+
+
+class ControlLoop:
+    """
+    Runs a control step at a fixed rate.
+
+    The step function receives the time since the previous step in seconds and returns True when the
+    control loop should end. The loop sleeps for whatever is left of each period, and the real period
+    of every iteration is recorded in preallocated statistics (count, min, max, mean, a histogram with
+    1 ms buckets and how many iterations overran the period), kept until reset_stats() is called.
+    """
+
+    def __init__(self, period=CONTROL_LOOP_PERIOD, on_tick=None, histogram_size=32):
+        """
+        :param period: The period of the loop in ms.
+        :param on_tick: Optional function called at the start of every iteration, before the step.
+        :param histogram_size: Number of 1 ms buckets of the period histogram, the last one also counts
+            all longer periods.
+        """
+        self.period = period
+        self.on_tick = on_tick
+        self._watch = StopWatch()
+        self._histogram = array('L', [0] * histogram_size)
+        self.reset_stats()
+
+    def run(self, step):
+        """Call *step(dt)* once every period until it returns True."""
+        watch = self._watch
+        period = self.period
+        on_tick = self.on_tick
+
+        watch.reset()
+        last_time = 0
+        deadline = 0
+        dt = period / 1000
+
+        while True:
+            if on_tick is not None:
+                on_tick()
+            if step(dt):
+                return
+
+            deadline += period
+            now = watch.time()
+            if now < deadline:
+                wait(deadline - now)
+                now = watch.time()
+            else:
+                # Não dá pra recuperar o atraso, então o próximo período começa agora
+                self.overruns += 1
+                deadline = now
+
+            elapsed = now - last_time
+            last_time = now
+            self._record(elapsed)
+            dt = (elapsed if elapsed > 0 else period) / 1000
+
+    def _record(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed < self.min:
+            self.min = elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        bucket = elapsed if elapsed < len(self._histogram) else len(self._histogram) - 1
+        self._histogram[bucket] += 1
+
+    def reset_stats(self):
+        self.count = 0
+        self.total = 0
+        self.min = 1 << 30
+        self.max = 0
+        self.overruns = 0
+        histogram = self._histogram
+        for i in range(len(histogram)):
+            histogram[i] = 0
+
+    def stats(self):
+        """The loop period statistics (in ms) recorded since the last reset_stats()."""
+        return {
+            'period': self.period,
+            'count': self.count,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'mean': (self.total / self.count) if self.count else None,
+            'overruns': self.overruns,
+            'histogram': list(self._histogram)
+        }
@@ -0,0 +1,113 @@
+from array import array
+
+from constants import (GRID_SIZE, POSSIBLE_OBSTACLE_SQUARES, OBSTACLE_PRIOR, OBSTACLE_DETECTION_RATE,
+                       OBSTACLE_FALSE_ALARM_RATE, OBSTACLE_CONFIRM_DETECTIONS, PATH_DETOUR_TIME)
+from utils.occupancy_grid import square_index, is_valid_square
+
+
+class ObstacleBelief:
+    """
+    Probability of each of the POSSIBLE_OBSTACLE_SQUARES holding an obstacle.
+
+    The probabilities start at the prior and are updated with Bayes' rule from the obstacle sensor
+    observations. expected_costs() turns all of them, in a single pass, into the extra time the path
+    planner should expect to pay for driving into each square (the probability of finding it blocked
+    times the time of a detour). A single reading can be a false alarm, so a square is only confirmed
+    as blocked after confirm_detections readings saw an obstacle there.
+    """
+
+    def __init__(
+        self,
+        prior=OBSTACLE_PRIOR,
+        detection_rate=OBSTACLE_DETECTION_RATE,
+        false_alarm_rate=OBSTACLE_FALSE_ALARM_RATE,
+        confirm_detections=OBSTACLE_CONFIRM_DETECTIONS,
+        detour_time=PATH_DETOUR_TIME
+    ):
+        """
+        :param prior: Initial probability of a possible obstacle square being blocked.
+        :param detection_rate: Probability of the sensor seeing an obstacle that is there.
+        :param false_alarm_rate: Probability of the sensor seeing an obstacle that isn't there.
+        :param confirm_detections: Readings that saw an obstacle in a square before it is confirmed.
+        :param detour_time: Time in ms lost when an obstacle is found in the way.
+        """
+        self.prior = prior
+        self.detection_rate = detection_rate
+        self.false_alarm_rate = false_alarm_rate
+        self.confirm_detections = confirm_detections
+        self.detour_time = detour_time
+
+        self._squares = bytearray(square_index(square) for square in POSSIBLE_OBSTACLE_SQUARES)
+        self._probabilities = array('f', [prior] * len(self._squares))
+        self._detections = bytearray(len(self._squares))
+        self._costs = [0] * (GRID_SIZE * GRID_SIZE)
+
+    def reset(self):
+        """Forget every observation, going back to the prior."""
+        for i in range(len(self._squares)):
+            self._probabilities[i] = self.prior
+            self._detections[i] = 0
+            self._costs[self._squares[i]] = 0
+
+    def probability(self, square):
+        i = self._find(square)
+        return 0.0 if i < 0 else self._probabilities[i]
+
+    def observe(self, square, seeing_obstacle):
+        """Update the probability of *square* with one reading of the obstacle sensor pointed at it."""
+        i = self._find(square)
+        if i < 0:
+            return
+
+        p = self._probabilities[i]
+        if seeing_obstacle:
+            if self._detections[i] < 255:
+                self._detections[i] += 1
+            blocked, free = p * self.detection_rate, (1 - p) * self.false_alarm_rate
+        else:
+            blocked, free = p * (1 - self.detection_rate), (1 - p) * (1 - self.false_alarm_rate)
+        self._probabilities[i] = blocked / (blocked + free)
+
+    def can_be_blocked(self, square):
+        """If *square* is one of the POSSIBLE_OBSTACLE_SQUARES."""
+        return self._find(square) >= 0
+
+    def is_confirmed(self, square):
+        """If enough readings saw an obstacle in *square* to treat it as blocked."""
+        i = self._find(square)
+        return i >= 0 and self._detections[i] >= self.confirm_detections
+
+    def observe_free(self, square):
+        """The robot drove through *square*, so there is certainly no obstacle there."""
+        i = self._find(square)
+        if i >= 0:
+            self._probabilities[i] = 0.0
+
+    def observe_blocked(self, square):
+        """*square* was confirmed as blocked and is now avoided as an obstacle."""
+        i = self._find(square)
+        if i >= 0:
+            self._probabilities[i] = 1.0
+
+    def expected_costs(self):
+        """
+        Return the expected extra time of driving into each square, as a list indexed by
+        x + y * GRID_SIZE, ready for PathPlanner.set_square_costs. The list is reused between calls.
+        """
+        costs = self._costs
+        squares = self._squares
+        probabilities = self._probabilities
+        detour_time = self.detour_time
+        for i in range(len(squares)):
+            costs[squares[i]] = int(probabilities[i] * detour_time)
+        return costs
+
+    def _find(self, square):
+        if not is_valid_square(square):
+            return -1
+        index = square_index(square)
+        squares = self._squares
+        for i in range(len(squares)):
+            if squares[i] == index:
+                return i
+        return -1
@@ -0,0 +1,84 @@
+from constants import GRID_SIZE, POSSIBLE_OBSTACLE_SQUARES
+
+_CELLS = GRID_SIZE * GRID_SIZE
+
+# Tuplas pré-alocadas para cada quadrado, quem devolve quadrados reutiliza essas instâncias
+SQUARES = tuple((i % GRID_SIZE, i // GRID_SIZE) for i in range(_CELLS))
+
+
+def square_index(square):
+    return square[0] + square[1] * GRID_SIZE
+
+
+def is_valid_square(square):
+    return 0 <= square[0] < GRID_SIZE and 0 <= square[1] < GRID_SIZE
+
+
+def squares_to_mask(squares):
+    if isinstance(squares, OccupancyGrid):
+        return squares.mask
+
+    mask = 0
+    for square in squares:
+        if is_valid_square(square):
+            mask |= 1 << square_index(square)
+    return mask
+
+
+class OccupancyGrid:
+    """
+    Set of squares of the arena stored as a 25 bit integer, one bit per square (bit x + y * GRID_SIZE).
+
+    Adding, testing and joining squares are single integer operations, and the grid can be hashed, so it
+    can be used as a cache key (use a copy() if the grid will still change). Squares outside of the arena
+    are ignored.
+    """
+
+    def __init__(self, squares=(), mask=0):
+        self.mask = mask | squares_to_mask(squares)
+
+    def add(self, square):
+        if is_valid_square(square):
+            self.mask |= 1 << square_index(square)
+
+    def discard(self, square):
+        if is_valid_square(square):
+            self.mask &= ~(1 << square_index(square))
+
+    def union(self, other):
+        return OccupancyGrid(mask=self.mask | squares_to_mask(other))
+
+    def copy(self):
+        return OccupancyGrid(mask=self.mask)
+
+    def __contains__(self, square):
+        return is_valid_square(square) and bool((self.mask >> square_index(square)) & 1)
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __iter__(self):
+        mask = self.mask
+        for i in range(_CELLS):
+            if (mask >> i) & 1:
+                yield SQUARES[i]
+
+    def __len__(self):
+        count = 0
+        mask = self.mask
+        while mask:
+            mask &= mask - 1
+            count += 1
+        return count
+
+    def __eq__(self, other):
+        return isinstance(other, OccupancyGrid) and other.mask == self.mask
+
+    def __hash__(self):
+        return self.mask
+
+    def __repr__(self):
+        return 'OccupancyGrid({!r})'.format(list(self))
+
+
+POSSIBLE_OBSTACLES_MASK = squares_to_mask(POSSIBLE_OBSTACLE_SQUARES)
@@ -0,0 +1,146 @@
+from math import pi, sin, cos, sqrt
+
+from pybricks.tools import StopWatch
+
+from constants import (WHEEL_DIAMETER, AXLE_TRACK, ODOMETRY_DISTANCE_ERROR, ODOMETRY_GYRO_DRIFT,
+                       ODOMETRY_GYRO_SCALE_ERROR, ODOMETRY_MAX_POSITION_ERROR, ODOMETRY_MAX_HEADING_ERROR)
+
+_DEGREES_TO_RADIANS = pi / 180
+
+
+class Odometry:
+    """
+    Continuous pose estimate (x and y in mm, heading in degrees) fusing the wheel encoders and the gyro.
+
+    The encoders give the distance driven and the gyro gives the heading, integrated at the midpoint
+    heading of every tick. The x axis points to Side.RIGHT and the y axis to Side.BACK, with the center
+    of the square (x, y) at (x * SQUARE_SIZE, y * SQUARE_SIZE), and the heading is in the same degrees as
+    the gyro (Side.FRONT = 0, clockwise).
+
+    Alongside the pose, an estimate of the accumulated error is kept: the heading error grows with the
+    gyro drift and scale error, and the position error of each axis grows with the distance driven, the
+    heading error and the wheel slip (measured as the difference between the turn seen by the encoders
+    and by the gyro). It only shrinks when the pose is corrected from a reference, like a line on the
+    floor or a gyro reset.
+    """
+
+    def __init__(
+        self,
+        wheel_diameter=WHEEL_DIAMETER,
+        axle_track=AXLE_TRACK,
+        distance_error=ODOMETRY_DISTANCE_ERROR,
+        gyro_drift=ODOMETRY_GYRO_DRIFT,
+        gyro_scale_error=ODOMETRY_GYRO_SCALE_ERROR,
+        max_position_error=ODOMETRY_MAX_POSITION_ERROR,
+        max_heading_error=ODOMETRY_MAX_HEADING_ERROR
+    ):
+        """
+        :param wheel_diameter: Diameter of the wheels in mm.
+        :param axle_track: Distance between the wheels in mm.
+        :param distance_error: Error of the encoders, as a fraction of the distance driven.
+        :param gyro_drift: Drift of the gyro in degrees per second.
+        :param gyro_scale_error: Error of the gyro, as a fraction of the angle turned.
+        :param max_position_error: Position error in mm from which the robot should realign.
+        :param max_heading_error: Heading error in degrees from which the robot should realign.
+        """
+        self.axle_track = axle_track
+        self.distance_error = distance_error
+        self.gyro_drift = gyro_drift
+        self.gyro_scale_error = gyro_scale_error
+        self.max_position_error = max_position_error
+        self.max_heading_error = max_heading_error
+        self._mm_per_degree = pi * wheel_diameter / 360
+
+        self.x = 0.0
+        self.y = 0.0
+        self.heading = 0.0
+        self.x_error = 0.0
+        self.y_error = 0.0
+        self.heading_error = 0.0
+
+        self._left_angle = None
+        self._right_angle = None
+        self._gyro_angle = None
+        self._watch = StopWatch()
+        self._last_time = 0
+
+    def update(self, left_angle, right_angle, gyro_angle):
+        """
+        Integrate the motion since the last update, from the motor angles and the gyro angle (all in
+        degrees, as read from the sensors).
+        """
+        now = self._watch.time()
+        dt = (now - self._last_time) / 1000
+        self._last_time = now
+
+        if self._left_angle is None:
+            self._left_angle, self._right_angle, self._gyro_angle = left_angle, right_angle, gyro_angle
+            return
+
+        left = (left_angle - self._left_angle) * self._mm_per_degree
+        right = (right_angle - self._right_angle) * self._mm_per_degree
+        turn = gyro_angle - self._gyro_angle
+        self._left_angle, self._right_angle, self._gyro_angle = left_angle, right_angle, gyro_angle
+
+        distance = (left + right) / 2
+        heading = (self.heading + turn / 2) * _DEGREES_TO_RADIANS
+        s, c = sin(heading), cos(heading)
+        self.x += distance * s
+        self.y -= distance * c
+        self.heading += turn
+
+        self.heading_error += self.gyro_drift * dt + self.gyro_scale_error * abs(turn)
+
+        # O quanto as rodas giraram a mais (ou a menos) do que o giroscópio viu o robô virar
+        encoder_turn = (left - right) / self.axle_track / _DEGREES_TO_RADIANS
+        slip = abs(encoder_turn - turn) * _DEGREES_TO_RADIANS * self.axle_track / 2
+
+        along = self.distance_error * abs(distance) + slip
+        across = abs(distance) * self.heading_error * _DEGREES_TO_RADIANS
+        s, c = abs(s), abs(c)
+        self.x_error += along * s + across * c
+        self.y_error += along * c + across * s
+
+    def set_encoders(self, left_angle, right_angle):
+        """Set the motor angles the next update is measured from, after the motor angles were reset."""
+        self._left_angle, self._right_angle = left_angle, right_angle
+
+    def set_heading(self, heading):
+        """Set the heading (and the gyro angle) from a reference, clearing the heading error."""
+        self.heading = heading
+        self._gyro_angle = heading
+        self.heading_error = 0.0
+
+    def set_position(self, x=None, y=None):
+        """Move the position estimate without changing its error (for example to snap it to a square)."""
+        if x is not None:
+            self.x = x
+        if y is not None:
+            self.y = y
+
+    def correct_x(self, x):
+        """Set x from a reference, like a line on the floor, clearing its error."""
+        self.x = x
+        self.x_error = 0.0
+
+    def correct_y(self, y):
+        """Set y from a reference, like a line on the floor, clearing its error."""
+        self.y = y
+        self.y_error = 0.0
+
+    def reset(self, x=0.0, y=0.0, heading=0.0):
+        self.correct_x(x)
+        self.correct_y(y)
+        self.set_heading(heading)
+
+    def position_error(self):
+        return sqrt(self.x_error * self.x_error + self.y_error * self.y_error)
+
+    def confidence(self):
+        """1 right after the pose was corrected, falling to 0 when the error reaches the limits."""
+        ratio = max(self.position_error() / self.max_position_error, self.heading_error / self.max_heading_error)
+        return max(0.0, 1.0 - ratio)
+
+    def needs_realignment(self):
+        return (self.position_error() >= self.max_position_error or
+                self.heading_error >= self.max_heading_error)
@@ -0,0 +1,236 @@
+from constants import GRID_SIZE, PATH_TURN_90_TIME, PATH_TURN_180_TIME, PATH_SQUARE_TIME, PATH_SEGMENT_TIME
+from utils.occupancy_grid import SQUARES, POSSIBLE_OBSTACLES_MASK, square_index, is_valid_square, squares_to_mask
+
+try:
+    from heapq import heappush, heappop
+except ImportError:
+    from uheapq import heappush, heappop
+
+_CELLS = GRID_SIZE * GRID_SIZE
+_STATES = _CELLS * 4
+_INFINITY = 1 << 30
+# Entradas da fila: custo << _KEY_SHIFT | estado, um int pequeno que não aloca no MicroPython
+_KEY_SHIFT = 7
+_STATE_MASK = (1 << _KEY_SHIFT) - 1
+# Máximo de arestas de um estado: 3 giros e até 4 segmentos para frente ou 4 de ré, com folga
+_MAX_EDGES = 16
+
+# Direções indexadas como heading // 90: FRONT (y - 1), RIGHT (x + 1), BACK (y + 1), LEFT (x - 1)
+_RIGHT = 1
+_LEFT = 3
+
+
+def heading_to_index(heading):
+    return (int(heading) % 360) // 90
+
+
+def _neighbor(square, direction):
+    if direction == 0:
+        return square - GRID_SIZE if square >= GRID_SIZE else -1
+    if direction == 1:
+        return square + 1 if (square % GRID_SIZE) < GRID_SIZE - 1 else -1
+    if direction == 2:
+        return square + GRID_SIZE if square < _CELLS - GRID_SIZE else -1
+    return square - 1 if (square % GRID_SIZE) > 0 else -1
+
+
+class PathPlanner:
+    """
+    Time optimal path planner for the 5x5 arena.
+
+    The states are (square, heading) pairs and the edges are the moves Robot.go_to_position makes:
+    turning in place to another heading, and driving a straight segment of one or more squares. Every
+    segment pays a fixed overhead (stop, hold and wait) on top of the time per square, and like the
+    paths from calculate_path, a segment always stops before entering one of the
+    POSSIBLE_OBSTACLE_SQUARES, so that the obstacle sensor can be checked.
+
+    Each call is a Dijkstra search from the start over the 100 states. The open states are kept in a
+    heap of small ints, and the edges are written into preallocated buffers, so the calls allocate
+    little more than the returned path.
+    """
+
+    def __init__(
+        self,
+        turn_90_time=PATH_TURN_90_TIME,
+        turn_180_time=PATH_TURN_180_TIME,
+        square_time=PATH_SQUARE_TIME,
+        segment_time=PATH_SEGMENT_TIME
+    ):
+        """
+        :param turn_90_time: Time in ms of a 90 degrees turn in place.
+        :param turn_180_time: Time in ms of a 180 degrees turn in place.
+        :param square_time: Time in ms to drive across one square.
+        :param segment_time: Overhead in ms of each straight segment (acceleration, stop and waits).
+        """
+        self.square_time = square_time
+        self.segment_time = segment_time
+        # Custo de virar, indexado pela diferença entre as direções (em múltiplos de 90 graus)
+        self.turn_times = (0, turn_90_time, turn_180_time, turn_90_time)
+
+        self._costs = [_INFINITY] * _STATES
+        self._parents = [0] * _STATES
+        self._terminal = [_INFINITY] * _STATES
+        self._queue = []
+        self._successor_states = [0] * _MAX_EDGES
+        self._successor_costs = [0] * _MAX_EDGES
+
+        self._mask = 0
+        self._square_costs = [0] * _CELLS
+
+    def calculate_path(self, initial, final, obstacles, heading, final_heading=None):
+        """
+        Calculate the fastest path from *initial*, facing *heading*, to *final*.
+
+        Returns the list of waypoints in the same format as utils_server.calculate_path (each one in a
+        straight line from the previous), or None if *final* can't be reached.
+
+        :param final_heading: If set, the time of the final turn to this heading is also minimized.
+        """
+        if initial == final:
+            return [initial]
+        if not is_valid_square(final):
+            return None
+
+        final_direction = None if final_heading is None else heading_to_index(final_heading)
+        result = self._search(initial, heading, obstacles, ((square_index(final), final_direction, 0),))
+        return None if result is None else result[1]
+
+    def calculate_path_to_any(self, initial, targets, obstacles, heading, extra_costs=None):
+        """
+        Find, in a single search, the target that is fastest to reach from *initial*, facing *heading*.
+
+        The targets are ranked by the estimated travel time plus the time of the final turn to their
+        heading. Returns a tuple (index of the target, list of waypoints), where the list is empty if the
+        robot is already at the target square, or None if no target can be reached.
+
+        :param targets: The possible targets, objects with x, y and heading attributes (like DrivePosition).
+        :param extra_costs: Optional time in ms added to each target, to express a preference between them.
+        """
+        goals = []
+        for i in range(len(targets)):
+            target = targets[i]
+            if not is_valid_square((target.x, target.y)):
+                continue
+            goals.append((square_index((target.x, target.y)), heading_to_index(target.heading),
+                          0 if extra_costs is None else extra_costs[i]))
+        if not goals:
+            return None
+
+        result = self._search(initial, heading, obstacles, tuple(goals))
+        if result is None:
+            return None
+
+        square, direction = result[0] >> 2, result[0] & 3
+        best, best_cost = None, _INFINITY
+        for i in range(len(targets)):
+            target = targets[i]
+            if (target.x, target.y) == SQUARES[square]:
+                cost = self.turn_times[(heading_to_index(target.heading) - direction) & 3]
+                cost += 0 if extra_costs is None else extra_costs[i]
+                if cost < best_cost:
+                    best, best_cost = i, cost
+        return best, result[1]
+
+    def set_square_costs(self, costs):
+        """
+        Set an extra time in ms paid for driving into each square, given as a list indexed by
+        x + y * GRID_SIZE (for example the expected detour time of a square that may hold an obstacle).
+        """
+        square_costs = self._square_costs
+        for square in range(_CELLS):
+            square_costs[square] = costs[square]
+
+    def _search(self, initial, heading, obstacles, goals):
+        # Devolve (estado final, caminho) do caminho mais rápido até um dos destinos, ou None
+        if not is_valid_square(initial):
+            return None
+        self._mask = squares_to_mask(obstacles)
+
+        costs, parents, terminal = self._costs, self._parents, self._terminal
+        for state in range(_STATES):
+            costs[state] = _INFINITY
+            terminal[state] = _INFINITY
+        for square, final_direction, extra_cost in goals:
+            for direction in range(4):
+                cost = extra_cost
+                if final_direction is not None:
+                    cost += self.turn_times[(final_direction - direction) & 3]
+                if cost < terminal[square * 4 + direction]:
+                    terminal[square * 4 + direction] = cost
+
+        start = square_index(initial) * 4 + heading_to_index(heading)
+        costs[start] = 0
+        parents[start] = start
+        queue = self._queue
+        del queue[:]
+        queue.append(start)
+        states, edge_costs = self._successor_states, self._successor_costs
+        best, best_state = _INFINITY, -1
+        while queue:
+            entry = heappop(queue)
+            cost, state = entry >> _KEY_SHIFT, entry & _STATE_MASK
+            # Os custos finais nunca são negativos: nada que ainda está na fila termina antes
+            if cost >= best:
+                break
+            # Entradas com um custo antigo são descartadas
+            if cost != costs[state]:
+                continue
+            if cost + terminal[state] < best:
+                best, best_state = cost + terminal[state], state
+
+            for i in range(self._successors(state, state == start)):
+                successor = states[i]
+                if cost + edge_costs[i] < costs[successor]:
+                    costs[successor] = cost + edge_costs[i]
+                    parents[successor] = state
+                    heappush(queue, (costs[successor] << _KEY_SHIFT) | successor)
+
+        if best_state < 0:
+            return None
+        return best_state, self._extract_path(start, best_state)
+
+    def _extract_path(self, start, final):
+        parents = self._parents
+        path = []
+        state = final
+        while state != start:
+            previous = parents[state]
+            if (previous >> 2) != (state >> 2):
+                path.append(SQUARES[state >> 2])
+            state = previous
+        path.reverse()
+        return path
+
+    def _successors(self, state, is_start):
+        # Escreve os sucessores e custos nos buffers, e devolve quantos são
+        square, direction = state >> 2, state & 3
+        states, costs = self._successor_states, self._successor_costs
+        count = 0
+        for new_direction in range(4):
+            if new_direction != direction:
+                states[count] = square * 4 + new_direction
+                costs[count] = self.turn_times[(new_direction - direction) & 3]
+                count += 1
+
+        count = self._add_segments(count, square, direction, direction)
+        if is_start and square == 0 and direction == _LEFT:
+            # No canto (0, 0) o robô anda de ré pela linha y = 0 sem virar, mas só se já começa virado
+            # para a esquerda: depois de um giro, follow_path vira para a direita em vez de dar ré
+            count = self._add_segments(count, square, _RIGHT, direction)
+        return count
+
+    def _add_segments(self, count, square, movement, direction):
+        cost = self.segment_time
+        squares = 0
+        while True:
+            square = _neighbor(square, movement)
+            if square < 0 or (self._mask >> square) & 1:
+                return count
+            # Um segmento sempre para antes de entrar em um possível obstáculo
+            if squares > 0 and (POSSIBLE_OBSTACLES_MASK >> square) & 1:
+                return count
+            squares += 1
+            cost += self.square_time + self._square_costs[square]
+            self._successor_states[count] = square * 4 + direction
+            self._successor_costs[count] = cost
+            count += 1
@@ -257,4 +257,67 @@ class PID(object):
 
         self._last_time = self.time()
         self._last_output = None
-        self._last_input = None
\ No newline at end of file
+        self._last_input = None
+
+
+class FastPID(object):
+    """
+    A lean PID controller for the control loops.
+
+    Uses the same control law as :class:`PID` with proportional-on-error and the time in seconds, but
+    the gains and limits are stored ready to use, time is never read (the caller gives dt) and the
+    controller is meant to be reset and reused instead of created for every motion.
+    """
+
+    __slots__ = ('_kp', '_ki', '_kd', '_lower', '_upper', 'setpoint', '_integral', '_last_input')
+
+    def __init__(self, Kp=1.0, Ki=0.0, Kd=0.0, setpoint=0, output_limits=(None, None)):
+        """
+        :param Kp: The value for the proportional gain Kp
+        :param Ki: The value for the integral gain Ki
+        :param Kd: The value for the derivative gain Kd
+        :param setpoint: The initial setpoint that the PID will try to achieve
+        :param output_limits: The output limits, given as (lower, upper), either of them can be None.
+        """
+        self._kp, self._ki, self._kd = Kp, Ki, Kd
+        self.set_output_limits(*output_limits)
+        self.reset(setpoint)
+
+    def set_output_limits(self, lower, upper):
+        if (lower is not None) and (upper is not None) and (upper < lower):
+            raise ValueError('lower limit must be less than upper limit')
+        self._lower = float('-inf') if lower is None else lower
+        self._upper = float('inf') if upper is None else upper
+
+    def reset(self, setpoint=None):
+        """Clear the integral and the last input, optionally changing the setpoint."""
+        if setpoint is not None:
+            self.setpoint = setpoint
+        self._integral = 0
+        self._last_input = None
+
+    def step(self, input_, dt):
+        """
+        Update the controller with *input_*, *dt* seconds after the previous update, and return the
+        control output.
+        """
+        error = self.setpoint - input_
+        last_input = self._last_input
+        self._last_input = input_
+
+        integral = self._integral + self._ki * error * dt
+        if integral > self._upper:
+            integral = self._upper
+        elif integral < self._lower:
+            integral = self._lower
+        self._integral = integral
+
+        output = self._kp * error + integral
+        if last_input is not None:
+            output -= self._kd * (input_ - last_input) / dt
+
+        if output > self._upper:
+            return self._upper
+        if output < self._lower:
+            return self._lower
+        return output
@@ -0,0 +1,72 @@
+import struct
+
+from constants import SENSOR_SEND_PERIOD
+
+# Pacote com todas as leituras do cliente: sequência, tempo do cliente (ms), distância do sensor de
+# obstáculos (mm), distância do sensor de cima (mm), código da cor da garra (color_to_int_claw) e quais
+# dessas leituras foram feitas para esse pacote (SENSOR_*), as outras repetem o último valor lido
+SENSOR_PACKET_FORMAT = '<HIHHBB'
+SENSOR_PACKET_SIZE = struct.calcsize(SENSOR_PACKET_FORMAT)
+
+# Pacote de controle do servidor para o cliente: o perfil de envio (STREAM_*)
+CONTROL_PACKET_FORMAT = '<B'
+CONTROL_PACKET_SIZE = struct.calcsize(CONTROL_PACKET_FORMAT)
+
+SENSOR_OBSTACLE = 1
+SENSOR_TOP = 2
+SENSOR_CLAW = 4
+SENSOR_ALL = SENSOR_OBSTACLE | SENSOR_TOP | SENSOR_CLAW
+
+STREAM_ALL = 0
+STREAM_OBSTACLE = 1
+STREAM_TOP_BURST = 2
+STREAM_CLAW = 3
+STREAM_IDLE = 4
+
+# Perfis de envio, indexados por STREAM_*: (período em ms, sensores lidos, zona morta das distâncias
+# em mm, tempo máximo em ms sem enviar). Um pacote só é enviado se alguma leitura mudar mais que a
+# zona morta (ou a cor mudar), ou se o tempo máximo passar. O sensor de cima manda todas as leituras
+# (zona morta -1), já que measure_tube conta votos por amostra
+STREAM_PROFILES = (
+    (SENSOR_SEND_PERIOD, SENSOR_ALL, 5, 150),
+    (15, SENSOR_OBSTACLE, 10, 150),
+    (10, SENSOR_TOP, -1, 100),
+    (SENSOR_SEND_PERIOD, SENSOR_CLAW, 0, 150),
+    (200, SENSOR_ALL, 20, 1000)
+)
+
+_MAX_SEQ = 0xFFFF
+_MAX_DISTANCE = 0xFFFF
+
+
+def encode_sensor_packet(seq, timestamp, obstacle_distance, top_distance, claw_color, fresh=SENSOR_ALL):
+    """Pack one sample of the client sensors into the bytes sent in a single mailbox message."""
+    return struct.pack(SENSOR_PACKET_FORMAT, seq & _MAX_SEQ, timestamp & 0xFFFFFFFF,
+                       min(max(int(obstacle_distance), 0), _MAX_DISTANCE),
+                       min(max(int(top_distance), 0), _MAX_DISTANCE), claw_color, fresh)
+
+
+def decode_sensor_packet(data):
+    """
+    Unpack a message made by encode_sensor_packet into a tuple (seq, timestamp, obstacle_distance,
+    top_distance, claw_color, fresh), or None if it isn't a sensor packet.
+    """
+    if data is None or len(data) != SENSOR_PACKET_SIZE:
+        return None
+    return struct.unpack(SENSOR_PACKET_FORMAT, data)
+
+
+def encode_control_packet(profile):
+    return struct.pack(CONTROL_PACKET_FORMAT, profile)
+
+
+def decode_control_packet(data):
+    """The profile (STREAM_*) in a message made by encode_control_packet, or None if it isn't one."""
+    if data is None or len(data) != CONTROL_PACKET_SIZE:
+        return None
+    profile = struct.unpack(CONTROL_PACKET_FORMAT, data)[0]
+    return profile if profile < len(STREAM_PROFILES) else None
+
+
+def next_seq(seq):
+    return (seq + 1) & _MAX_SEQ
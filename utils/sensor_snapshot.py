@@ -0,0 +1,46 @@
+from pybricks.tools import StopWatch
+
+from constants import SENSOR_SNAPSHOT_MAX_AGE
+
+
+class SensorSnapshot:
+    """
+    Reads each registered sensor at most once per control tick.
+
+    Control loops call begin_tick() at the start of every iteration, and every reading taken during the
+    iteration comes from the same sample, read lazily the first time it's needed. Readings requested
+    outside of a control loop start a new tick by themselves once the snapshot is older than *max_age*.
+    """
+
+    def __init__(self, max_age=SENSOR_SNAPSHOT_MAX_AGE):
+        """
+        :param max_age: Time in ms after which a snapshot is considered stale.
+        """
+        self.max_age = max_age
+        self._watch = StopWatch()
+        self._tick_time = -max_age - 1
+        self._readers = []
+        self._values = []
+        self._valid = bytearray()
+
+    def add(self, reader):
+        """Register a function that reads a sensor, returning the slot used to get its reading."""
+        self._readers.append(reader)
+        self._values.append(None)
+        self._valid = bytearray(len(self._readers))
+        return len(self._readers) - 1
+
+    def begin_tick(self):
+        """Discard the current readings, so every sensor is read again when needed."""
+        self._tick_time = self._watch.time()
+        valid = self._valid
+        for i in range(len(valid)):
+            valid[i] = 0
+
+    def get(self, slot):
+        if self._watch.time() - self._tick_time > self.max_age:
+            self.begin_tick()
+        if not self._valid[slot]:
+            self._values[slot] = self._readers[slot]()
+            self._valid[slot] = 1
+        return self._values[slot]
@@ -0,0 +1,94 @@
+from array import array
+from math import sqrt
+
+from constants import STATS_MEDIAN_SIZE
+
+
+class StreamingStats:
+    """
+    Count, mean, variance, minimum and maximum of a stream of values in constant memory (Welford's
+    algorithm), plus the median of the last *median_size* values.
+    """
+
+    def __init__(self, median_size=STATS_MEDIAN_SIZE):
+        """
+        :param median_size: How many of the most recent values are kept for the median.
+        """
+        self._recent = array('f', [0] * median_size)
+        self._sorted = array('f', [0] * median_size)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self._index = 0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        self._recent[self._index] = value
+        self._index = self._index + 1 if self._index + 1 < len(self._recent) else 0
+
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def stddev(self):
+        return sqrt(self.variance())
+
+    def median(self):
+        """Median of the last values kept, or None if there are none."""
+        size = min(self.count, len(self._recent))
+        if size == 0:
+            return None
+
+        # Ordenação por inserção num buffer fixo, são poucos valores
+        values = self._sorted
+        for i in range(size):
+            value = self._recent[i]
+            j = i
+            while j > 0 and values[j - 1] > value:
+                values[j] = values[j - 1]
+                j -= 1
+            values[j] = value
+
+        middle = size // 2
+        if size % 2:
+            return values[middle]
+        return (values[middle - 1] + values[middle]) / 2
+
+
+class ThresholdCounter:
+    """Counts how many values of a stream are at most *threshold* and how many are above it."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.below = 0
+        self.above = 0
+
+    def add(self, value):
+        if value <= self.threshold:
+            self.below += 1
+        else:
+            self.above += 1
+
+    def total(self):
+        return self.below + self.above
+
+    def margin(self):
+        """How one-sided the counts are: 0 for a tie (or no values) up to 1 when all are on one side."""
+        total = self.below + self.above
+        return abs(self.below - self.above) / total if total else 0.0
@@ -1,4 +1,10 @@
+from pybricks.messaging import Mailbox
 from pybricks.parameters import Color
+from pybricks.tools import wait, StopWatch
+
+from constants import SENSOR_MAILBOX, CONTROL_MAILBOX
+from utils.protocol import (encode_sensor_packet, decode_control_packet, next_seq, STREAM_ALL, STREAM_PROFILES,
+                            SENSOR_OBSTACLE, SENSOR_TOP, SENSOR_CLAW)
 
 
 def rgb_to_color_claw(rgb):
@@ -28,3 +34,47 @@ def color_to_int_claw(color: Color) -> int:
     }
     result = colors[color]
     return colors[color]
+
+
+def run_sensor_client(connection, obstacle_sensor, top_object_sensor, claw_color_sensor, claw_color_lut,
+                      running=None):
+    """
+    Stream the client sensors to the server over *connection*, following the streaming profile the
+    server asks for (see utils/protocol.py). Runs until *running()* returns False, or forever.
+    """
+    sensor_mailbox = Mailbox(SENSOR_MAILBOX, connection)
+    control_mailbox = Mailbox(CONTROL_MAILBOX, connection)
+
+    watch = StopWatch()
+    seq = 0
+    period, sensors, deadband, heartbeat = STREAM_PROFILES[STREAM_ALL]
+    obstacle_distance = top_distance = claw_color = 0
+    sent_obstacle_distance = sent_top_distance = sent_claw_color = None
+    last_send = 0
+
+    while running is None or running():
+        start = watch.time()
+
+        # O servidor escolhe quais leituras importam agora e com que frequência
+        profile = decode_control_packet(control_mailbox.read())
+        if profile is not None:
+            period, sensors, deadband, heartbeat = STREAM_PROFILES[profile]
+
+        if sensors & SENSOR_OBSTACLE:
+            obstacle_distance = obstacle_sensor.distance()
+        if sensors & SENSOR_TOP:
+            top_distance = top_object_sensor.distance()
+        if sensors & SENSOR_CLAW:
+            claw_color = color_to_int_claw(claw_color_lut.classify(claw_color_sensor.rgb()))
+
+        # Só envia quando alguma leitura muda mais que a zona morta, ou depois de muito tempo sem enviar
+        if (sent_obstacle_distance is None or start - last_send >= heartbeat or
+                abs(obstacle_distance - sent_obstacle_distance) > deadband or
+                abs(top_distance - sent_top_distance) > deadband or claw_color != sent_claw_color):
+            sensor_mailbox.send(encode_sensor_packet(seq, start, obstacle_distance, top_distance, claw_color,
+                                                     sensors))
+            seq = next_seq(seq)
+            sent_obstacle_distance, sent_top_distance, sent_claw_color = obstacle_distance, top_distance, claw_color
+            last_send = start
+
+        wait(max(period - (watch.time() - start), 0))
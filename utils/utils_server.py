@@ -108,7 +108,7 @@ def int_to_color_claw(i: int) -> Color:
     return colors[i]
 
 
-def run_commands(delay, *functions):
+def run_commands(delay, *functions, pause=wait):
     for function in functions:
-        wait(delay)
+        pause(delay)
         function()